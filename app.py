@@ -1,54 +1,89 @@
+import startup
+
+startup_timer = startup.begin()
+
 from flask import Flask, render_template, request, jsonify
-from rpi_ws281x import PixelStrip, Color
+import functools
+import itertools
+import logging
+import threading
 import time
-import asyncio
 
 #custom mods
 import light_race
 import colors
 import effects
-import embeddings
+from ledstrip import LEDStripController
+from render import RenderEngine
+from text_jobs import TextEffectJobs, fetch_embedding, show_embedding
 
-app = Flask(__name__)
+startup_timer.mark("imports")
+logging.basicConfig(level=logging.INFO)
 
-# LED strip configuration:
-LED_COUNT = 120          # Number of LEDs
-LED_PIN = 18            # GPIO pin connected to the pixels (PWM pin)
-LED_FREQ_HZ = 800000    # LED signal frequency (800kHz)
-LED_DMA = 5             # DMA channel
-LED_BRIGHTNESS = 255    # Brightness (0-255)
-LED_INVERT = False      # Invert signal
-LED_CHANNEL = 0         # PWM channel
+app = Flask(__name__)
 
-# Initialize the LED strip
-strip = PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
-strip.begin()
+if __name__ == '__main__':
+    startup.hand_over_to_reloader(app)
+
+# Initialize the LED strips, configured through LED_OUTPUTS (see canvas.py)
+led_controller = LEDStripController()
+strip = led_controller.strip
+engine = RenderEngine(led_controller)
+startup_timer.mark("strip")
+
+# effects run on whichever thread asked for them (request threads and the
+# text effect display), so they take turns on the strip
+strip_lock = threading.Lock()
+
+def drives_strip(route):
+    @functools.wraps(route)
+    def locked(*args, **kwargs):
+        with strip_lock:
+            return route(*args, **kwargs)
+    return locked
+
+# plays count frames of a generator effect on the request thread, wait_ms apart
+def play(frames, count, wait_ms):
+    def paced():
+        for _ in itertools.islice(frames, count):
+            yield wait_ms / 1000
+    engine.run(paced())
+
+@drives_strip
+def show_text(text, embedding):
+    return show_embedding(led_controller, text, embedding)
+
+text_jobs = TextEffectJobs(fetch=fetch_embedding, display=show_text)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/wheel')
+@drives_strip
 def wheel_route():
     """Trigger the wheel effect."""
     print("Starting color wheel effect")
-    effects.color_wheel(strip, wait_ms=20, iterations=1)  # Perform one full wheel rotation
+    play(effects.color_wheel(led_controller), 256, wait_ms=20)  # Perform one full wheel rotation
     return 'Color Wheel Effect Completed'
 
 @app.route('/warm-wheel')
+@drives_strip
 def warm_wheel():
-    effects.warm_wheel(strip)
+    play(effects.warm_wheel(led_controller), led_controller.numPixels, wait_ms=20)
     return 'warm wheel'
 
 @app.route('/lime-green')
+@drives_strip
 def lime_green():
-    effects.fill_strip(strip, colors.LIME_GREEN)
+    led_controller.fill_color(colors.LIME_GREEN)
     print("lime green")
     return 'lime green'
 
 @app.route('/start-race')
+@drives_strip
 def start_race():
-    await asyncio.run(light_race.race(strip))
+    engine.run(light_race.race(led_controller))
     return 'race ran'
 
 @app.route('/text_effect', methods=['POST'])
@@ -60,28 +95,38 @@ def text_effect():
     if not text:
         return jsonify({"error": "Text input is required"}), 400
 
-    try:
-        embeddings.display_text_as_lights(text)
-        return jsonify({"status": "Effect displayed for text", "text": text})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # returns straight away, poll /text_effect/<job_id> for the result
+    job = text_jobs.submit(text)
+    return jsonify({"job_id": job["id"], "status": job["status"], "text": text}), 202
+
+@app.route('/text_effect/<job_id>')
+def text_effect_status(job_id):
+    job = text_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' does not exist"}), 404
+    return jsonify(job)
 
 @app.route('/flash')
+@drives_strip
 def flash():
-    effects.flash(strip)
+    play(effects.flash(led_controller), 10, wait_ms=500)
     return 'flash success'
 
 @app.route('/leapfrog')
+@drives_strip
 def leapfrog():
-    effects.leap_frog(strip)
+    play(effects.leap_frog(led_controller), led_controller.numPixels, wait_ms=50)
     return 'leap frog success'
 
 @app.route('/bounce')
+@drives_strip
 def bounce():
-    effects.bouncing_window(strip)
+    # there and back once
+    play(effects.bouncing_window(led_controller), 2 * (led_controller.numPixels - 5), wait_ms=20)
     return "bounce success"
 
 @app.route('/bits', methods=['POST'])
+@drives_strip
 def display_bits():
     """expects a list of 1s and 0s in the payload"""
     data = request.json
@@ -91,17 +136,23 @@ def display_bits():
 
     try:
         effects.display_bits(strip, bits)
+        # drawn past the framebuffer, so the next flush must resend everything
+        led_controller.framebuffer.invalidate()
         return "success"
     except Exception as e:
         print(e)
         return "error"
 
 @app.route('/off')
+@drives_strip
 def turn_off():
     """Turn all LEDs off."""
-    effects.fill_strip(strip, colors.OFF)
+    led_controller.off()
     print("LEDs are off")
     return 'LEDs turned off'
 
+startup_timer.mark("app")
+startup_timer.log()
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
+    app.run(debug=True, host='0.0.0.0', use_reloader=startup.RELOAD)
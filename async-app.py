@@ -1,177 +1,258 @@
-import asyncio
-import inspect
+import startup
+
+startup_timer = startup.begin()
+
 import logging
-from threading import Lock, Thread
+import os
+import queue
 
-from flask import Flask, jsonify, render_template, request
+import numpy as np
+from flask import Flask, Response, jsonify, render_template, request
 from rpi_ws281x import Color
-from rpi_ws281x import PixelStrip
 
 import clock_effects
 import colors
+import cycle_cache
 import effects
 import light_race
+import metrics
+import preview
+from canvas import build_canvas, load_outputs
+from events import EventHub
+from ingest import FrameIngest
+from ledstrip import StripController
+from render import RenderEngine, RenderLoop
+from text_jobs import TextEffectJobs, fetch_embedding, show_embedding
+
+startup_timer.mark("imports")
 
 # Flask app initialization
 app = Flask(__name__)
 app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
 
-# LED strip configuration
-LED_COUNT = 120
-LED_PIN = 18
-LED_FREQ_HZ = 800000
-LED_DMA = 5
-LED_BRIGHTNESS = 255
-LED_INVERT = False
-LED_CHANNEL = 0
-
-logging.basicConfig(level=logging.INFO)
-
-
-class StripControllerAdapter:
-    """Adapter exposing controller-style helpers while sharing the PixelStrip instance."""
-
-    def __init__(self, pixel_strip: PixelStrip):
-        self.strip = pixel_strip
-        self.numPixels = self.strip.numPixels()
-        self.num_pixels = self.numPixels
-        self.color_list = [colors.RED, colors.GREEN, colors.BLUE]
-        self.delay = 0.5  # seconds
-
-    def set_colors(self, color_list):
-        self.color_list = list(color_list)
+# UDP port external renderers send frames to, ingest is off when unset
+INGEST_PORT = os.getenv("INGEST_PORT")
 
-    def get_colors(self):
-        return list(self.color_list)
+# seconds a new effect fades in over the one it replaces, 0 cuts straight over
+CROSSFADE_SECONDS = float(os.getenv("LED_CROSSFADE", "0.5"))
+# show slow effects at 60 fps, blending each frame into the next
+INTERPOLATE = os.getenv("LED_INTERPOLATE", "0") == "1"
 
-    def set_delay(self, delay_ms: float):
-        self.delay = delay_ms / 1000.0
-
-    def get_delay(self):
-        return self.delay * 1000.0
-
-    def set_pixel(self, index, color):
-        if 0 <= index < self.numPixels:
-            self.strip.setPixelColor(index, color)
-
-    def set_pixel_color_list(self, index):
-        if not self.color_list:
-            return
-        if 0 <= index < self.numPixels:
-            color_idx = index % len(self.color_list)
-            self.strip.setPixelColor(index, self.color_list[color_idx])
-
-    def off(self):
-        for i in range(self.numPixels):
-            self.strip.setPixelColor(i, colors.OFF)
-        self.strip.show()
+logging.basicConfig(level=logging.INFO)
 
-    def show(self):
-        self.strip.show()
 
+if __name__ == "__main__":
+    startup.hand_over_to_reloader(app)
 
-# Initialize the LED strip
-strip = PixelStrip(
-    LED_COUNT,
-    LED_PIN,
-    LED_FREQ_HZ,
-    LED_DMA,
-    LED_INVERT,
-    LED_BRIGHTNESS,
-    LED_CHANNEL,
-)
-strip.begin()
-controller = StripControllerAdapter(strip)
-current_settings = {
-    "colors": [colors.RED, colors.GREEN, colors.BLUE],
-    "delay": 500,
-}
+# Initialize the LED strips (see canvas.py for LED_OUTPUTS)
+strip = build_canvas(load_outputs())
+controller = StripController(strip)
+startup_timer.mark("strip")
+engine = RenderEngine(controller, crossfade=CROSSFADE_SECONDS, interpolate=INTERPOLATE)
+# the render worker, the only thread that touches the strip after startup
+render_loop = RenderLoop(engine)
+startup_timer.mark("render loop")
 
-# Lock and job management
-effect_lock = Lock()
-current_effect = None
-current_thread = None
 
 # Effect runner
 jobs = {
     "wheel": lambda: effects.color_wheel(controller),
     "warm_wheel": lambda: effects.warm_wheel(controller),
-    "lime_green": lambda: effects.fill_strip(strip, colors.LIME_GREEN),
+    "lime_green": lambda: controller.fill_color(colors.LIME_GREEN),
     "flash": lambda: effects.flash(controller),
     "leapfrog": lambda: effects.leap_frog(controller),
     "bounce": lambda: effects.bouncing_window(controller),
-    "off": lambda: effects.fill_strip(strip, colors.OFF),
-    "race": lambda: light_race.race(strip),
-    "clock": lambda: clock_effects.clock(strip),
-    "clock2": lambda: clock_effects.clock2(strip),
-    "clock3": lambda: clock_effects.clock3(strip),
-    "clock4": lambda: clock_effects.clock4(strip),
-    "clock5": lambda: clock_effects.clock5(strip),
-    "clock6": lambda: clock_effects.clock6(strip),
+    "off": lambda: controller.off(),
+    "race": lambda *args: light_race.race(controller, *args),
+    "clock": lambda: clock_effects.clock(controller),
+    "clock2": lambda: clock_effects.clock2(controller),
+    "clock3": lambda: clock_effects.clock3(controller),
+    "clock4": lambda: clock_effects.clock4(controller),
+    "clock5": lambda: clock_effects.clock5(controller),
+    "clock6": lambda: clock_effects.clock6(controller),
     "rollout": lambda: effects.roll_out(controller),
-    "allin": lambda: effects.allin(strip),
+    "allin": lambda: effects.allin(controller),
+    # only started by text_jobs, once the embedding is fetched off the render loop
+    "text_effect": lambda text, embedding: show_embedding(controller, text, embedding),
 }
 
 
-def apply_settings():
-    controller.set_colors(current_settings["colors"])
-    controller.set_delay(current_settings["delay"])
+def _scheduler_stat(key):
+    return lambda: controller.scheduler.stats()[key]
 
 
-apply_settings()
+metrics.REGISTRY.gauge("led_fps", "Achieved frame rate of the running effect.", _scheduler_stat("fps"))
+metrics.REGISTRY.gauge("led_target_fps", "Target frame rate from the delay setting.", _scheduler_stat("target_fps"))
+metrics.REGISTRY.gauge("led_frames_total", "Frames rendered.", _scheduler_stat("frames"), "counter")
+metrics.REGISTRY.gauge("led_frames_dropped_total", "Frame deadlines skipped after overruns.", _scheduler_stat("dropped"), "counter")
+metrics.REGISTRY.gauge("led_frames_late_total", "Frames that missed their deadline.", _scheduler_stat("late"), "counter")
+metrics.REGISTRY.gauge("led_render_queue_depth", "Commands waiting for the render loop.", render_loop.commands.qsize)
+metrics.REGISTRY.gauge("led_cycle_cache_bytes", "Memory held by cached effect cycles.", lambda: cycle_cache.CACHE.nbytes)
 
 
-def reset_stop_flags():
-    effects.set_stop_flag(False)
-    clock_effects.set_stop_flag(False)
-    light_race.winner_event.clear()
+def hex_to_color(value: str):
+    value = value.lstrip('#')
+    r = int(value[0:2], 16)
+    g = int(value[2:4], 16)
+    b = int(value[4:6], 16)
+    return Color(r, g, b)
 
+def color_to_hex(color_value):
+    r = (color_value >> 16) & 0xFF
+    g = (color_value >> 8) & 0xFF
+    b = color_value & 0xFF
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+def settings_json(settings=None):
+    settings = settings or controller.settings
+    return {
+        "version": settings.version,
+        "colors": [color_to_hex(value) for value in settings.colors],
+        "delay": settings.delay,
+        "brightness": settings.brightness,
+    }
+
+
+# live state for the web pages, see /events
+hub = EventHub()
+render_loop.listeners.append(lambda name: hub.publish("effect", {"effect": name}))
+
+
+def publish_settings(future):
+    if future.exception() is None:
+        hub.publish("settings", settings_json(future.result()))
+
+
+def apply_settings(**changes):
+    """Queue a partial settings update; the render loop builds and swaps in the next snapshot."""
+    future = render_loop.submit("settings", changes)
+    future.add_done_callback(publish_settings)
+    return future
 
-def stop_all_effects():
-    effects.set_stop_flag(True)
-    clock_effects.set_stop_flag(True)
-    light_race.winner_event.set()
 
+hub.publish("settings", settings_json())
+
+
+# these only queue commands; each returns a Future for callers that need to wait
 def stop_current_job():
-    global current_effect, current_thread
     logging.info("Stopping active job")
-    if current_thread and current_thread.is_alive():
-        stop_all_effects()
-        current_thread.join()
+    return render_loop.stop()
 
-    reset_stop_flags()
-
-    with effect_lock:
-        current_effect = None
-        current_thread = None
+# the effect to go back to when external frames stop
+last_effect = None
 
 def effect_runner(job_name, *args):
-    global current_effect, current_thread
-
-    def run_job():
-        global current_effect, current_thread
-        logging.info("Running job %s", job_name)
-        try:
-            job_callable = jobs[job_name]
-            result = job_callable(*args)
-            if inspect.isawaitable(result):
-                asyncio.run(result)
-        except Exception:  # pragma: no cover - logged for debugging
-            logging.exception("Job %s failed", job_name)
-        finally:
-            with effect_lock:
-                current_effect = None
-                current_thread = None
-            reset_stop_flags()
-
-    stop_current_job()
-    reset_stop_flags()
-
-    with effect_lock:
-        current_effect = job_name
-        current_thread = Thread(target=run_job)
-        current_thread.start()
-    
+    global last_effect
+    if job_name != "ingest":
+        last_effect = (job_name, args)
+    return render_loop.start(job_name, lambda: jobs[job_name](*args))
+
+def resume_last_effect():
+    if last_effect is not None:
+        effect_runner(last_effect[0], *last_effect[1])
+
+
+ingest = None
+if INGEST_PORT:
+    ingest = FrameIngest(
+        controller.numPixels,
+        port=int(INGEST_PORT),
+        on_start=lambda: effect_runner("ingest"),
+        on_timeout=resume_last_effect,
+    )
+    jobs["ingest"] = lambda: ingest.play(controller)
+
+    def _ingest_stat(key):
+        return lambda: ingest.stats()[key]
+
+    metrics.REGISTRY.gauge("led_ingest_fps", "Rate external frames are arriving at.", _ingest_stat("fps"))
+    metrics.REGISTRY.gauge("led_ingest_frames_total", "External frames received.", _ingest_stat("received"), "counter")
+    metrics.REGISTRY.gauge("led_ingest_late_total", "External frames skipped for arriving too late.", _ingest_stat("late"), "counter")
+    metrics.REGISTRY.gauge("led_ingest_dropped_total", "External frames dropped from a full jitter buffer.", _ingest_stat("dropped"), "counter")
+
+
+def stats_json():
+    stats = {"effect": render_loop.current_name, "frames": controller.scheduler.stats()}
+    if ingest is not None:
+        stats["ingest"] = ingest.stats()
+    return stats
+
+
+hub.start_ticker("stats", stats_json)
+
+if startup.run_startup_effect(effect_runner, jobs):
+    startup_timer.mark("startup effect")
+
+
+# shared by the REST routes and /command, each returns (body, status)
+def start_command(job_name, args=()):
+    if job_name not in jobs:
+        return {"error": f"Effect '{job_name}' does not exist"}, 404
+    if job_name == "text_effect":
+        return text_command(args[0] if args else "")
+    try:
+        effect_runner(job_name, *args)
+    except queue.Full:
+        return BUSY
+    print(f"started {job_name}")
+    return {"message": f"Effect '{job_name}' started"}, 200
+
+def text_command(text):
+    """Fetch text's embedding in the background, the effect starts once it's there."""
+    if not text:
+        return {"error": "Text input is required"}, 400
+    job = text_jobs.submit(text)
+    return {"job_id": job["id"], "status": job["status"]}, 202
+
+def stop_command():
+    if not render_loop.running:
+        logging.warning("Stop requested with no active job")
+        return {"error": "No effect is currently running"}, 400
+    try:
+        stop_current_job()
+    except queue.Full:
+        return BUSY
+    return {"message": "Effect stopped"}, 200
+
+def settings_command(data):
+    """Any of colors (#rrggbb list), delay (ms) and brightness (0-255); the rest stay as they are."""
+    changes = {}
+    try:
+        if data.get("colors") is not None:
+            changes["colors"] = [hex_to_color(value) for value in data["colors"]]
+        if data.get("delay") is not None:
+            changes["delay"] = int(data["delay"])
+        if data.get("brightness") is not None:
+            changes["brightness"] = int(data["brightness"])
+    except (AttributeError, TypeError, ValueError):
+        return {"error": "colors must be #rrggbb values, delay a number of ms and brightness 0-255"}, 400
+    if not changes:
+        return {"error": "No settings given"}, 400
+    try:
+        # the render loop applies them later, reject bad values now
+        controller.settings.updated(**changes)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    try:
+        apply_settings(**changes)
+    except queue.Full:
+        return BUSY
+    return {"message": "Settings saved"}, 200
+
+
+BUSY = {"error": "Render loop is busy, try again"}, 503
+
+def render_busy():
+    return jsonify(BUSY[0]), BUSY[1]
+
+
+# embeddings are fetched in the background, the job above only shows the
+# cached result once the newest text's fetch completes
+text_jobs = TextEffectJobs(
+    fetch=fetch_embedding,
+    display=lambda text, embedding: effect_runner("text_effect", text, embedding),
+)
+
 
 @app.route("/", methods=["GET"])
 def index():
@@ -189,79 +270,122 @@ def voice_control():
 def settings_page():
     return render_template('settings.html')
 
+# the settings form, or JSON with just the fields to change, e.g. {"delay": 40}
 @app.route("/update-settings", methods=["POST"])
 def update_settings():
-    global current_settings
-
-    data = request.form
-    color_hex_values = [
-        data.get("color1", "#ffffff"),
-        data.get("color2", "#ff0000"),
-        data.get("color3", "#0000ff"),
-    ]
-    delay_ms = int(data.get("delay", 500))
-
-    def hex_to_color(value: str):
-        value = value.lstrip('#')
-        r = int(value[0:2], 16)
-        g = int(value[2:4], 16)
-        b = int(value[4:6], 16)
-        return Color(r, g, b)
-
-    current_settings = {
-        "colors": [hex_to_color(value) for value in color_hex_values],
-        "delay": delay_ms,
-    }
-
-    apply_settings()
-
-    return jsonify({"message": "Settings saved"}), 200
+    data = request.get_json(silent=True)
+    if data is None:
+        form = request.form
+        data = {"delay": form.get("delay"), "brightness": form.get("brightness")}
+        if "color1" in form:
+            data["colors"] = [form[key] for key in ("color1", "color2", "color3") if key in form]
+    body, status = settings_command(data)
+    return jsonify(body), status
 
 @app.route("/get-settings", methods=["GET"])
 def get_settings():
-    def color_to_hex(color_value):
-        r = (color_value >> 16) & 0xFF
-        g = (color_value >> 8) & 0xFF
-        b = color_value & 0xFF
-        return f"#{r:02x}{g:02x}{b:02x}"
-
-    response = {
-        "colors": [color_to_hex(value) for value in current_settings["colors"]],
-        "delay": current_settings["delay"],
-    }
-    return jsonify(response), 200
+    return jsonify(settings_json()), 200
 
 @app.route("/start", methods=["POST"])
 def start_effect():
-    global current_effect, current_thread
-
     data = request.json
-    job_name = data.get("effect")
-    if job_name not in jobs:
-        return jsonify({"error": f"Effect '{job_name}' does not exist"}), 404
-
-    args = data.get("args", [])
-    effect_runner(job_name, *args)
-    print(f"started {job_name}")
-    return jsonify({"message": f"Effect '{job_name}' started"}), 200
+    body, status = start_command(data.get("effect"), data.get("args", []))
+    return jsonify(body), status
 
 @app.route("/stop", methods=["POST"])
 def stop_effect():
-    global current_effect, current_thread
-
-    if not current_thread or not current_thread.is_alive():
-        logging.warning("Stop requested with no active job")
-        return jsonify({"error": "No effect is currently running"}), 400
-
-    stop_current_job()
-    return jsonify({"message": "Effect stopped"}), 200
+    body, status = stop_command()
+    return jsonify(body), status
+
+@app.route("/events", methods=["GET"])
+def events():
+    """server-sent events: effect, settings and stats as they change"""
+    return Response(
+        hub.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/preview", methods=["GET"])
+def preview_stream():
+    """binary frames of what the strip shows, see preview.py"""
+    return Response(
+        preview.stream(controller.framebuffer),
+        mimetype="application/octet-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/command", methods=["POST"])
+def command():
+    """one endpoint for the live pages: {"type": "start" | "stop" | "settings", ...}"""
+    data = request.json or {}
+    command_type = data.get("type")
+    if command_type == "start":
+        body, status = start_command(data.get("effect"), data.get("args", []))
+    elif command_type == "stop":
+        body, status = stop_command()
+    elif command_type == "settings":
+        body, status = settings_command(data)
+    else:
+        body, status = {"error": f"Unknown command '{command_type}'"}, 400
+    return jsonify(body), status
+
+@app.route("/text_effect", methods=["POST"])
+def text_effect():
+    data = request.json or {}
+    body, status = text_command(data.get("text", ""))
+    return jsonify(body), status
+
+@app.route("/text_effect/<job_id>", methods=["GET"])
+def text_effect_status(job_id):
+    job = text_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' does not exist"}), 404
+    return jsonify(job), 200
+
+@app.route("/pixels", methods=["POST"])
+def set_pixels():
+    """expects {"pixels": [[index, "#rrggbb"], ...]}, only drawn while no effect runs"""
+    data = request.json or {}
+    pixels = data.get("pixels") or []
+    try:
+        indices = np.array([int(index) for index, _ in pixels], dtype=int)
+        values = np.array([int(value.lstrip("#"), 16) for _, value in pixels], dtype=np.uint32)
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({"error": "pixels must be a list of [index, \"#rrggbb\"] pairs"}), 400
+    if len(indices) and (indices.min() < 0 or indices.max() >= controller.numPixels):
+        return jsonify({"error": f"Pixel index out of range 0-{controller.numPixels - 1}"}), 400
+
+    if render_loop.running:
+        return jsonify({"error": "An effect is running, stop it before setting pixels"}), 409
+    try:
+        render_loop.submit("pixels", indices, values)
+    except queue.Full:
+        return render_busy()
+    return jsonify({"message": f"{len(indices)} pixels queued"}), 202
 
 @app.route("/status", methods=["GET"])
 def status():
-    if not current_thread or not current_thread.is_alive():
-        return jsonify({"status": "idle"}), 200
+    if not render_loop.running:
+        return jsonify({"status": "idle", "startup": startup_timer.report()}), 200
+
+    response = {
+        "status": "running",
+        "startup": startup_timer.report(),
+        "effect": render_loop.current_name,
+        "frames": controller.scheduler.stats(),
+        "switch_seconds": render_loop.last_switch_seconds,
+    }
+    if ingest is not None:
+        response["ingest"] = ingest.stats()
+    return jsonify(response), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
-    return jsonify({"status": "running", "effect": current_effect}), 200
+startup_timer.mark("app")
+startup_timer.log()
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0")
+    app.run(debug=True, host="0.0.0.0", use_reloader=startup.RELOAD)
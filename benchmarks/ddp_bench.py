@@ -0,0 +1,82 @@
+"""Loopback throughput and packet loss benchmark for the DDP output.
+
+Streams random sparse updates to a local DDPReceiver and reports frames per
+second, bytes on the wire per frame and how far the node drifts from the
+sender under simulated packet loss:
+
+    python benchmarks/ddp_bench.py --pixels 120 1000 5000 --drop-rate 0 0.05
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import ddp
+
+
+def bench(num_pixels, frames, drop_rate, delta, changed_fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    receiver = ddp.DDPReceiver(num_pixels, drop_rate=drop_rate, seed=seed)
+    strip = ddp.DDPStrip(num_pixels, *receiver.address, delta=delta)
+    changes = max(1, int(num_pixels * changed_fraction))
+    mismatched = 0
+    try:
+        started = time.perf_counter()
+        for _ in range(frames):
+            strip.pixels[rng.integers(0, num_pixels, changes)] = rng.integers(0, 1 << 24, changes)
+            strip.show()
+        elapsed = time.perf_counter() - started
+
+        deadline = time.monotonic() + 1.0
+        while receiver.packets + receiver.dropped < strip.packets_sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+        mismatched = int(np.count_nonzero(receiver.pixels != strip.pixels))
+    finally:
+        strip.close()
+        receiver.close()
+
+    return {
+        "pixels": num_pixels,
+        "delta": delta,
+        "drop_rate": drop_rate,
+        "fps": round(frames / elapsed, 1),
+        "bytes_per_frame": round(strip.bytes_sent / frames, 1),
+        "packets_per_frame": round(strip.packets_sent / frames, 2),
+        "missed_frames": receiver.missed_frames,
+        "pixels_out_of_sync": mismatched,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pixels", type=int, nargs="+", default=[120, 1000, 5000])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--drop-rate", type=float, nargs="+", default=[0.0, 0.05])
+    parser.add_argument("--changed", type=float, default=0.05, help="fraction of pixels changed per frame")
+    parser.add_argument("--output", help="optional JSON output file")
+    args = parser.parse_args(argv)
+
+    results = [
+        bench(num_pixels, args.frames, drop_rate, delta, args.changed)
+        for num_pixels in args.pixels
+        for drop_rate in args.drop_rate
+        for delta in (False, True)
+    ]
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    for row in results:
+        print(
+            f"{row['pixels']:>6}px delta={row['delta']!s:<5} drop={row['drop_rate']:<5} "
+            f"{row['fps']:>9} fps {row['bytes_per_frame']:>9} B/frame "
+            f"missed={row['missed_frames']:<4} out_of_sync={row['pixels_out_of_sync']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
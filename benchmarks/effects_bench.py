@@ -0,0 +1,135 @@
+"""Headless render benchmark for every job registered in async-app.py.
+
+Runs each job against a FakePixelStrip for a fixed number of frames at
+several strip lengths, without frame pacing, and writes the results as JSON:
+
+    python benchmarks/effects_bench.py --frames 200 --output bench_results.json
+
+Compare two runs by diffing the "results" lists; every entry is keyed by
+job name and strip length.
+"""
+import argparse
+import importlib.util
+import inspect
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "tests"))
+
+from fakes import FakePixelStrip, install_fake_ws281x
+
+DEFAULT_LENGTHS = (120, 600, 3000)
+DEFAULT_FRAMES = 200
+
+
+def load_async_app():
+    install_fake_ws281x()
+    spec = importlib.util.spec_from_file_location("async_app_bench", PROJECT_ROOT / "async-app.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def job_args(job_name):
+    """Arguments for jobs that can't start without them."""
+    if job_name == "text_effect":
+        import embeddings
+
+        # a fixed text and a local embedding, no network in a benchmark
+        text = "benchmark"
+        return text, embeddings.HashEmbeddingProvider().embed(text)
+    return ()
+
+
+def frame_source(app, job_name):
+    """Yield once per rendered frame, restarting jobs that finish."""
+    args = job_args(job_name)
+    while True:
+        result = app.jobs[job_name](*args)
+        if inspect.isgenerator(result):
+            for _ in result:
+                yield
+        else:
+            # one-shot jobs draw and flush a single frame per call
+            yield
+
+
+def bench_job(app, job_name, num_pixels, frames):
+    strip = FakePixelStrip(num_pixels)
+    settings = app.controller.settings
+    app.strip = strip
+    app.controller = app.StripController(strip)
+    app.controller.settings = settings
+
+    source = frame_source(app, job_name)
+    started = time.perf_counter()
+    for _ in range(frames):
+        next(source)
+        app.controller.show()
+    elapsed = time.perf_counter() - started
+    source.close()
+
+    return {
+        "job": job_name,
+        "pixels": num_pixels,
+        "frames": frames,
+        "fps": round(frames / elapsed, 1) if elapsed else None,
+        "us_per_frame": round(elapsed / frames * 1e6, 1),
+        "set_pixel_calls_per_frame": strip.set_pixel_calls / frames,
+        "show_calls_per_frame": strip.show_calls / frames,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(job_names=None, lengths=DEFAULT_LENGTHS, frames=DEFAULT_FRAMES):
+    app = load_async_app()
+    job_names = job_names or sorted(app.jobs)
+    results = [
+        bench_job(app, job_name, num_pixels, frames)
+        for job_name in job_names
+        for num_pixels in lengths
+    ]
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "frames": frames,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(DEFAULT_LENGTHS))
+    parser.add_argument("--jobs", nargs="+", help="job names, defaults to every job")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    report = run(args.jobs, args.lengths, args.frames)
+    Path(args.output).write_text(json.dumps(report, indent=2))
+
+    for row in report["results"]:
+        print(
+            f"{row['job']:>12} {row['pixels']:>5}px {row['fps']:>10} fps "
+            f"{row['us_per_frame']:>10} us/frame "
+            f"{row['set_pixel_calls_per_frame']:>7} setPixelColor "
+            f"{row['show_calls_per_frame']:>5} show"
+        )
+
+
+if __name__ == "__main__":
+    main()
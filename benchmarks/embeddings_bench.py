@@ -0,0 +1,61 @@
+"""Micro-benchmark for the embedding to frame mappings in embeddings.py.
+
+Times every entry in embeddings.MAPPINGS plus the old per-pixel colorsys
+loop for reference:
+
+    python benchmarks/embeddings_bench.py --pixels 120 600 3000
+"""
+import argparse
+import json
+import sys
+import timeit
+from colorsys import hsv_to_rgb
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "tests"))
+
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+import embeddings
+from rpi_ws281x import Color
+
+
+def hsv_loop_reference(embedding, count):
+    """The pre-numpy HSV mapping, one colorsys call and Color per pixel."""
+    values = np.array(embedding[:count])
+    normalized = (values - values.min()) / (values.max() - values.min())
+    return [Color(*(int(c * 255) for c in hsv_to_rgb(value, 1.0, 1.0))) for value in normalized]
+
+
+def run(lengths, number):
+    embedding = embeddings.HashEmbeddingProvider(dimensions=1536).embed("benchmark")
+    variants = dict(embeddings.MAPPINGS, hsv_loop_reference=hsv_loop_reference)
+    results = []
+    for count in lengths:
+        for name, mapping in variants.items():
+            seconds = timeit.timeit(lambda: mapping(embedding, count), number=number)
+            results.append({"mapping": name, "pixels": count, "us_per_frame": round(seconds / number * 1e6, 2)})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pixels", type=int, nargs="+", default=[120, 600, 3000])
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--output", help="optional JSON output file")
+    args = parser.parse_args(argv)
+
+    results = run(args.pixels, args.number)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    for row in results:
+        print(f"{row['mapping']:>20} {row['pixels']:>5}px {row['us_per_frame']:>10} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Headless race benchmark and fairness check for light_race.
+
+Times full races without a strip for several field sizes, then simulates
+many races side by side and reports each racer's share of the wins:
+
+    python benchmarks/race_bench.py --racers 3 100 500 --races 10000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "tests"))
+
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+import light_race
+
+
+def run(racer_counts, track_length, repeat, races, seed):
+    results = []
+    for num_racers in racer_counts:
+        started = time.perf_counter()
+        ticks = 0
+        for i in range(repeat):
+            ticks += light_race.simulate(num_racers, track_length, seed=seed + i)["ticks"]
+        seconds = time.perf_counter() - started
+        results.append({
+            "racers": num_racers,
+            "track_length": track_length,
+            "ms_per_race": round(seconds / repeat * 1e3, 3),
+            "us_per_tick": round(seconds / ticks * 1e6, 2),
+        })
+
+    wins = light_race.win_counts(races, 3, track_length, seed=seed)
+    fairness = {"races": races, "win_share": [round(w / races, 4) for w in wins.tolist()]}
+    return {"races": results, "fairness": fairness}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--racers", type=int, nargs="+", default=[3, 100, 500])
+    parser.add_argument("--track-length", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--races", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="optional JSON output file")
+    args = parser.parse_args(argv)
+
+    results = run(args.racers, args.track_length, args.repeat, args.races, args.seed)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    for row in results["races"]:
+        print(f"{row['racers']:>5} racers {row['ms_per_race']:>9} ms/race {row['us_per_tick']:>8} us/tick")
+    print(f"win share over {args.races} races: {results['fairness']['win_share']}")
+
+
+if __name__ == "__main__":
+    main()
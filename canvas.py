@@ -0,0 +1,182 @@
+"""several physical strips presented as one logical canvas
+
+Each output is a strip on its own pin and DMA channel, one per peripheral:
+PWM (GPIO 12, 13, 18 or 19), PCM (GPIO 21) or SPI (GPIO 10). Two outputs
+can't share the PWM peripheral, rpi_ws281x would set it up twice. Each
+output carries one or more segments: a run of canvas pixels and where it
+lands on that strip. The canvas quacks like a single PixelStrip, so the
+framebuffer and effects don't know how many strips are behind it.
+
+Outputs come from LED_OUTPUTS (a JSON list) or the file named by
+LED_OUTPUTS_FILE, e.g.
+
+    [{"count": 120, "pin": 18, "dma": 10},
+     {"count": 300, "pin": 21, "dma": 11, "reverse": true}]
+
+Without segments an output is appended to the end of the canvas. With no
+config at all it's the single 120 pixel strip on GPIO 18. An output with
+"type": "ddp" and a "host" (optional "port", "delta") is a remote node fed
+over UDP, see ddp.py. "strip_type" names an rpi_ws281x constant such as
+"WS2811_STRIP_GRB" or "SK6812_STRIP_RGBW".
+"""
+import json
+import os
+
+import numpy as np
+
+from ddp import DDP_PORT, DDPStrip
+from framebuffer import write_pixels
+
+# GPIOs driven by the one PWM peripheral, at most one output may use them
+PWM_PINS = {12, 13, 18, 19}
+
+# matches the PixelStrip arguments the apps always used
+DEFAULT_OUTPUT = {
+    "count": 120,
+    "pin": 18,
+    "freq_hz": 800000,
+    "dma": 5,
+    "invert": False,
+    "brightness": 255,
+    "channel": 0,
+}
+
+
+class Segment:
+    """Canvas pixels [start, start + count) shown on strip pixels [offset, offset + count)."""
+
+    def __init__(self, strip, start, count, offset=0, reverse=False):
+        self.strip = strip
+        self.start = start
+        self.count = count
+        self.offset = offset
+        self.reverse = reverse
+
+    @property
+    def stop(self):
+        return self.start + self.count
+
+    def strip_pixels(self):
+        pixels = self.offset + np.arange(self.count)
+        return pixels[::-1] if self.reverse else pixels
+
+
+class StripCanvas:
+    """One logical strip fanned out over the segments' physical strips.
+
+    Writes go straight to the right strip and mark it dirty; show() pushes
+    every dirty strip in turn. PWM and PCM strips return once their DMA
+    transfer has started, so those transfers overlap; an SPI strip's show()
+    waits for its whole transfer.
+    """
+
+    def __init__(self, segments):
+        self.segments = list(segments)
+        self.strips = []
+        for segment in self.segments:
+            if not any(segment.strip is strip for strip in self.strips):
+                self.strips.append(segment.strip)
+        self.size = max((segment.stop for segment in self.segments), default=0)
+
+        # per canvas pixel: which strip shows it (-1 for gaps) and where
+        self._strip_of = np.full(self.size, -1, dtype=int)
+        self._pixel_of = np.zeros(self.size, dtype=int)
+        for segment in self.segments:
+            if (self._strip_of[segment.start:segment.stop] >= 0).any():
+                raise ValueError(f"Segment at {segment.start} overlaps another segment")
+            self._strip_of[segment.start:segment.stop] = self._strip_number(segment.strip)
+            self._pixel_of[segment.start:segment.stop] = segment.strip_pixels()
+
+        self._dirty = set()
+
+    def _strip_number(self, strip):
+        return next(i for i, known in enumerate(self.strips) if known is strip)
+
+    def begin(self):
+        for strip in self.strips:
+            strip.begin()
+
+    def numPixels(self):
+        return self.size
+
+    def setPixelColor(self, index, color):
+        if 0 <= index < self.size and self._strip_of[index] >= 0:
+            number = int(self._strip_of[index])
+            self.strips[number].setPixelColor(int(self._pixel_of[index]), color)
+            self._dirty.add(number)
+
+    def set_pixels(self, indices, colors):
+        """Write canvas pixels indices, one write_pixels() per strip they land on."""
+        numbers = self._strip_of[indices]
+        for number in np.unique(numbers[numbers >= 0]).tolist():
+            mine = numbers == number
+            write_pixels(self.strips[number], self._pixel_of[indices[mine]], colors[mine])
+            self._dirty.add(number)
+
+    def show(self):
+        for number in sorted(self._dirty):
+            self.strips[number].show()
+        self._dirty.clear()
+
+
+def load_outputs():
+    """Output configs from LED_OUTPUTS / LED_OUTPUTS_FILE, or the single default strip."""
+    raw = os.getenv("LED_OUTPUTS")
+    path = os.getenv("LED_OUTPUTS_FILE")
+    if not raw and path:
+        with open(path) as config_file:
+            raw = config_file.read()
+    return json.loads(raw) if raw else [{}]
+
+
+def strip_type_constant(name):
+    """The rpi_ws281x strip type called name, e.g. "WS2811_STRIP_GRB", or None for the default."""
+    if name is None:
+        return None
+    from rpi_ws281x import ws
+    value = getattr(ws, name, None) if isinstance(name, str) and "_STRIP" in name else None
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown strip_type {name!r}, expected an rpi_ws281x constant like WS2811_STRIP_GRB")
+    return value
+
+
+def build_canvas(outputs, strip_factory=None):
+    """Create and begin() one strip per output and map them onto a canvas."""
+    if strip_factory is None:
+        from rpi_ws281x import PixelStrip
+        strip_factory = PixelStrip
+
+    segments = []
+    end = 0
+    pwm_pin = None
+    for output in outputs:
+        config = dict(DEFAULT_OUTPUT, **output)
+        if config.get("type") != "ddp" and config["pin"] in PWM_PINS:
+            if pwm_pin is not None:
+                raise ValueError(f"GPIO {pwm_pin} and {config['pin']} are both PWM outputs, "
+                                 "use PCM (GPIO 21) or SPI (GPIO 10) for the second strip")
+            pwm_pin = config["pin"]
+        if config.get("type") == "ddp":
+            strip = DDPStrip(config["count"], config["host"], config.get("port", DDP_PORT),
+                             delta=config.get("delta", False))
+        else:
+            strip = strip_factory(
+                config["count"], config["pin"], config["freq_hz"], config["dma"],
+                config["invert"], config["brightness"], config["channel"],
+                strip_type=strip_type_constant(config.get("strip_type")),
+            )
+        layout = config.get("segments") or [{"reverse": config.get("reverse", False)}]
+        for spec in layout:
+            segment = Segment(
+                strip,
+                start=spec.get("start", end),
+                count=spec.get("count", config["count"]),
+                offset=spec.get("offset", 0),
+                reverse=spec.get("reverse", False),
+            )
+            segments.append(segment)
+            end = max(end, segment.stop)
+
+    canvas = StripCanvas(segments)
+    canvas.begin()
+    return canvas
@@ -1,83 +1,132 @@
-import time
+import os
 from datetime import datetime as dt
-import asyncio
+from functools import lru_cache
 
-import pytz
-import rpi_ws281x
+import numpy as np
 import colors
+from compositor import Compositor
 
-stop_flag = False
-def set_stop_flag(value: bool):
-    global stop_flag
-    stop_flag = value
+# Clocks are frame generators like the effects in effects.py. They redraw
+# only when the displayed time changes and sleep until just past the next
+# wall-clock second, so ticks line up with real second boundaries. Frames
+# are composed in the framebuffer, which flushes only the pixels that
+# changed since the last tick.
 
-def clock(strip):
+CLOCK_TIMEZONE = os.getenv("CLOCK_TIMEZONE", "America/New_York")
+
+# wake this long after the second boundary so we never read the old second
+TICK_MARGIN = 0.005
+
+
+@lru_cache(maxsize=None)
+def _load_timezone(name):
+    import pytz
+
+    return pytz.timezone(name)
+
+
+def get_timezone(name=None):
+    """pytz timezone for name (defaults to CLOCK_TIMEZONE), loaded once.
+
+    pytz and its zone data are only imported once a clock actually runs.
+    """
+    return _load_timezone(name or CLOCK_TIMEZONE)
+
+
+def set_timezone(name):
+    """Change the timezone used by clocks started from now on."""
+    global CLOCK_TIMEZONE
+    get_timezone(name)  # raises UnknownTimeZoneError for bad names
+    CLOCK_TIMEZONE = name
+
+
+def until_next_second(now):
+    return 1.0 - now.microsecond / 1_000_000 + TICK_MARGIN
+
+
+def _fill(controller, start, stop, color):
+    """Same as set_pixel for every index in range(start, stop)."""
+    start = max(start, 0)
+    stop = min(stop, controller.numPixels)
+    if start < stop:
+        controller.pixels[start:stop] = color
+
+
+def _draw(controller, indices, color):
+    """Set an array of indices, skipping any that are off the strip."""
+    controller.pixels[indices[(indices >= 0) & (indices < controller.numPixels)]] = color
+
+
+@lru_cache(maxsize=None)
+def _minute_markers(min_start):
+    minute_max = (min_start//10) * 10
+    minute_markers = [minute_max - i for i in range(1, min_start, 10)]
+    extra_min = min_start - minute_max
+    minute_markers.extend([minute_max + i for i in range(extra_min) if i % 2])
+    return np.array(minute_markers, dtype=int)
+
+
+@lru_cache(maxsize=None)
+def _hour_markers(hour_start):
+    hour_max = (hour_start // 10) * 10
+    return np.array([hour_max - i for i in range(1, hour_start, 10)], dtype=int)
+
+
+@lru_cache(maxsize=None)
+def _five_minute_markers(num_pixels):
+    return np.arange(0, num_pixels, num_pixels // 12)
+
+
+def _ticks(controller, draw):
+    """Call draw(controller, hour, minute, second) whenever the second changes."""
+    timezone = get_timezone()
+    shown = None
+
+    while True:
+        now = dt.now(timezone)
+        current = (now.hour, now.minute, now.second)
+        if current != shown:
+            draw(controller, *current)
+            shown = current
+        yield until_next_second(now)
+
+
+def clock(controller):
     """clock 1 : theres some sections and offsets every 2 seconds, seconds updates"""
-    num_pixels = strip.numPixels()
-    timezone = pytz.timezone('America/New_York')
-    
     offset = 2
     hour_offset = 12
     minute_offset = 60
 
-    while True and not stop_flag:
+    def draw(controller, hour, minute, second):
         start_idx = 6
-
-        ct = dt.now(timezone).time()
-        hour = ct.hour
-        minute = ct.minute
-        second = ct.second
-
-        print("first", hour, minute, second, sep=":")
-        
         hour_limit = hour % 12
         second_limit = second // 2
 
-        print("second", hour_limit, minute, second_limit, sep=":")
-
         # blue for PM, red for AM
         hour_color = colors.BLUE if hour > 12 else colors.RED
         minute_color = colors.GREEN
         second_color = colors.PURPLE
 
         #clear board
-        for i in range(num_pixels):
-                strip.setPixelColor(i, colors.OFF)
+        controller.pixels[:] = colors.OFF
 
         #set hour pixels
-        for i in range(hour_limit):
-            strip.setPixelColor(start_idx + i, hour_color)
-        
+        _fill(controller, start_idx, start_idx + hour_limit, hour_color)
         start_idx += (offset + hour_offset)
-        print(start_idx)
 
         #set minute pixels
-        for i in range(minute):
-            strip.setPixelColor(start_idx + i, minute_color)
+        _fill(controller, start_idx, start_idx + minute, minute_color)
 
         #set second pixels
         start_idx += (minute_offset + offset)
-        print(start_idx)
-        for i in range(second_limit):
-            strip.setPixelColor(start_idx + i, second_color)
+        _fill(controller, start_idx, start_idx + second_limit, second_color)
 
-        strip.show()
-        time.sleep(1)
+    return _ticks(controller, draw)
 
-def clock2(strip):
+def clock2(controller):
     """utilizes the whole strip"""
-    num_pixels = strip.numPixels()
-    timezone = pytz.timezone('America/New_York')
-
-    while True and not stop_flag:
-
-        ct = dt.now(timezone).time()
-        hour = ct.hour
-        minute = ct.minute
-        second = ct.second
-
-        print("first", hour, minute, second, sep=":")
 
+    def draw(controller, hour, minute, second):
         hour_start = (hour % 12) * 10
         min_start = minute * 2
         sec_start = second * 2
@@ -88,43 +137,23 @@ def clock2(strip):
         second_color = colors.PURPLE
 
         #clear board
-        for i in range(num_pixels):
-            strip.setPixelColor(i, colors.OFF)
+        controller.pixels[:] = colors.OFF
 
         #set the hour pixels
-        for i in range(hour_start - 10, hour_start):
-            strip.setPixelColor(i, hour_color)
+        _fill(controller, hour_start - 10, hour_start, hour_color)
 
         #set the minutes
-        strip.setPixelColor(min_start, minute_color)
-        strip.setPixelColor(min_start + 1, minute_color)
+        _fill(controller, min_start, min_start + 2, minute_color)
 
         # set the seconds
-        strip.setPixelColor(sec_start, second_color)
-        strip.setPixelColor(sec_start + 1, second_color)
-        
-        strip.show()
-        time.sleep(1)
+        _fill(controller, sec_start, sec_start + 2, second_color)
 
-def clock3(strip):
-    "clock2 with fill"
-    num_pixels = strip.numPixels()
-    timezone = pytz.timezone('America/New_York')
-
-    while True and not stop_flag:
-
-        ct = dt.now(timezone).time()
-        hour = ct.hour
-        minute = ct.minute
-        second = ct.second
-
-        print("first", hour, minute, second, sep=":")
-        
-        hour_limit = hour % 12
-        second_limit = second // 2
+    return _ticks(controller, draw)
 
-        print("second", hour_limit, minute, second_limit, sep=":")
+def clock3(controller):
+    "clock2 with fill"
 
+    def draw(controller, hour, minute, second):
         hour_start_idx = (hour % 12) * 10
         min_start = minute * 2
         sec_start = second * 2
@@ -135,51 +164,29 @@ def clock3(strip):
         second_color = colors.PURPLE
 
         #clear board
-        for i in range(num_pixels):
-                strip.setPixelColor(i, colors.OFF)
-    
+        controller.pixels[:] = colors.OFF
+
         #set the hour pixels
-        for i in range(hour_start_idx):
-            strip.setPixelColor(i, hour_color)
+        _fill(controller, 0, hour_start_idx, hour_color)
 
         # set the minute dependent on the hour
         if(min_start <= hour_start_idx):
-            print("dots")
-            strip.setPixelColor(min_start, minute_color)
-            strip.setPixelColor(min_start+1, minute_color)
-        
+            _fill(controller, min_start, min_start + 2, minute_color)
         else:
-            print("fill")
-            for i in range(hour_start_idx, min_start):
-                strip.setPixelColor(i, minute_color)
+            _fill(controller, hour_start_idx, min_start, minute_color)
 
         # set the second depenedent on the minute
         if(sec_start <= max(hour_start_idx, min_start)):
-            print("dots")
-            strip.setPixelColor(sec_start, second_color)
-            strip.setPixelColor(sec_start+1, second_color)
-        
+            _fill(controller, sec_start, sec_start + 2, second_color)
         else:
-            print("fill")
-            for i in range(min_start, sec_start):
-                strip.setPixelColor(i, second_color)
-        
-        strip.show()
-        time.sleep(1)
-
-def clock4(strip):
-    "clock with markers"
-    num_pixels = strip.numPixels()
-    timezone = pytz.timezone('America/New_York')
+            _fill(controller, min_start, sec_start, second_color)
 
-    while True and not stop_flag:
-        ct = dt.now(timezone).time()
-        hour = ct.hour
-        minute = ct.minute
-        second = ct.second
+    return _ticks(controller, draw)
 
-        print("first", hour, minute, second, sep=":")
+def clock4(controller):
+    "clock with markers"
 
+    def draw(controller, hour, minute, second):
         hour_start = (hour % 12) * 10
         min_start = minute * 2
         sec_start = second * 2
@@ -190,85 +197,62 @@ def clock4(strip):
         second_color = colors.PURPLE
 
         #clear board
-        for i in range(num_pixels):
-                strip.setPixelColor(i, colors.OFF)
-
-        #draw the minute markers
-        minute_max = (min_start//10) * 10
-        minute_markers = [minute_max - i for i in range(1, min_start, 10)]
-        extra_min = min_start - minute_max
-        minute_markers.extend([minute_max + i for i in range(extra_min) if i % 2])
-    
-        for i in minute_markers:
-            strip.setPixelColor(i, minute_color)
-
-        hour_max = (hour_start // 10) * 10
-        hour_markers = [hour_max - i for i in range(1, hour_start, 10)]
-        for i in hour_markers:
-                strip.setPixelColor(i, hour_color)
-        
-
-        if(extra_min == 0):
-            strip.setPixelColor(minute_max -1, minute_color)
-
-        # draw the seconds  
-        strip.setPixelColor(sec_start, second_color)
-        strip.setPixelColor(sec_start+1, second_color)
-            
-        strip.show()
-        time.sleep(1)
-
-
-def clock5(strip):
-    "clock with markers"
-    num_pixels = strip.numPixels()
-    timezone = pytz.timezone('America/New_York')
+        controller.pixels[:] = colors.OFF
 
-    while not stop_flag:
-        ct = dt.now(timezone).time()
-        hour = ct.hour
-        minute = ct.minute
-        second = ct.second
+        #draw the minute and hour markers, both are cached per position
+        _draw(controller, _minute_markers(min_start), minute_color)
+        _draw(controller, _hour_markers(hour_start), hour_color)
 
-        print("first", hour, minute, second, sep=":")
+        if(min_start % 10 == 0):
+            controller.set_pixel(min_start - 1, minute_color)
 
-        hour_start = (hour % 12) * 10
-        min_start = minute * 2
-        sec_start = second * 2
+        # draw the seconds
+        _fill(controller, sec_start, sec_start + 2, second_color)
 
-        # blue for PM, red for AM
-        hour_color = colors.BLUE if hour >= 12 else colors.RED
-        minute_color = colors.GREEN
+    return _ticks(controller, draw)
+
+
+def clock5(controller):
+    "clock with markers"
+    timezone = get_timezone()
+
+    while True:
+        second = dt.now(timezone).second
+        sec_start = second * 2
         second_color = colors.PURPLE
 
-        for i in (range(num_pixels)):
-            strip.setPixelColor(i, colors.OFF)
+        controller.pixels[:] = colors.OFF
 
         #light up the strip
-        for j in (range(sec_start-1)):
-            strip.setPixelColor(j, second_color)
+        _fill(controller, 0, sec_start - 1, second_color)
 
-        #loop through and rollout
+        #loop through and rollout, each step only moves two pixels
         for j in (range(1, sec_start)):
-            strip.setPixelColor(j, colors.OFF)
-            strip.setPixelColor(j - 1, second_color)
-            strip.show()
-            time.sleep(1 / second) #this should always make the rollout take one second
-        
-            
-        strip.show()
-
-async def clock6(strip):
-    """Clock with rollout animation for seconds."""
-    global stop_flag
-    num_pixels = strip.numPixels()
-    timezone = pytz.timezone("America/New_York")
+            controller.set_pixel(j, colors.OFF)
+            controller.set_pixel(j - 1, second_color)
+            yield 1 / second #this should always make the rollout take one second
+
+        if sec_start < 2:
+            # nothing to roll out at the top of the minute
+            yield until_next_second(dt.now(timezone))
 
-    while not stop_flag:
-        ct = dt.now(timezone).time()
-        hour = ct.hour
-        minute = ct.minute
-        second = ct.second
+def clock6(controller):
+    """Clock with rollout animation for seconds."""
+    num_pixels = controller.numPixels
+    timezone = get_timezone()
+
+    # markers never change, the hands once a second, the rollout every frame
+    compositor = Compositor(num_pixels, background=colors.OFF)
+    markers = compositor.add_layer("markers")
+    hands = compositor.add_layer("hands")
+    rollout = compositor.add_layer("rollout")
+    markers.set(_five_minute_markers(num_pixels), colors.YELLOW)
+
+    while True:
+        now = dt.now(timezone)
+        hour = now.hour
+        minute = now.minute
+        second = now.second
 
         # Calculate LED positions
         hour_start = (hour % 12) * (num_pixels // 12)  # Hour markers
@@ -279,40 +263,23 @@ async def clock6(strip):
         hour_color = colors.BLUE if hour >= 12 else colors.RED
         minute_color = colors.GREEN
         second_color = colors.PURPLE
-        marker_color = colors.YELLOW
-
-        # Clear the strip
-        for i in range(num_pixels):
-            strip.setPixelColor(i, colors.OFF)
-
-        # Add markers every 5 minutes
-        for i in range(0, num_pixels, num_pixels // 12):
-            strip.setPixelColor(i, marker_color)
 
         # Set hour and minute markers
-        strip.setPixelColor(hour_start, hour_color)
-        strip.setPixelColor(min_start, minute_color)
+        hands.clear()
+        hands.set([hour_start], hour_color)
+        hands.set([min_start], minute_color)
+        rollout.clear()
 
-        # Rollout animation for seconds
+        # Rollout animation for seconds, spread over what's left of this second
         rollout_steps = sec_start  # Number of steps for the animation
-        delay = 1.0 / rollout_steps if rollout_steps > 0 else 1.0  # Calculate step delay
-
-        for j in range(rollout_steps):
-            if stop_flag:
-                break
-            strip.setPixelColor(j, second_color)
-            strip.show()
-            await asyncio.sleep(delay)
+        remaining = until_next_second(now)
+        if rollout_steps == 0:
+            compositor.compose(controller.pixels)
+            yield remaining
+            continue
 
-        # Turn off the second's rollout once complete
+        delay = remaining / rollout_steps
         for j in range(rollout_steps):
-            if stop_flag:
-                break
-            strip.setPixelColor(j, colors.OFF)
-
-        # Show the strip
-        strip.show()
-
-        # Wait for the next update
-        await asyncio.sleep(1 - delay * rollout_steps if rollout_steps > 0 else 1)
-
+            rollout.set([j], second_color)
+            compositor.compose(controller.pixels)
+            yield delay
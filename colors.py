@@ -1,4 +1,5 @@
 
+import numpy as np
 from rpi_ws281x import Color
 
 OFF = Color(0 , 0, 0)
@@ -43,4 +44,28 @@ def blue_hue(b):
     return Color (0, 0, b)
 
 def green_hue(g):
-    return Color (0, g, 0)
\ No newline at end of file
+    return Color (0, g, 0)
+
+
+def pack_rgb(r, g, b):
+    """Vectorized Color() for arrays of 0-255 channel values."""
+    r, g, b = (np.asarray(channel, dtype=np.uint32) for channel in (r, g, b))
+    return (r << 16) | (g << 8) | b
+
+
+# 256 entry lookup tables of packed colors, index with (pos & 255)
+WHEEL_LUT = np.array([wheel(pos) for pos in range(256)], dtype=np.uint32)
+WARM_WHEEL_LUT = np.array([warm_wheel(pos) for pos in range(256)], dtype=np.uint32)
+RED_HUE_LUT = np.array([red_hue(v) for v in range(256)], dtype=np.uint32)
+GREEN_HUE_LUT = np.array([green_hue(v) for v in range(256)], dtype=np.uint32)
+BLUE_HUE_LUT = np.array([blue_hue(v) for v in range(256)], dtype=np.uint32)
+
+
+def wheel_frame(num_pixels, offset=0, lut=WHEEL_LUT):
+    """Whole rainbow frame in one gather: pixel i gets lut[(i + offset) & 255]."""
+    return lut[(np.arange(num_pixels) + offset) & 255]
+
+
+def spread_frame(num_pixels, lut=WARM_WHEEL_LUT):
+    """Stretch the full lut once across the strip."""
+    return lut[(np.arange(num_pixels) * 256 // num_pixels) % 256]
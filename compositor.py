@@ -0,0 +1,138 @@
+"""layered compositing into the framebuffer
+
+An effect declares its layers bottom to top (static background, slow
+changing, per frame) and redraws only the ones that changed. compose()
+reuses the cached blend of every layer below the lowest changed one and
+blends each layer only over the pixels it covers, so a frame costs what
+moves rather than the strip length.
+"""
+import numpy as np
+
+BLEND_OVER = "over"  # alpha blend on top of the layers below
+BLEND_ADD = "add"  # per channel add, clipped at 255
+BLEND_MAX = "max"  # per channel max, i.e. lighten
+
+
+def _channels(pixels):
+    """View packed uint32 colors as (n, 4) uint16 channels for blending."""
+    return pixels.view(np.uint8).reshape(-1, 4).astype(np.uint16)
+
+
+def _pack(channels):
+    return channels.astype(np.uint8).reshape(-1).view(np.uint32)
+
+
+def mix(a, b, amount):
+    """Whole frames a and b mixed per channel, amount 0 is all a and 1 all b."""
+    weight = int(round(min(max(amount, 0.0), 1.0) * 256))
+    return _pack((_channels(a) * (256 - weight) + _channels(b) * weight) >> 8)
+
+
+def blend(dst, src, indices, mode=BLEND_OVER, alpha=1.0):
+    """Blend src onto dst at indices, in place."""
+    if len(indices) == 0:
+        return
+    if mode == BLEND_OVER and alpha >= 1.0:
+        dst[indices] = src[indices]
+        return
+
+    weight = int(round(alpha * 256))
+    below = _channels(dst[indices])
+    above = (_channels(src[indices]) * weight) >> 8
+    if mode == BLEND_OVER:
+        mixed = ((below * (256 - weight)) >> 8) + above
+    elif mode == BLEND_ADD:
+        mixed = np.minimum(below + above, 255)
+    elif mode == BLEND_MAX:
+        mixed = np.maximum(below, above)
+    else:
+        raise ValueError(f"Unknown blend mode '{mode}'")
+    dst[indices] = _pack(mixed)
+
+
+class Layer:
+    """Pixels plus a coverage mask; only covered pixels are blended."""
+
+    def __init__(self, name, num_pixels, blend=BLEND_OVER, alpha=1.0):
+        self.name = name
+        self.blend = blend
+        self.alpha = alpha
+        self.pixels = np.zeros(num_pixels, dtype=np.uint32)
+        self.mask = np.zeros(num_pixels, dtype=bool)
+        self.version = 0
+        self._indices = None
+
+    def touch(self):
+        """Mark the layer changed after writing pixels/mask directly."""
+        self.version += 1
+        self._indices = None
+
+    @property
+    def indices(self):
+        if self._indices is None:
+            self._indices = np.flatnonzero(self.mask)
+        return self._indices
+
+    def clear(self):
+        if self.mask.any():
+            self.mask[:] = False
+            self.touch()
+
+    def set(self, indices, color):
+        """Cover and color indices, ignoring any that are off the strip."""
+        indices = np.asarray(indices)
+        indices = indices[(indices >= 0) & (indices < len(self.pixels))]
+        self.pixels[indices] = color
+        self.mask[indices] = True
+        self.touch()
+
+    def fill(self, start, stop, color):
+        start = max(start, 0)
+        stop = min(stop, len(self.pixels))
+        if start < stop:
+            self.pixels[start:stop] = color
+            self.mask[start:stop] = True
+            self.touch()
+
+    def set_alpha(self, alpha):
+        if alpha != self.alpha:
+            self.alpha = alpha
+            self.touch()
+
+
+class Compositor:
+    def __init__(self, num_pixels, background=0):
+        self.num_pixels = num_pixels
+        self.background = np.full(num_pixels, background, dtype=np.uint32)
+        self.layers = []
+        # composite of layers[:i + 1] and the layer versions it was built from
+        self._cache = []
+        self._cache_versions = []
+
+    def add_layer(self, name, blend=BLEND_OVER, alpha=1.0):
+        layer = Layer(name, self.num_pixels, blend, alpha)
+        self.layers.append(layer)
+        return layer
+
+    def compose(self, out):
+        """Blend all layers into out (usually controller.pixels)."""
+        versions = [layer.version for layer in self.layers]
+
+        # everything below the first changed layer is still valid
+        start = 0
+        while (start < len(self._cache_versions) and start < len(versions)
+               and self._cache_versions[start] == versions[start]):
+            start += 1
+        del self._cache[start:]
+        del self._cache_versions[start:]
+
+        below = self._cache[-1] if self._cache else self.background
+        for layer, version in zip(self.layers[start:], versions[start:]):
+            composite = below.copy()
+            blend(composite, layer.pixels, layer.indices, layer.blend, layer.alpha)
+            self._cache.append(composite)
+            self._cache_versions.append(version)
+            below = composite
+
+        out[:] = below
+        return out
@@ -1,28 +1,46 @@
-from flask import Flask, jsonify, request, render_template
-from threading import Lock, Thread
+import startup
+
+startup_timer = startup.begin()
+
+import os
+import queue
+
+from flask import Flask, Response, jsonify, request, render_template
 from rpi_ws281x import PixelStrip, Color
-import time
-import asyncio
 
+from events import EventHub
 from ledstrip import LEDStripController
+from render import RenderEngine, RenderLoop
+from text_jobs import TextEffectJobs, fetch_embedding, show_embedding
 
 import effects
 import clock_effects
 import colors
 import light_race
-import embeddings
+import preview
+
+startup_timer.mark("imports")
 
 # Flask app initialization
 app = Flask(__name__)
 app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
 
+if __name__ == "__main__":
+    startup.hand_over_to_reloader(app)
+
 led_controller = LEDStripController()
 strip = led_controller.strip
-
-# Lock and job management
-effect_lock = Lock()
-current_effect = None
-current_thread = None
+startup_timer.mark("strip")
+engine = RenderEngine(led_controller, crossfade=float(os.getenv("LED_CROSSFADE", "0.5")),
+                      interpolate=os.getenv("LED_INTERPOLATE", "0") == "1")
+# render worker, owns the strip and applies commands between frames
+render_loop = RenderLoop(engine)
+startup_timer.mark("render loop")
+
+# live state for the web pages, see /events
+hub = EventHub()
+render_loop.listeners.append(lambda name: hub.publish("effect", {"effect": name}))
+hub.start_ticker("stats", lambda: {"effect": render_loop.current_name, "frames": led_controller.scheduler.stats()})
 
 # Effect runner
 jobs = {
@@ -33,46 +51,38 @@ jobs = {
     "leapfrog": lambda: effects.leap_frog(led_controller),
     "bounce": lambda: effects.bouncing_window(led_controller),
     "off": lambda: led_controller.off(),
-    "text_effect": lambda text: embeddings.display_text_as_lights(text),
-    "race": lambda: light_race.race(strip),
-    "clock": lambda: clock_effects.clock(strip),
-    "clock2": lambda: clock_effects.clock2(strip),
-    "clock3": lambda: clock_effects.clock3(strip),
-    "clock4": lambda: clock_effects.clock4(strip),
-    "clock5": lambda: clock_effects.clock5(strip),
-    "clock6": lambda: clock_effects.clock6(strip),
+    # only started by text_jobs, once the embedding is fetched off the render loop
+    "text_effect": lambda text, embedding: show_embedding(led_controller, text, embedding),
+    "race": lambda *args: light_race.race(led_controller, *args),
+    "clock": lambda: clock_effects.clock(led_controller),
+    "clock2": lambda: clock_effects.clock2(led_controller),
+    "clock3": lambda: clock_effects.clock3(led_controller),
+    "clock4": lambda: clock_effects.clock4(led_controller),
+    "clock5": lambda: clock_effects.clock5(led_controller),
+    "clock6": lambda: clock_effects.clock6(led_controller),
     "rollout": lambda: effects.roll_out(led_controller),
-    "allin": lambda: effects.allin(strip),
-    "clock_timer": lambda: effects.allin(strip)
+    "allin": lambda: effects.allin(led_controller),
+    "clock_timer": lambda: effects.allin(led_controller)
 }
 
+def job_running():
+    return render_loop.running
+
 def stop_current_job():
-    global current_effect, current_thread
     print("stopping the job")
-    if current_thread and current_thread.is_alive():
-        effects.set_stop_flag(True)  # Signal the job to stop
-        clock_effects.set_stop_flag(True)
-        current_thread.join()  # Wait for the thread to finish
-        effects.set_stop_flag(False)  # Reset the flag
-        clock_effects.set_stop_flag(False)
-
-        with effect_lock:
-            current_effect = None
-            current_thread = None
+    return render_loop.stop()
 
 def effect_runner(job_name, *args):
-    global current_effect, current_thread
+    return render_loop.start(job_name, lambda: jobs[job_name](*args))
 
-    def run_job():
-        asyncio.run(jobs[job_name](*args))
 
-    stop_current_job()
+if startup.run_startup_effect(effect_runner, jobs):
+    startup_timer.mark("startup effect")
 
-    with effect_lock:
-        current_effect = job_name
-        current_thread = Thread(target=run_job)
-        current_thread.start()
-    
+text_jobs = TextEffectJobs(
+    fetch=fetch_embedding,
+    display=lambda text, embedding: effect_runner("text_effect", text, embedding),
+)
 
 @app.route("/", methods=["GET"])
 def index():
@@ -90,85 +100,170 @@ def voice_control():
 def settings():
     return render_template('settings.html')
 
+# Convert hex colors to rpi_ws281x Colors
+def hex_to_color(hex_color):
+    hex_color = hex_color.lstrip("#")
+    r = int(hex_color[0:2], 16)
+    g = int(hex_color[2:4], 16)
+    b = int(hex_color[4:6], 16)
+    return Color(r, g, b)
+
+def settings_changes(colors=None, delay=None, brightness=None):
+    """the fields that were given, the rest stay as they are; ValueError for bad values"""
+    changes = {}
+    if colors is not None:
+        changes["colors"] = [hex_to_color(value) for value in colors]
+    if delay not in (None, ""):
+        changes["delay"] = int(delay)
+    if brightness not in (None, ""):
+        changes["brightness"] = int(brightness)
+    if not changes:
+        raise ValueError("No settings given")
+    # the render loop applies them later, so check them against the current snapshot now
+    led_controller.settings.updated(**changes)
+    return changes
+
 @app.route("/update-settings", methods=["POST"])
 def update_settings():
-    global led_controller
-
-    data = request.form
-    color1_hex = data.get("color1", "#ffffff")
-    color2_hex = data.get("color2", "#ff0000")
-    color3_hex = data.get("color3", "#0000ff")
-    delay = int(data.get("delay", 20))
-
-    # Convert hex colors to rpi_ws281x Colors
-    def hex_to_color(hex_color):
-        r = int(hex_color[1:3], 16)
-        g = int(hex_color[3:5], 16)
-        b = int(hex_color[5:7], 16)
-        return Color(r, g, b)
-
-    new_colors = [
-        hex_to_color(color1_hex),
-        hex_to_color(color2_hex),
-        hex_to_color(color3_hex)
-    ]
-
-    # Update LEDStripController settings
-    led_controller.set_colors(new_colors)
-    led_controller.set_delay(delay)
-
-    return jsonify({"success"}), 200
+    form = request.form
+    try:
+        changes = settings_changes([form[key] for key in ("color1", "color2", "color3") if key in form] or None,
+                                   form.get("delay"), form.get("brightness"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return apply_settings(**changes)
+
+def settings_json(settings=None):
+    settings = settings or led_controller.settings
+    return {
+        "version": settings.version,
+        "colors": [color_to_hex(color) for color in settings.colors],
+        "delay": settings.delay,
+        "brightness": settings.brightness,
+    }
+
+# published once the render loop has swapped the new snapshot in
+def publish_settings(future):
+    if future.exception() is None:
+        hub.publish("settings", settings_json(future.result()))
+
+def apply_settings(**changes):
+    # applied by the render loop between frames
+    try:
+        future = render_loop.submit("settings", changes)
+    except queue.Full:
+        return jsonify({"error": "Render loop is busy, try again"}), 503
+
+    future.add_done_callback(publish_settings)
+    return jsonify({"message": "Settings saved"}), 200
+
+def color_to_hex(color):
+    r = (color >> 16) & 0xFF
+    g = (color >> 8) & 0xFF
+    b = color & 0xFF
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+hub.publish("settings", settings_json())
 
 @app.route("/get-settings", methods=["GET"])
 def get_settings():
-    global led_controller
-    # Convert colors to hex format
-    def color_to_hex(color):
-        r = (color >> 16) & 0xFF
-        g = (color >> 8) & 0xFF
-        b = color & 0xFF
-        return f"#{r:02x}{g:02x}{b:02x}"
-
-    colors = [color_to_hex(color) for color in led_controller.get_colors()]
-    delay = led_controller.get_delay()
-    return jsonify({
-        "colors": colors,
-        "delay": delay
-    })
+    return jsonify(settings_json())
 
 
 # start an effect
 @app.route("/start", methods=["POST"])
 def start_effect():
-    global current_effect, current_thread
-
     data = request.json
     job_name = data.get("effect")
     if job_name not in jobs:
         return jsonify({"error": f"Effect '{job_name}' does not exist"}), 404
 
     args = data.get("args", [])
-    effect_runner(job_name, *args)
+    if job_name == "text_effect":
+        return submit_text(args[0] if args else "")
+    try:
+        effect_runner(job_name, *args)
+    except queue.Full:
+        return jsonify({"error": "Render loop is busy, try again"}), 503
     print(f"started {job_name}")
     return jsonify({"message": f"Effect '{job_name}' started"}), 200
 
 @app.route("/stop", methods=["POST"])
 def stop_effect():
-    global current_effect, current_thread
-
-    if not effect_lock.locked():
+    if not job_running():
         print("no effect running")
         return jsonify({"error": "No effect is currently running"}), 400
 
-    stop_current_job()
+    try:
+        stop_current_job()
+    except queue.Full:
+        return jsonify({"error": "Render loop is busy, try again"}), 503
     return jsonify({"message": "Effect stopped"}), 200
 
+# live effect, settings and stats for the pages
+@app.route("/events", methods=["GET"])
+def events():
+    return Response(hub.stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# binary frames of what the strip shows for the live pages, see preview.py
+@app.route("/preview", methods=["GET"])
+def preview_stream():
+    return Response(preview.stream(led_controller.framebuffer), mimetype="application/octet-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# {"type": "start" | "stop" | "settings", ...} from the live pages
+@app.route("/command", methods=["POST"])
+def command():
+    data = request.json or {}
+    command_type = data.get("type")
+    if command_type == "start":
+        return start_effect()
+    if command_type == "stop":
+        return stop_effect()
+    if command_type == "settings":
+        try:
+            changes = settings_changes(data.get("colors"), data.get("delay"), data.get("brightness"))
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        return apply_settings(**changes)
+    return jsonify({"error": f"Unknown command '{command_type}'"}), 400
+
+# text effects return a job id right away, poll it for the result
+@app.route("/text_effect", methods=["POST"])
+def text_effect():
+    data = request.json or {}
+    return submit_text(data.get("text", ""))
+
+# the embedding is fetched in the background, the effect starts once it's there
+def submit_text(text):
+    if not text:
+        return jsonify({"error": "Text input is required"}), 400
+
+    job = text_jobs.submit(text)
+    return jsonify({"job_id": job["id"], "status": job["status"]}), 202
+
+@app.route("/text_effect/<job_id>", methods=["GET"])
+def text_effect_status(job_id):
+    job = text_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' does not exist"}), 404
+    return jsonify(job), 200
+
 @app.route("/status", methods=["GET"])
 def status():
-    if not effect_lock.locked():
-        return jsonify({"status": "idle"}), 200
+    if not job_running():
+        return jsonify({"status": "idle", "startup": startup_timer.report()}), 200
+
+    return jsonify({
+        "status": "running",
+        "startup": startup_timer.report(),
+        "effect": render_loop.current_name,
+        "switch_seconds": render_loop.last_switch_seconds,
+    }), 200
 
-    return jsonify({"status": "running", "effect": current_effect}), 200
+startup_timer.mark("app")
+startup_timer.log()
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0")
+    app.run(debug=True, host="0.0.0.0", use_reloader=startup.RELOAD)
@@ -0,0 +1,84 @@
+"""gamma, brightness and white balance applied to each frame at flush
+
+Effects keep drawing plain sRGB-ish colors into the framebuffer; the
+correction maps every channel through a 256 entry table on the way to
+the strip. The tables fold gamma, global brightness and a white point
+together, so a frame costs one gather however many of them are active.
+"""
+import math
+import os
+
+import numpy as np
+
+LED_GAMMA = float(os.getenv("LED_GAMMA", "2.2"))
+# color temperature the strip's white is corrected to, 6500K leaves it alone
+LED_WHITE_POINT = float(os.getenv("LED_WHITE_POINT", "6500"))
+NEUTRAL_WHITE_POINT = 6500
+
+
+def kelvin_to_rgb(kelvin):
+    """Approximate RGB (0-1) of a black body at kelvin, after Tanner Helland."""
+    temperature = kelvin / 100
+    if temperature <= 66:
+        red = 255.0
+        green = 99.4708025861 * math.log(temperature) - 161.1195681661
+        blue = 0.0 if temperature <= 19 else 138.5177312231 * math.log(temperature - 10) - 305.0447927307
+    else:
+        red = 329.698727446 * (temperature - 60) ** -0.1332047592
+        green = 288.1221695283 * (temperature - 60) ** -0.0755148492
+        blue = 255.0
+    return np.clip([red, green, blue], 0, 255) / 255
+
+
+def white_balance(kelvin):
+    """Per channel (r, g, b) gains that shift white to kelvin."""
+    return kelvin_to_rgb(kelvin) / kelvin_to_rgb(NEUTRAL_WHITE_POINT)
+
+
+class ColorCorrection:
+    """Per channel lookup tables, rebuilt whenever a setting changes.
+
+    version goes up on every change so the framebuffer knows to resend the
+    whole frame even if the effect drew nothing new.
+    """
+
+    def __init__(self, gamma=LED_GAMMA, brightness=255, white_point=LED_WHITE_POINT):
+        self.gamma = gamma
+        self.brightness = brightness
+        self.white_point = white_point
+        self.version = 0
+        # packed uint32 pixels are B, G, R, W bytes in memory
+        self._channels = np.arange(4)
+        self._rebuild()
+
+    def _rebuild(self):
+        levels = (np.arange(256) / 255) ** self.gamma * (self.brightness / 255)
+        red, green, blue = white_balance(self.white_point)
+        gains = np.array([[blue], [green], [red], [1.0]])
+        self._lut = np.round(255 * levels * gains).clip(0, 255).astype(np.uint8)
+        self._lut[3] = np.arange(256)  # a white channel, if any, passes through
+        self.identity = bool((self._lut == np.arange(256)).all())
+        self.version += 1
+
+    def set_brightness(self, brightness):
+        brightness = int(min(max(brightness, 0), 255))
+        if brightness != self.brightness:
+            self.brightness = brightness
+            self._rebuild()
+
+    def set_gamma(self, gamma):
+        if gamma != self.gamma:
+            self.gamma = gamma
+            self._rebuild()
+
+    def set_white_point(self, kelvin):
+        if kelvin != self.white_point:
+            self.white_point = kelvin
+            self._rebuild()
+
+    def apply(self, pixels):
+        """Corrected copy of an array of packed colors."""
+        if self.identity:
+            return pixels.copy()
+        channels = pixels.view(np.uint8).reshape(-1, 4)
+        return self._lut[self._channels, channels].reshape(-1).view(np.uint32)
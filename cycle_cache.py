@@ -0,0 +1,152 @@
+"""render a periodic effect's cycle once, then replay it from memory
+
+color_wheel, flash, leap_frog, warm_wheel and bouncing_window repeat
+exactly every N frames for a given strip length and color list. Marked
+with @cyclic, such an effect is rendered for one whole cycle into a
+frames x pixels array and replayed from there by index, so a frame
+costs a row copy instead of the effect's work.
+
+The cycle is rendered on a scratch copy of the controller starting from
+a black strip, so cached effects may only draw through controller.pixels
+and the pixel helpers, not show() or the framebuffer.
+"""
+import copy
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# total memory for every cached cycle, least recently used go first
+CYCLE_CACHE_BYTES = int(float(os.getenv("LED_CYCLE_CACHE_MB", "32")) * 2**20)
+# a cycle bigger than this isn't cached, the effect renders live instead
+MAX_CYCLE_BYTES = int(float(os.getenv("LED_MAX_CYCLE_MB", "8")) * 2**20)
+
+
+def render_cycle(controller, effect, period):
+    """period frames of effect as a (period, pixels) array, or None if it ends sooner."""
+    scratch = copy.copy(controller)
+    scratch.pixels = np.zeros(controller.numPixels, dtype=np.uint32)
+    frames = np.empty((period, controller.numPixels), dtype=np.uint32)
+    generator = effect(scratch)
+    rendered = 0
+    try:
+        for _ in generator:
+            frames[rendered] = scratch.pixels
+            rendered += 1
+            if rendered == period:
+                return frames
+    finally:
+        generator.close()
+    return None
+
+
+class CycleCache:
+    """Rendered cycles keyed by effect, strip length and (optionally) colors."""
+
+    def __init__(self, max_bytes=CYCLE_CACHE_BYTES, max_cycle_bytes=MAX_CYCLE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_cycle_bytes = max_cycle_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cycles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cycles)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(frames.nbytes for frames in self._cycles.values())
+
+    def get(self, key):
+        with self._lock:
+            frames = self._cycles.get(key)
+            if frames is None:
+                self.misses += 1
+                return None
+            self._cycles.move_to_end(key)
+            self.hits += 1
+            return frames
+
+    def put(self, key, frames):
+        with self._lock:
+            self._cycles[key] = frames
+            self._cycles.move_to_end(key)
+            total = sum(cached.nbytes for cached in self._cycles.values())
+            while total > self.max_bytes and len(self._cycles) > 1:
+                _, evicted = self._cycles.popitem(last=False)
+                total -= evicted.nbytes
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._cycles.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cycles.clear()
+
+    def play(self, controller, effect, period, uses_colors=True):
+        """Frame generator: effect's cycle replayed from the cache.
+
+        Each frame compares the settings version with the one the cycle
+        was rendered for; when the colors changed the old cycle is dropped
+        and the new one rendered, carrying on from the same frame.
+        """
+        num_pixels = controller.numPixels
+        if not period or period * num_pixels * 4 > self.max_cycle_bytes:
+            yield from effect(controller)
+            return
+
+        index = 0
+        while True:
+            settings = controller.settings
+            key = (effect.__qualname__, num_pixels, settings.colors if uses_colors else None)
+            frames = self.get(key)
+            if frames is None:
+                frames = render_cycle(controller, effect, period)
+                if frames is None:
+                    # not periodic after all
+                    yield from effect(controller)
+                    return
+                self.put(key, frames)
+
+            pixels = controller.pixels
+            version = settings.version
+            while True:
+                settings = controller.settings
+                if settings.version != version:
+                    if uses_colors and settings.colors != key[2]:
+                        break
+                    version = settings.version
+                pixels[:] = frames[index]
+                index = (index + 1) % period
+                yield
+            self.discard(key)
+
+    def stats(self):
+        return {"cycles": len(self), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+CACHE = CycleCache()
+
+
+def cyclic(period, uses_colors=True):
+    """Mark an effect whose frames repeat every period(controller) frames.
+
+    period returns None for strips the effect isn't periodic on. Effects
+    that don't read the color list pass uses_colors=False so a settings
+    change doesn't throw their cycle away. The uncached effect stays
+    reachable as __wrapped__.
+    """
+    def decorate(effect):
+        @functools.wraps(effect)
+        def cached(controller):
+            return CACHE.play(controller, effect, period(controller), uses_colors)
+        return cached
+    return decorate
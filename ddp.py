@@ -0,0 +1,246 @@
+"""DDP style UDP output: render here, stream frames to remote LED nodes
+
+Every packet is a 10 byte header (flags, sequence, data type, id, byte
+offset, length) followed by 8 bit RGB. All packets of one frame share a
+sequence number (1-15, wrapping) and the last one carries the push flag,
+which tells the node to show. Between keyframes only runs of changed
+pixels are sent, each as its own packet at its own offset, so unchanged
+runs cost nothing on the wire.
+
+A node is just a DDPReceiver driving its local strips:
+
+    python ddp.py --port 4048
+"""
+import argparse
+import socket
+import struct
+import threading
+
+import numpy as np
+
+DDP_PORT = 4048
+HEADER = struct.Struct("!BBBBLH")
+VERSION = 0x40
+FLAG_PUSH = 0x01
+DATA_TYPE_RGB8 = 0x0B
+DISPLAY_ID = 1
+
+# 1440 bytes of RGB keeps a packet under a 1500 byte MTU
+MAX_PIXELS_PER_PACKET = 480
+# unchanged gaps this short are resent: a new packet costs 38 bytes of
+# DDP/UDP/IP headers plus a syscall, about as much as a dozen pixels
+MERGE_GAP = 12
+# a full frame every so often so a lost delta doesn't stick around
+KEYFRAME_INTERVAL = 30
+
+
+def to_rgb(pixels):
+    """Packed uint32 colors to RGB bytes."""
+    pixels = np.asarray(pixels, dtype=np.uint32)
+    rgb = np.empty((len(pixels), 3), dtype=np.uint8)
+    rgb[:, 0] = pixels >> 16
+    rgb[:, 1] = pixels >> 8
+    rgb[:, 2] = pixels
+    return rgb.tobytes()
+
+
+def from_rgb(data):
+    rgb = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+    return (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+
+def encode(sequence, offset, rgb, push=False):
+    """One packet; offset is in bytes like DDP's."""
+    flags = VERSION | (FLAG_PUSH if push else 0)
+    return HEADER.pack(flags, sequence, DATA_TYPE_RGB8, DISPLAY_ID, offset, len(rgb)) + rgb
+
+
+def decode(packet):
+    """(flags, sequence, byte offset, rgb data) for one packet."""
+    flags, sequence, _, _, offset, length = HEADER.unpack_from(packet)
+    return flags, sequence & 0x0F, offset, packet[HEADER.size:HEADER.size + length]
+
+
+def next_sequence(sequence):
+    return sequence % 15 + 1
+
+
+def changed_runs(current, previous, merge_gap=MERGE_GAP):
+    """[start, stop) runs of pixels that differ, nearby runs merged."""
+    changed = np.flatnonzero(current != previous)
+    if len(changed) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(changed) > merge_gap + 1)
+    starts = changed[np.concatenate(([0], breaks + 1))]
+    stops = changed[np.concatenate((breaks, [len(changed) - 1]))] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+class DDPStrip:
+    """A remote node that looks like a PixelStrip, usable as a canvas output.
+
+    Writes go to a local buffer; show() sends the frame to the node. With
+    delta on it sends only the runs that changed since the last frame,
+    which saves bandwidth but costs a packet per run.
+    """
+
+    def __init__(self, count, host, port=DDP_PORT, delta=False, keyframe_interval=KEYFRAME_INTERVAL):
+        self.count = count
+        self.address = (host, port)
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self.pixels = np.zeros(count, dtype=np.uint32)
+        self.sequence = 0
+        self.frames = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self._sent = None
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def begin(self):
+        pass
+
+    def numPixels(self):
+        return self.count
+
+    def setPixelColor(self, index, color):
+        if 0 <= index < self.count:
+            self.pixels[index] = color
+
+    def set_pixels(self, indices, colors):
+        self.pixels[indices] = colors
+
+    def __setitem__(self, pos, value):
+        self.pixels[pos] = value
+
+    def show(self):
+        keyframe = not self.delta or self._sent is None or self.frames % self.keyframe_interval == 0
+        runs = [(0, self.count)] if keyframe else changed_runs(self.pixels, self._sent)
+        if len(runs) > 1 and sum(stop - start for start, stop in runs) > self.count // 2:
+            runs = [(0, self.count)]  # mostly changed, fewer packets to just send it all
+        self.frames += 1
+        if not runs:
+            return
+        self.sequence = next_sequence(self.sequence)
+
+        chunks = [
+            (start, min(start + MAX_PIXELS_PER_PACKET, stop))
+            for run_start, stop in runs
+            for start in range(run_start, stop, MAX_PIXELS_PER_PACKET)
+        ]
+        for i, (start, stop) in enumerate(chunks):
+            packet = encode(self.sequence, start * 3, to_rgb(self.pixels[start:stop]), push=i == len(chunks) - 1)
+            self._sock.sendto(packet, self.address)
+            self.packets_sent += 1
+            self.bytes_sent += len(packet)
+        self._sent = self.pixels.copy()
+
+    def close(self):
+        self._sock.close()
+
+
+class DDPReceiver:
+    """Applies DDP packets to a local buffer on a background thread.
+
+    Stands in for a node in tests and benchmarks: drop_rate throws away
+    that fraction of incoming packets (seeded) to exercise packet loss.
+    on_frame(pixels) runs on every push.
+    """
+
+    def __init__(self, count, host="127.0.0.1", port=0, on_frame=None, drop_rate=0.0, seed=None):
+        self.pixels = np.zeros(count, dtype=np.uint32)
+        self.on_frame = on_frame
+        self.drop_rate = drop_rate
+        self.packets = 0
+        self.dropped = 0
+        self.frames = 0
+        self.missed_frames = 0
+        self._sequence = None
+        self._rng = np.random.default_rng(seed)
+        self._frame_ready = threading.Condition()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self._sock.bind((host, port))
+        # closing a socket doesn't wake a blocked recv, so poll for close()
+        self._sock.settimeout(0.05)
+        self._closed = threading.Event()
+        self.address = self._sock.getsockname()
+        self._thread = threading.Thread(target=self._receive, name="ddp-receiver", daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while not self._closed.is_set():
+            try:
+                packet = self._sock.recv(HEADER.size + MAX_PIXELS_PER_PACKET * 3)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if self.drop_rate and self._rng.random() < self.drop_rate:
+                self.dropped += 1
+                continue
+            self.apply(packet)
+
+    def apply(self, packet):
+        if len(packet) < HEADER.size:
+            return
+        flags, sequence, offset, data = decode(packet)
+        if flags & 0xC0 != VERSION:
+            return
+        self.packets += 1
+        if sequence and sequence != self._sequence:
+            if self._sequence is not None:
+                self.missed_frames += (sequence - next_sequence(self._sequence)) % 15
+            self._sequence = sequence
+
+        start = offset // 3
+        colors = from_rgb(data[:len(data) - len(data) % 3])[:max(len(self.pixels) - start, 0)]
+        self.pixels[start:start + len(colors)] = colors
+
+        if flags & FLAG_PUSH:
+            if self.on_frame is not None:
+                self.on_frame(self.pixels)
+            with self._frame_ready:
+                self.frames += 1
+                self._frame_ready.notify_all()
+
+    def wait_for_frames(self, frames, timeout=1.0):
+        """Block until at least frames pushes have arrived."""
+        with self._frame_ready:
+            return self._frame_ready.wait_for(lambda: self.frames >= frames, timeout)
+
+    def stats(self):
+        return {"packets": self.packets, "dropped": self.dropped, "frames": self.frames, "missed_frames": self.missed_frames}
+
+    def join(self):
+        self._thread.join()
+
+    def close(self):
+        self._closed.set()
+        self._thread.join(timeout=1)
+        self._sock.close()
+
+
+def main(argv=None):
+    from canvas import build_canvas, load_outputs
+    from framebuffer import FrameBuffer
+
+    parser = argparse.ArgumentParser(description="Show DDP frames on this node's strips (LED_OUTPUTS)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DDP_PORT)
+    args = parser.parse_args(argv)
+
+    strip = build_canvas(load_outputs())
+    framebuffer = FrameBuffer(strip.numPixels())
+
+    def show(pixels):
+        framebuffer.pixels[:] = pixels
+        framebuffer.flush(strip)
+
+    receiver = DDPReceiver(strip.numPixels(), args.host, args.port, on_frame=show)
+    print(f"listening for DDP on {receiver.address[0]}:{receiver.address[1]}")
+    receiver.join()
+
+
+if __name__ == "__main__":
+    main()
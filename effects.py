@@ -1,72 +1,65 @@
-import time
 from datetime import datetime as dt
 import asyncio
 
-import pytz
+import numpy as np
 import rpi_ws281x
 import colors
 import clock_effects
-
-stop_flag = False
-
-def set_stop_flag(value: bool):
-    global stop_flag
-    stop_flag = value
+from compositor import Compositor
+from cycle_cache import cyclic
 
 def fill_strip(strip, color):
     for i in range(strip.numPixels()):
         strip.setPixelColor(i, color)
     strip.show()
 
-    # Function to run the wheel effect
+# Effects are frame generators: each one draws into controller.pixels and
+# yields once per frame. The render engine flushes the frame, waits for the
+# next deadline and closes the generator when the job's CancelToken is
+# cancelled. Yield a number of seconds to hold a frame for longer than
+# controller.delay. Effects marked @cyclic repeat exactly and are replayed
+# from a rendered cycle, see cycle_cache.py.
 
+@cyclic(lambda controller: 256, uses_colors=False)
 def color_wheel(controller):
     """Perform a color wheel effect over the strip."""
-    while not stop_flag:
+    while True:
         for j in range(256):  # 0-255 for color wheel
-            if stop_flag:
-                break
-            for i in range(controller.numPixels):
-                if stop_flag:
-                    break
-
-                controller.set_pixel(i, colors.wheel((i + j) & 255))
-            controller.show()
-            time.sleep(controller.delay)
+            controller.pixels[:] = colors.wheel_frame(controller.numPixels, j)
+            yield
 
+@cyclic(lambda controller: 2)
 def flash(controller):
     i = 0
-    while not stop_flag:
+    while True:
         i+=1
-        for j in range(controller.numPixels):
-            if stop_flag:
-                break
-            condition = (i % 2) == (j % 2)
-            color = controller.color_list[0] if condition else controller.color_list[1]
-            controller.set_pixel(j, color)
-        controller.show()
-        time.sleep(controller.delay)
-
+        # one settings snapshot per frame, so both halves use the same colors
+        color_list = controller.color_list
+        # even/odd pixels swap between the first two colors every frame
+        controller.pixels[i % 2::2] = color_list[0]
+        controller.pixels[(i + 1) % 2::2] = color_list[1]
+        yield
+
+@cyclic(lambda controller: controller.numPixels)
 def leap_frog(controller):
     num_pixels = controller.numPixels
     window_size = 5
+    window = np.arange(window_size)
 
-    while not stop_flag:
-        for i in range(num_pixels):
-            if stop_flag:
-                break
-            # Clear the LED just before the current window
-            clear_index = (i - 1) % num_pixels
-            controller.set_pixel(clear_index, colors.OFF)
+    # only the window layer changes, the background stays off
+    compositor = Compositor(num_pixels, background=colors.OFF)
+    frog = compositor.add_layer("window")
 
-            # Set the current window of lights
-            for j in range(window_size):
-                pixel_index = (i + j) % num_pixels
-                controller.set_pixel_color_list(pixel_index)
+    while True:
+        for i in range(num_pixels):
+            # Move the window of lights
+            pixel_index = (i + window) % num_pixels
+            palette = controller.palette()
+            frog.clear()
+            frog.set(pixel_index, palette[pixel_index % len(palette)])
 
-            # Show the updated strip
-            controller.show()
-            time.sleep(controller.delay)
+            compositor.compose(controller.pixels)
+            yield
 
 def display_bits(strip, bits):
     for i in range(len(bits)):
@@ -83,106 +76,85 @@ def roll_out(controller):
     num_pixels = controller.num_pixels
 
     for i in range(1, num_pixels):
-        if stop_flag:
-            break
-
         #light up the strip
-        for j in (range(i-1)):
-            controller.set_pixel(j, controller.color_list[0])
+        controller.pixels[:max(i - 1, 0)] = controller.color_list[0]
 
-        print("rolling out")
         #loop through and rollout
         for j in (range(1, i)):
-            if stop_flag:
-                break
-
+            color = controller.color_list[0]
             controller.set_pixel(j, colors.OFF)
-            controller.set_pixel(j - 1, controller.color_list[0])
-            controller.show()
-            time.sleep(controller.delay)
-        print("rolled out")
+            controller.set_pixel(j - 1, color)
+            yield
 
+@cyclic(lambda controller: controller.numPixels, uses_colors=False)
 def warm_wheel(controller):
     num_pixels = controller.numPixels
     window_size = 5
+    window = np.arange(window_size)
+    warm_colors = colors.spread_frame(num_pixels, colors.WARM_WHEEL_LUT)
 
-    while not stop_flag:
+    while True:
         for i in range(num_pixels):
             # Clear the LED just before the current window
             clear_index = (i - 1) % num_pixels
             controller.set_pixel(clear_index, colors.OFF)
 
             # Set the current window of lights
-            for j in range(window_size):
-                pixel_index = (i + j) % num_pixels
-                idx = (i+j) % num_pixels
-                color_idx = ((idx * 256 // num_pixels) % 256)
-                controller.set_pixel(pixel_index, colors.warm_wheel(color_idx))
-
-            # Show the updated strip
-            controller.show()
-            time.sleep(controller.delay)
+            pixel_index = (i + window) % num_pixels
+            controller.pixels[pixel_index] = warm_colors[pixel_index]
+            yield
 
+# back and forth over the strip, a 5 pixel window needs more than 5 pixels
+@cyclic(lambda controller: 2 * (controller.numPixels - 5) if controller.numPixels > 5 else None)
 def bouncing_window(controller):
     num_pixels = controller.numPixels
     direction = 1  # 1 for forward, -1 for backward
     position = 0
     window_size = 5
-    print(num_pixels)
-    while not stop_flag:
-        for _ in range(num_pixels - window_size + 1):
-            if stop_flag:
-                break
-            # Turn off all LEDs
-            for i in range(num_pixels):
-                controller.set_pixel(i, colors.OFF)
-
-            # Light up the window
-            for j in range(window_size):
-                pixel_index = position + j
-                if pixel_index < num_pixels:
-                    controller.set_pixel_color_list(pixel_index)
-
-            # Show the strip
-            controller.show()
-            time.sleep(controller.delay)
-
-            # Update position
-            position += direction
-
-            # Reverse direction at edges
-            if position == 0 or position == num_pixels - window_size:
-                direction *= -1
-
-def allin(strip):
-    for i in range(strip.numPixels()):
-        strip.setPixelColor(i, colors.red_hue(i))
-    strip.show()
+    window = np.arange(window_size)
+    while True:
+        # Turn off all LEDs
+        controller.pixels[:] = colors.OFF
+
+        # Light up the window
+        controller.set_pixels_color_list(position + window)
+        yield
+
+        # Update position
+        position += direction
+
+        # Reverse direction at edges
+        if position == 0 or position == num_pixels - window_size:
+            direction *= -1
+
+def allin(controller):
+    controller.pixels[:] = colors.RED_HUE_LUT[np.minimum(np.arange(controller.numPixels), 255)]
+    controller.show()
 
 
 def clock_timer(strip):
     for i in range(strip.numPixels()):
         strip.setPixelColor(i, colors.blue_hue(i*2))
 
-def clock(strip):
-    return clock_effects.clock(strip)
+def clock(controller):
+    return clock_effects.clock(controller)
 
 
-def clock2(strip):
-    return clock_effects.clock2(strip)
+def clock2(controller):
+    return clock_effects.clock2(controller)
 
 
-def clock3(strip):
-    return clock_effects.clock3(strip)
+def clock3(controller):
+    return clock_effects.clock3(controller)
 
 
-def clock4(strip):
-    return clock_effects.clock4(strip)
+def clock4(controller):
+    return clock_effects.clock4(controller)
 
 
-def clock5(strip):
-    return clock_effects.clock5(strip)
+def clock5(controller):
+    return clock_effects.clock5(controller)
 
 
-def clock6(strip):
-    return clock_effects.clock6(strip)
\ No newline at end of file
+def clock6(controller):
+    return clock_effects.clock6(controller)
\ No newline at end of file
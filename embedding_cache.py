@@ -0,0 +1,84 @@
+"""on-disk LRU cache for text embeddings, backed by sqlite"""
+import sqlite3
+from threading import Lock
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Maps (text, model, dimensions) to an embedding vector.
+
+    Vectors are stored as float32 blobs. Every read refreshes the entry's
+    last-used time and inserts evict the least recently used entries beyond
+    max_entries. Survives restarts; use ":memory:" for a throwaway cache.
+    """
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                text TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (text, model, dimensions)
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        # logical clock for LRU order, wall time can tie or jump backwards
+        self._tick = self._db.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+
+    def _next_tick(self):
+        self._tick += 1
+        return self._tick
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get(self, text, model, dimensions):
+        """Cached vector as a float32 array, or None."""
+        key = (text, model, dimensions)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE text = ? AND model = ? AND dimensions = ?", key,
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute(
+                "UPDATE embeddings SET last_used = ? WHERE text = ? AND model = ? AND dimensions = ?",
+                (self._next_tick(), *key),
+            )
+            self._db.commit()
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, text, model, dimensions, vector):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                (text, model, dimensions, blob, self._next_tick()),
+            )
+            self._db.execute(
+                """DELETE FROM embeddings WHERE rowid IN (
+                    SELECT rowid FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self), "max_entries": self.max_entries}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,87 +1,195 @@
-from openai import OpenAI
-from rpi_ws281x import PixelStrip, Color
-import numpy as np
-from colorsys import hsv_to_rgb
+import hashlib
 import os
+
+import numpy as np
 from dotenv import load_dotenv
+
+import colors
+from embedding_cache import EmbeddingCache
+
 load_dotenv()
 
-# OpenAI API Key (replace with your key)
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 120
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embeddings_cache.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1000"))
+# seconds an embedding request may take, the same budget as a text effect job
+EMBEDDING_TIMEOUT = float(os.getenv("TEXT_EFFECT_TIMEOUT", "10"))
 
 
-def get_embeddings(text):
-    """Generate embeddings for the input text using OpenAI."""
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text,
-        dimensions=120
-    )
-    print(response)
-    return response.data[0].embedding
+class OpenAIEmbeddingProvider:
+    """Embeddings from the OpenAI API."""
+
+    def __init__(self, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS, timeout=EMBEDDING_TIMEOUT):
+        from openai import OpenAI
+
+        self.model = model
+        self.dimensions = dimensions
+        # OpenAI API Key comes from the environment / .env; no retries, so a
+        # request never outlives the text effect job waiting on it
+        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=timeout, max_retries=0)
+
+    def embed(self, text):
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=text,
+            dimensions=self.dimensions
+        )
+        return response.data[0].embedding
+
+
+class HashEmbeddingProvider:
+    """Deterministic local stand-in for tests and benchmarks, no network."""
+
+    def __init__(self, model="local-hash", dimensions=EMBEDDING_DIMENSIONS):
+        self.model = model
+        self.dimensions = dimensions
+
+    def embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        return np.random.default_rng(seed).normal(0, 0.1, self.dimensions).tolist()
+
+
+_provider = None
+_cache = None
+
 
+def set_provider(provider):
+    """Swap the embedding provider, e.g. HashEmbeddingProvider() in tests."""
+    global _provider
+    _provider = provider
 
-def display_text_as_lights(strip, text):
-    """Display text embeddings on the LED strip."""
-    embeddings = get_embeddings(text)  # Generate embeddings
-    colors = normalize_custom_embeddings(embeddings, strip.numPixels()-1)  # Normalize to RGB values
 
-    # Map colors to the LED strip
-    for i in range(strip.numPixels() -1):
-        c = colors[i]
-        print(c)
-        strip.setPixelColor(i, Color(0, 0, c))
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = OpenAIEmbeddingProvider()
+    return _provider
 
-    strip.show()
+
+def set_cache(cache):
+    global _cache
+    _cache = cache
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_SIZE)
+    return _cache
+
+
+def get_embeddings(text):
+    """Embedding for the input text, from the cache when we've seen it before."""
+    provider = get_provider()
+    cache = get_cache()
+    cached = cache.get(text, provider.model, provider.dimensions)
+    if cached is not None:
+        return cached.tolist()
+
+    embedding = provider.embed(text)
+    cache.put(text, provider.model, provider.dimensions, embedding)
+    return embedding
+
+
+def display_text_as_lights(controller, text, mode=None, embedding=None):
+    """Display text embeddings on the LED strip, fetching them unless given."""
+    if embedding is None:
+        embedding = get_embeddings(text)  # Generate embeddings
+    controller.pixels[:] = embedding_frame(embedding, controller.numPixels, mode)
+    controller.show()
 
 
 ## various embedding functions
+# Each one maps an embedding to a packed uint32 frame of `count` pixels,
+# using all three channels, in a handful of numpy operations.
+
+def _unit(values):
+    """Min-max scale to [0, 1]; a flat embedding maps to zeros."""
+    values = np.asarray(values, dtype=np.float64)
+    span = values.max() - values.min()
+    if span == 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / span
+
+
+def _rgb_frame(channels, count):
+    """Pack 0-255 values, three per pixel, repeating them if there are too few."""
+    channels = np.resize(channels.astype(np.uint32), count * 3).reshape(count, 3)
+    return colors.pack_rgb(channels[:, 0], channels[:, 1], channels[:, 2])
+
 
 def normalize_embeddings(embeddings, count):
     """Normalize embeddings and map to RGB colors for the LED strip."""
-    embeddings = np.array(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
-    normalized = ((embeddings - embeddings.min()) / (embeddings.max() - embeddings.min())) * 255
-    return normalized.astype(int)
+    embeddings = np.asarray(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
+    return _rgb_frame(_unit(embeddings) * 255, count)
 
 
 def normalize_dynamic_embeddings(embeddings, count):
     """Normalize embeddings and map to RGB colors for the LED strip."""
-    embeddings = np.array(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
-    normalized = ((embeddings - embeddings.min()) / (embeddings.max() - embeddings.min())) * 1024
-    normalized = normalized % 255  # Wrap values into RGB range
-    return normalized.astype(int)
+    embeddings = np.asarray(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
+    normalized = (_unit(embeddings) * 1024) % 255  # Wrap values into RGB range
+    return _rgb_frame(normalized, count)
 
 def normalize_custom_embeddings(embeddings, count):
-    embeddings = np.array(embeddings)
-    normalized = ((embeddings - embeddings.min())/(embeddings.max()-embeddings.min())) * 255
-    return normalized.astype(int)
-
+    """Whole embedding scaled to one blue level per pixel."""
+    normalized = (_unit(embeddings) * 255).astype(np.uint32)
+    blue = np.resize(normalized, count)
+    return colors.pack_rgb(0, 0, blue)
 
 
 def normalize_color_transform_embeddings(embeddings, count):
     """Apply sinusoidal transformation for more color variety."""
-    embeddings = np.array(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
-    normalized = np.sin(embeddings)  # Apply sine transformation
-    normalized = ((normalized - normalized.min()) / (normalized.max() - normalized.min())) * 255
-    return normalized.astype(int)
+    embeddings = np.asarray(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
+    return _rgb_frame(_unit(np.sin(embeddings)) * 255, count)
 
 def normalize_embeddings_with_noise(embeddings, count):
     """Normalize embeddings with added noise for more color variety."""
-    embeddings = np.array(embeddings[:count * 3])  # Truncate to match LED count * 3 (RGB)
+    embeddings = np.asarray(embeddings[:count * 3], dtype=np.float64)  # Truncate to match LED count * 3 (RGB)
     noise = np.random.uniform(-0.1, 0.1, embeddings.shape)  # Add small noise
-    embeddings += noise
-    normalized = ((embeddings - embeddings.min()) / (embeddings.max() - embeddings.min())) * 255
-    return normalized.astype(int)
+    return _rgb_frame(_unit(embeddings + noise) * 255, count)
+
+
+def hsv_to_packed(hue, saturation=1.0, value=1.0):
+    """Vectorized colorsys.hsv_to_rgb for an array of hues in [0, 1]."""
+    hue = np.asarray(hue, dtype=np.float64)
+    h6 = (hue % 1.0) * 6.0
+    sector = h6.astype(int) % 6
+    f = h6 - np.floor(h6)
+    p = np.full_like(hue, value * (1.0 - saturation))
+    q = value * (1.0 - saturation * f)
+    t = value * (1.0 - saturation * (1.0 - f))
+    v = np.full_like(hue, value)
+
+    r = np.choose(sector, [v, q, p, p, t, v])
+    g = np.choose(sector, [t, v, v, q, p, p])
+    b = np.choose(sector, [p, p, t, v, v, q])
+    return colors.pack_rgb(
+        (r * 255).astype(np.uint32), (g * 255).astype(np.uint32), (b * 255).astype(np.uint32),
+    )
+
 
 def normalize_embeddings_hsv(embeddings, count):
     """Normalize embeddings and map to HSV for better color variety."""
-    embeddings = np.array(embeddings[:count])  # Truncate to match LED count
-    normalized = (embeddings - embeddings.min()) / (embeddings.max() - embeddings.min())  # Normalize to [0, 1]
-    
-    colors = []
-    for value in normalized:
-        hue = value  # Use the embedding value as hue (0 to 1)
-        r, g, b = hsv_to_rgb(hue, 1.0, 1.0)  # Full saturation and brightness
-        colors.append((int(r * 255), int(g * 255), int(b * 255)))
-    
-    return colors
\ No newline at end of file
+    embeddings = np.asarray(embeddings[:count])  # Truncate to match LED count
+    hue = np.resize(_unit(embeddings), count)  # Use the embedding value as hue (0 to 1)
+    return hsv_to_packed(hue)  # Full saturation and brightness
+
+
+MAPPINGS = {
+    "rgb": normalize_embeddings,
+    "dynamic": normalize_dynamic_embeddings,
+    "blue": normalize_custom_embeddings,
+    "sine": normalize_color_transform_embeddings,
+    "noise": normalize_embeddings_with_noise,
+    "hsv": normalize_embeddings_hsv,
+}
+DEFAULT_MAPPING = os.getenv("EMBEDDING_MAPPING", "hsv")
+
+
+def embedding_frame(embedding, count, mode=None):
+    """Packed frame for an embedding using one of the MAPPINGS."""
+    mode = mode or DEFAULT_MAPPING
+    if mode not in MAPPINGS:
+        raise ValueError(f"Unknown embedding mapping '{mode}'")
+    return MAPPINGS[mode](embedding, count)
@@ -0,0 +1,83 @@
+"""server-sent events: push state changes to every connected browser"""
+import json
+import logging
+import queue
+import threading
+import time
+
+# events a slow client can fall behind by before its oldest are dropped
+CLIENT_QUEUE_SIZE = 32
+# comment line sent on idle streams so proxies keep them open
+HEARTBEAT_SECONDS = 15.0
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventHub:
+    """Fans published events out to every open /events stream.
+
+    The latest event of each name is replayed to new clients, so a page
+    gets the current effect, settings and stats as soon as it connects
+    instead of polling for them. publish() never blocks; a client that
+    stops reading loses its oldest events, not everyone's latency.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._latest = {}
+
+    @property
+    def clients(self):
+        return len(self._clients)
+
+    def publish(self, name, data):
+        message = format_event(name, data)
+        with self._lock:
+            self._latest[name] = message
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                    client.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, heartbeat=HEARTBEAT_SECONDS):
+        """text/event-stream body for one client, ends when the client goes away."""
+        client = queue.Queue(CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._clients.add(client)
+            backlog = list(self._latest.values())
+        try:
+            yield "retry: 2000\n\n"
+            yield from backlog
+            while True:
+                try:
+                    yield client.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+
+    def start_ticker(self, name, produce, interval=1.0):
+        """Publish produce() every interval seconds while anyone is listening."""
+        def tick():
+            while True:
+                time.sleep(interval)
+                if not self._clients:
+                    continue
+                try:
+                    self.publish(name, produce())
+                except Exception:
+                    logging.exception("Could not publish %s event", name)
+
+        thread = threading.Thread(target=tick, name=f"events-{name}", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,86 @@
+"""numpy framebuffer shared by the strip controllers"""
+import numpy as np
+
+
+def write_pixels(strip, indices, colors):
+    """Set strip pixels indices to colors (both numpy arrays).
+
+    rpi_ws281x's PixelStrip has no usable slice assignment, so for it this
+    is one setPixelColor call per pixel. Outputs that keep their pixels in
+    numpy (DDPStrip, StripCanvas) offer set_pixels(indices, colors) and get
+    the whole write in one go.
+    """
+    set_pixels = getattr(strip, "set_pixels", None)
+    if set_pixels is not None:
+        set_pixels(indices, colors)
+        return
+    for index, color in zip(indices.tolist(), colors.tolist()):
+        strip.setPixelColor(index, color)
+
+
+class FrameBuffer:
+    """Packed uint32 pixel array that is flushed to a PixelStrip."""
+
+    def __init__(self, num_pixels, correction=None):
+        self.pixels = np.zeros(num_pixels, dtype=np.uint32)
+        # optional ColorCorrection applied on the way to the strip, see correction.py
+        self.correction = correction
+        self._flushed = None
+        self._correction_version = None
+        # while True flushes are skipped, see RenderLoop._run_job
+        self.held = False
+
+    def __len__(self):
+        return len(self.pixels)
+
+    @property
+    def dirty(self):
+        """True when the pixels differ from what was last sent to the strip."""
+        return (self._flushed is None or self._correction_changed()
+                or not np.array_equal(self.pixels, self._flushed))
+
+    @property
+    def snapshot(self):
+        """The last frame sent to the strip, as drawn (before color correction),
+        or None before the first flush.
+
+        Each flush swaps in a fresh copy instead of writing into the old
+        one, so other threads can read a snapshot without locking.
+        """
+        return self._flushed
+
+    def _correction_changed(self):
+        return self.correction is not None and self.correction.version != self._correction_version
+
+    def _output(self, pixels):
+        return pixels if self.correction is None else self.correction.apply(pixels)
+
+    def invalidate(self):
+        """Force the next flush, e.g. after something else wrote to the strip."""
+        self._flushed = None
+
+    def fill(self, color):
+        self.pixels[:] = color
+
+    def flush(self, strip):
+        """Copy the buffer to the strip and show it, skipping unchanged frames.
+
+        Only the pixels that changed since the last flush are written, so a
+        clock tick costs a couple of setPixelColor calls rather than one per
+        pixel. The first flush and a new color correction resend the whole
+        frame. Returns True if the strip was written, never while held.
+        """
+        if self.held:
+            return False
+        if self._flushed is None or self._correction_changed():
+            changed = np.arange(len(self.pixels))
+        else:
+            changed = np.flatnonzero(self.pixels != self._flushed)
+            if len(changed) == 0:
+                return False
+        write_pixels(strip, changed, self._output(self.pixels[changed]))
+        strip.show()
+        self._flushed = self.pixels.copy()
+        if self.correction is not None:
+            self._correction_version = self.correction.version
+        return True
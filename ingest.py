@@ -0,0 +1,177 @@
+"""external frame ingest: let show software drive the strip over UDP
+
+A datagram is either one whole raw RGB frame (3 bytes per pixel from pixel
+0) or a DDP packet (see ddp.py), in which case packets are assembled until
+the push flag. Frames are decoded straight into numpy arrays and wait in a
+small jitter buffer; play() is the frame generator that shows them.
+
+The first frame to arrive calls on_start (the app starts the "ingest"
+job). After timeout seconds without frames play() ends and calls
+on_timeout so the app can go back to whatever effect was running before.
+"""
+import logging
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import ddp
+
+# frames waiting to be shown, more than this and the oldest is dropped
+JITTER_FRAMES = 3
+# hold each frame this long after it arrives so uneven arrival evens out
+JITTER_DELAY = 0.01
+# frames older than this when their turn comes are late and skipped
+MAX_AGE = 0.1
+# seconds without a frame before giving the strip back
+TIMEOUT = 2.0
+# how often play() looks for a new frame
+POLL_PERIOD = 0.004
+
+
+def parse_frame(packet, num_pixels):
+    """(byte offset, RGB bytes, push) for a raw frame or a DDP packet."""
+    if len(packet) >= ddp.HEADER.size and packet[0] & 0xC0 == ddp.VERSION:
+        length = ddp.HEADER.unpack_from(packet)[-1]
+        if ddp.HEADER.size + length == len(packet):
+            flags, sequence, offset, data = ddp.decode(packet)
+            return offset, data, bool(flags & ddp.FLAG_PUSH)
+    return 0, packet[:num_pixels * 3], True
+
+
+class FrameIngest:
+    """Receives frames on a UDP socket and plays them into a controller."""
+
+    def __init__(self, num_pixels, host="0.0.0.0", port=ddp.DDP_PORT, on_start=None, on_timeout=None,
+                 depth=JITTER_FRAMES, jitter_delay=JITTER_DELAY, max_age=MAX_AGE, timeout=TIMEOUT,
+                 clock=time.monotonic):
+        self.num_pixels = num_pixels
+        self.on_start = on_start
+        self.on_timeout = on_timeout
+        self.jitter_delay = jitter_delay
+        self.max_age = max_age
+        self.timeout = timeout
+        self.clock = clock
+        self.received = 0
+        self.shown = 0
+        self.late = 0
+        self.dropped = 0
+        self.timeouts = 0
+        self.last_arrival = None
+        self.active = False
+        self._starting = False
+        self._fps = 0.0
+        self._buffer = deque()
+        self._depth = depth
+        self._lock = threading.Lock()
+        self._assembling = np.zeros(num_pixels, dtype=np.uint32)
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.05)
+        self.address = self._sock.getsockname()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._receive, name="frame-ingest", daemon=True)
+        self._thread.start()
+
+    def _receive(self):
+        while not self._closed.is_set():
+            try:
+                packet = self._sock.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.feed(packet)
+
+    def feed(self, packet):
+        """Take one datagram, queueing a frame when it completes one."""
+        offset, data, push = parse_frame(packet, self.num_pixels)
+        start = offset // 3
+        colors = ddp.from_rgb(data[:len(data) - len(data) % 3])[:max(self.num_pixels - start, 0)]
+        self._assembling[start:start + len(colors)] = colors
+        if push:
+            self.push(self._assembling.copy())
+
+    def push(self, frame):
+        now = self.clock()
+        with self._lock:
+            if self.last_arrival is not None and now > self.last_arrival:
+                # smoothed arrival rate, good enough for a gauge
+                self._fps += 0.1 * (1.0 / (now - self.last_arrival) - self._fps)
+            self.last_arrival = now
+            self.received += 1
+            self._buffer.append((now, frame))
+            while len(self._buffer) > self._depth:
+                self._buffer.popleft()
+                self.dropped += 1
+            start = not self.active and not self._starting
+            self._starting = self._starting or start
+        if start and self.on_start is not None:
+            try:
+                self.on_start()
+            except Exception:
+                logging.exception("Could not start frame ingest")
+                with self._lock:
+                    self._starting = False
+
+    def take(self, now):
+        """Oldest frame that has sat out the jitter delay, skipping late ones."""
+        with self._lock:
+            while self._buffer:
+                arrived, frame = self._buffer[0]
+                if now - arrived > self.max_age:
+                    self._buffer.popleft()
+                    self.late += 1
+                    continue
+                if now - arrived < self.jitter_delay:
+                    return None
+                self._buffer.popleft()
+                self.shown += 1
+                return frame
+        return None
+
+    def play(self, controller):
+        """Frame generator: show ingested frames until they stop coming."""
+        with self._lock:
+            self.active = True
+            self._starting = False
+            self.last_arrival = self.last_arrival or self.clock()
+        timed_out = False
+        try:
+            while True:
+                now = self.clock()
+                frame = self.take(now)
+                if frame is not None:
+                    controller.pixels[:] = frame
+                elif now - self.last_arrival > self.timeout:
+                    timed_out = True
+                    self.timeouts += 1
+                    return
+                yield POLL_PERIOD
+        finally:
+            with self._lock:
+                self.active = False
+                self._buffer.clear()
+            if timed_out and self.on_timeout is not None:
+                self.on_timeout()
+
+    def stats(self):
+        with self._lock:
+            receiving = self.last_arrival is not None and self.clock() - self.last_arrival < self.timeout
+            return {
+                "active": self.active,
+                "fps": round(self._fps, 1) if receiving else 0.0,
+                "received": self.received,
+                "shown": self.shown,
+                "late": self.late,
+                "dropped": self.dropped,
+                "timeouts": self.timeouts,
+            }
+
+    def close(self):
+        self._closed.set()
+        self._thread.join(timeout=1)
+        self._sock.close()
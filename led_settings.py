@@ -0,0 +1,52 @@
+"""immutable, versioned effect settings
+
+A Settings snapshot never changes once made. An update builds the next
+one (version + 1) and the controller swaps it in with a single
+assignment, so anything that reads controller.settings once per frame
+sees either all of the old values or all of the new ones. Caches keep
+the version they were built from and only look closer when it moves.
+"""
+from collections import namedtuple
+
+import colors
+
+DEFAULT_COLORS = (colors.RED, colors.GREEN, colors.BLUE)
+DEFAULT_DELAY = 500  # ms
+DEFAULT_BRIGHTNESS = 255
+# flash alternates the first two colors, so a color list needs at least that many
+MIN_COLORS = 2
+
+
+class Settings(namedtuple("Settings", "version colors delay brightness")):
+    """colors is a tuple of packed colors, delay the frame period in ms, brightness 0-255."""
+
+    __slots__ = ()
+
+    @property
+    def delay_seconds(self):
+        return self.delay / 1000
+
+    def updated(self, colors=None, delay=None, brightness=None):
+        """The next snapshot with just the given fields changed.
+
+        Raises ValueError for fewer than MIN_COLORS colors, a negative delay
+        or a brightness outside 0-255.
+        """
+        changes = {}
+        if colors is not None:
+            if len(colors) < MIN_COLORS:
+                raise ValueError(f"need at least {MIN_COLORS} colors, not {len(colors)}")
+            changes["colors"] = tuple(int(color) for color in colors)
+        if delay is not None:
+            if delay < 0:
+                raise ValueError(f"delay must be 0 ms or more, not {delay}")
+            changes["delay"] = delay
+        if brightness is not None:
+            if not 0 <= brightness <= 255:
+                raise ValueError(f"brightness must be 0-255, not {brightness}")
+            changes["brightness"] = int(brightness)
+        return self._replace(version=self.version + 1, **changes)
+
+
+def default_settings(delay=DEFAULT_DELAY):
+    return Settings(0, DEFAULT_COLORS, delay, DEFAULT_BRIGHTNESS)
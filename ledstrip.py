@@ -1,68 +1,112 @@
 """contains ledcontroller class"""
-from rpi_ws281x import Color, PixelStrip
-import colors
+import numpy as np
 
+import colors
+from canvas import build_canvas, load_outputs
+from correction import ColorCorrection
+from framebuffer import FrameBuffer
+from led_settings import default_settings
+from scheduler import FrameScheduler
 
-# LED strip configuration
-LED_COUNT = 120
-LED_PIN = 18
-LED_FREQ_HZ = 800000
-LED_DMA = 5
-LED_BRIGHTNESS = 255
-LED_INVERT = False
-LED_CHANNEL = 0
 
-class LEDStripController: 
-    """Class for Led Controller"""
+class StripController:
+    """Framebuffer, settings and pixel helpers over a strip (or canvas) that already exists"""
 
-    def __init__(self):
-        # Initialize the LED strip
-        strip = PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
-        strip.begin()
+    def __init__(self, strip, correction=None, settings=None):
         self.strip = strip
         self.numPixels = strip.numPixels()
-        self.color_list = [colors.RED, colors.GREEN, colors.BLUE]
-        self.delay = 500 / 1000 #milliseconds
+        self.num_pixels = self.numPixels
+        self.framebuffer = FrameBuffer(self.numPixels, correction or ColorCorrection())
+        self.pixels = self.framebuffer.pixels
+        self.settings = settings or default_settings()
+        self.scheduler = FrameScheduler(self.delay)
+
+    @property
+    def settings(self):
+        """current Settings snapshot, replaced whole and never modified"""
+        return self._settings
+
+    @settings.setter
+    def settings(self, settings):
+        self._settings = settings
+        # brightness is applied at flush so it shows on the next frame
+        self.framebuffer.correction.set_brightness(settings.brightness)
+
+    def update_settings(self, **changes):
+        """swap in the next snapshot with just these fields changed"""
+        self.settings = self.settings.updated(**changes)
+        return self.settings
+
+    @property
+    def color_list(self):
+        return self.settings.colors
+
+    @property
+    def delay(self):
+        """frame period in seconds"""
+        return self.settings.delay_seconds
 
     def set_colors(self, color_list):
-        self.color_list = color_list
+        self.update_settings(colors=color_list)
     
     def get_colors(self):
-        return self.color_list
+        return list(self.color_list)
     
     def set_delay(self, delay):
-        self.delay = delay / 1000
+        self.update_settings(delay=delay)
     
     def get_delay(self):
-        return self.delay * 1000
+        return self.settings.delay
+
+    def set_brightness(self, brightness):
+        """0-255"""
+        self.update_settings(brightness=brightness)
+
+    def get_brightness(self):
+        return self.settings.brightness
+
+    def palette(self):
+        """color list as a uint32 array for vector writes"""
+        return np.array(self.color_list, dtype=np.uint32)
 
     def off(self):
-        for i in range(self.strip.numPixels()):
-            self.strip.setPixelColor(i, colors.OFF)
-        self.strip.show()
+        self.fill_color(colors.OFF)
 
     def set_pixel(self, index, color):
         """set pixel based on the color passed through"""
-        if 0 <= index < self.strip.numPixels():
-            self.strip.setPixelColor(index, color)
+        if 0 <= index < self.numPixels:
+            self.pixels[index] = color
     
     def set_pixel_color_list(self, index):
         """sets the pixel based on the color list colors"""
-        if 0 <= index < self.strip.numPixels():
+        if 0 <= index < self.numPixels:
             color_idx = index % len(self.color_list)
-            color = self.color_list[color_idx]
-            self.strip.setPixelColor(index, color)
+            self.pixels[index] = self.color_list[color_idx]
+
+    def set_pixels_color_list(self, indices):
+        """vector version of set_pixel_color_list for an array of indices"""
+        indices = np.asarray(indices)
+        indices = indices[(indices >= 0) & (indices < self.numPixels)]
+        palette = self.palette()
+        self.pixels[indices] = palette[indices % len(palette)]
 
     def show(self):
-        self.strip.show()
+        """flush the framebuffer, skipped when nothing changed"""
+        return self.framebuffer.flush(self.strip)
 
     def fill_color(self, color):
-        for i in range(self.strip.numPixels()):
-            self.strip.setPixelColor(i, color)
-        self.strip.show()
+        self.framebuffer.fill(color)
+        self.show()
 
     def set_multiple_pixels(self, indices, color):
-        for index in indices:
-            if 0 <= index < self.strip.numPixels():
-                self.strip.setPixelColor(index, color)
-        self.strip.show()
\ No newline at end of file
+        indices = np.asarray(indices)
+        self.pixels[indices[(indices >= 0) & (indices < self.numPixels)]] = color
+        self.show()
+
+
+class LEDStripController(StripController):
+    """Class for Led Controller"""
+
+    def __init__(self):
+        # Initialize the LED strips, one canvas over every configured output
+        super().__init__(build_canvas(load_outputs()))
@@ -1,68 +1,141 @@
-import time
-import random
-import asyncio
-from rpi_ws281x import PixelStrip, Color
+import numpy as np
 
+import colors
 
-# Define racers with their properties
-racers = [
-    {"color": Color(255, 0, 0), "position": 0, "probability": 0.5},  # Red racer
-    {"color": Color(0, 255, 0), "position": 0, "probability": 0.5},  # Green racer
-    {"color": Color(0, 0, 255), "position": 0, "probability": 0.5}   # Blue racer
-]
+MOVE_PERIOD = 0.1  # seconds between racer moves, one frame per move
 
-winner_event = asyncio.Event()
+# red, green and blue like the original three racers; bigger fields get
+# colors spread around the wheel
+RACER_COLORS = [colors.RED, colors.GREEN, colors.BLUE]
+DEFAULT_PROBABILITY = 0.5
 
-def clear_strip(strip):
+
+def racer_colors(num_racers):
+    if num_racers <= len(RACER_COLORS):
+        return np.array(RACER_COLORS[:num_racers], dtype=np.uint32)
+    return colors.spread_frame(num_racers, colors.WHEEL_LUT)
+
+
+def _probabilities(num_racers, probabilities):
+    if probabilities is None:
+        return np.full(num_racers, DEFAULT_PROBABILITY)
+    probabilities = np.asarray(probabilities, dtype=float)
+    if probabilities.shape != (num_racers,):
+        raise ValueError(f"Expected {num_racers} probabilities, got {probabilities.shape}")
+    return probabilities
+
+
+class Race:
+    """Every racer's position and odds as arrays, advanced together per tick.
+
+    Each tick every racer moves one step with its own probability. The first
+    racer to reach the end of the track wins; racers that get there on the
+    same tick are split by a coin flip rather than by their index. The same
+    seed replays the same race.
+    """
+
+    def __init__(self, num_racers=3, track_length=120, probabilities=None, seed=None):
+        if track_length < 2:
+            raise ValueError("track_length must be at least 2")
+        self.num_racers = num_racers
+        self.track_length = track_length
+        self.colors = racer_colors(num_racers)
+        self.probabilities = _probabilities(num_racers, probabilities)
+        self.rng = np.random.default_rng(seed)
+        self.positions = np.zeros(num_racers, dtype=np.int64)
+        self.ticks = 0
+        self.winner = None
+
+    @property
+    def finish(self):
+        return self.track_length - 1
+
+    def tick(self):
+        """Move every racer once, returns the winner's index once there is one."""
+        if self.winner is not None:
+            return self.winner
+        self.positions += self.rng.random(self.num_racers) < self.probabilities
+        self.ticks += 1
+        finished = np.flatnonzero(self.positions >= self.finish)
+        if len(finished):
+            self.winner = int(self.rng.choice(finished))
+        return self.winner
+
+    def run(self, max_ticks=None):
+        """Headless: tick until the race is won (or max_ticks), no drawing."""
+        while self.winner is None and (max_ticks is None or self.ticks < max_ticks):
+            self.tick()
+        return self.winner
+
+
+def simulate(num_racers=3, track_length=120, probabilities=None, seed=None):
+    """Run a whole race headless, same result as race() with the same seed."""
+    race_ = Race(num_racers, track_length, probabilities, seed)
+    winner = race_.run()
+    return {"winner": winner, "ticks": race_.ticks, "positions": race_.positions.tolist()}
+
+
+def win_counts(num_races, num_racers=3, track_length=120, probabilities=None, seed=None):
+    """Wins per racer over num_races independent races, simulated side by side.
+
+    Positions are a (races, racers) array so thousands of races cost about as
+    many numpy calls as one. With equal odds the counts should come out
+    roughly uniform; use it to check fairness.
+    """
+    rng = np.random.default_rng(seed)
+    probabilities = _probabilities(num_racers, probabilities)
+    finish = track_length - 1
+    positions = np.zeros((num_races, num_racers), dtype=np.int64)
+    winners = np.empty(num_races, dtype=np.int64)
+    active = np.arange(num_races)
+
+    while len(active):
+        moved = positions[active] + (rng.random((len(active), num_racers)) < probabilities)
+        positions[active] = moved
+        finished = moved >= finish
+        done = finished.any(axis=1)
+        if done.any():
+            # random key per finished racer, the largest one wins the tie
+            keys = np.where(finished[done], rng.random(finished[done].shape), -1.0)
+            winners[active[done]] = keys.argmax(axis=1)
+            active = active[~done]
+
+    return np.bincount(winners, minlength=num_racers)
+
+
+def clear_strip(controller):
     """Turn off all LEDs."""
-    for i in range(strip.numPixels()):
-        strip.setPixelColor(i, Color(0, 0, 0))
-    strip.show()
+    controller.pixels[:] = colors.OFF
+
 
-async def display_winner(strip, winning_color):
+def display_winner(controller, winning_color):
     """Light up the entire strip with the winning color."""
-    for i in range(strip.numPixels()):
-        strip.setPixelColor(i, winning_color)
-    strip.show()
-
-async def move_racer(strip, racer, winner_event):
-    """Move a single racer asynchronously."""
-    while not winner_event.is_set():
-        await asyncio.sleep(0.1)  # Small delay for movement
-        if random.random() < racer["probability"]:
-            racer["position"] += 1
-
-        # Stop if the racer reaches the end
-        if racer["position"] >= strip.numPixels() - 1:
-            print(f"Winner found: {racer}")
-            winner_event.set()
-            await display_winner(strip, racer["color"])
-
-async def update_strip(strip, winner_event):
-    """Update the LED strip asynchronously."""
-    while not winner_event.is_set():
-        clear_strip(strip)
-        for racer in racers:
-            position = min(racer["position"], strip.numPixels() - 1)
-            strip.setPixelColor(position, racer["color"])
-        strip.show()
-        await asyncio.sleep(0.05)  # Refresh rate for visual updates
-
-async def race(strip):
-    """Main asynchronous race function."""
-    global winner_event
-    global racers
-
-    #reset the strip
-    clear_strip(strip)
-    winner_event.clear()  
-    for racer in racers:
-        racer["position"] = 0
-
-    # Create tasks for racers and LED updating
-    tasks = [move_racer(strip, racer, winner_event) for racer in racers]
-    tasks.append(update_strip(strip, winner_event))  # Add strip update task
-
-    # Run all tasks until the winner is found
-    await asyncio.gather(*tasks)
+    controller.pixels[:] = winning_color
+
+
+def draw(controller, race_):
+    """Draw every racer, scaling track positions onto the strip."""
+    num_pixels = controller.numPixels
+    pixels = np.minimum(race_.positions * num_pixels // race_.track_length, num_pixels - 1)
+    clear_strip(controller)
+    controller.pixels[pixels] = race_.colors
+
+
+def race(controller, num_racers=3, seed=None, track_length=None, probabilities=None):
+    """Race frame generator, ends once the winner is shown.
+
+    One tick and one show per frame however many racers there are. The
+    track defaults to the strip length.
+    """
+    race_ = Race(num_racers, track_length or controller.numPixels, probabilities, seed)
+
+    clear_strip(controller)
+    yield MOVE_PERIOD
+
+    while race_.tick() is None:
+        draw(controller, race_)
+        yield MOVE_PERIOD
 
+    print(f"Winner found: racer {race_.winner} after {race_.ticks} moves")
+    display_winner(controller, race_.colors[race_.winner])
+    yield MOVE_PERIOD
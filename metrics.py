@@ -0,0 +1,128 @@
+"""in-process metrics rendered in the Prometheus text format
+
+Recording is a couple of additions per observation so it can stay on in the
+render loop; all formatting happens when /metrics is scraped.
+"""
+from bisect import bisect_left
+from threading import Lock
+
+# seconds, tuned for frame work between 100us and a couple of seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, label=None, amount=1):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def value(self, label=None):
+        return self._values.get(label, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label, value in sorted(self._values.items(), key=lambda item: str(item[0])):
+            labels = [(self.label_name, label)] if label is not None else []
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        # single writer (the render thread) for most histograms, so no lock;
+        # a scrape may see a sample in count but not yet in sum
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += self._counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, read, metric_type="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.metric_type = metric_type
+
+    def render(self):
+        value = self.read()
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        if value is not None:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, label_name=None):
+        return self.register(Counter(name, help_text, label_name))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, buckets))
+
+    def gauge(self, name, help_text, read, metric_type="gauge"):
+        return self.register(Gauge(name, help_text, read, metric_type))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+FRAME_RENDER_SECONDS = REGISTRY.histogram(
+    "led_frame_render_seconds", "Time an effect spent computing one frame.")
+SHOW_SECONDS = REGISTRY.histogram(
+    "led_show_seconds", "Time spent flushing a frame to the strip.")
+EFFECT_SWITCH_SECONDS = REGISTRY.histogram(
+    "led_effect_switch_seconds", "Time from a start command being queued until the new job is running.")
+STOP_JOIN_SECONDS = REGISTRY.histogram(
+    "led_stop_join_seconds", "Time the render loop took to unwind a stopped job.")
+JOB_STARTS = REGISTRY.counter(
+    "led_job_starts_total", "Jobs started, by job name.", label_name="job")
+JOB_FAILURES = REGISTRY.counter(
+    "led_job_failures_total", "Jobs that raised, by job name.", label_name="job")
+COMMANDS_REJECTED = REGISTRY.counter(
+    "led_render_commands_rejected_total", "Render commands refused because the queue was full.")
@@ -0,0 +1,114 @@
+"""binary live preview of the strip for browsers
+
+Each message is a header (kind, frame number, pixel count, payload length)
+and a payload. Keyframes carry plain RGB. Deltas carry the XOR of the RGB
+against the previous message's frame, run-length coded as (skip, count,
+count XOR bytes) tokens, so unchanged pixels cost nothing. Streams read
+FrameBuffer.snapshot and never touch the render loop; with no client
+connected nothing runs at all.
+"""
+import struct
+import time
+
+import numpy as np
+
+import ddp
+
+KEYFRAME = 0
+DELTA = 1
+HEADER = struct.Struct("!BIHI")
+TOKEN = struct.Struct("!HH")
+
+# a keyframe every this many messages so a client can never drift
+KEYFRAME_INTERVAL = 50
+# XOR runs closer than a token header are merged
+MERGE_GAP = TOKEN.size
+MIN_INTERVAL = 1 / 30
+MAX_INTERVAL = 1.0
+
+
+def rgb_bytes(pixels):
+    return np.frombuffer(ddp.to_rgb(pixels), dtype=np.uint8)
+
+
+def encode_delta(current, previous):
+    """RLE tokens for the XOR of two equal length RGB byte arrays."""
+    xor = current ^ previous
+    changed = np.flatnonzero(xor)
+    if len(changed) == 0:
+        return b""
+    breaks = np.flatnonzero(np.diff(changed) > MERGE_GAP)
+    starts = changed[np.concatenate(([0], breaks + 1))].tolist()
+    stops = (changed[np.concatenate((breaks, [len(changed) - 1]))] + 1).tolist()
+
+    tokens = []
+    position = 0
+    for start, stop in zip(starts, stops):
+        skip = start - position
+        while skip > 0xFFFF:  # skip and count are u16, hop with empty tokens
+            tokens.append(TOKEN.pack(0xFFFF, 0))
+            skip -= 0xFFFF
+        for chunk in range(start, stop, 0xFFFF):
+            count = min(stop - chunk, 0xFFFF)
+            tokens.append(TOKEN.pack(skip, count) + xor[chunk:chunk + count].tobytes())
+            skip = 0
+        position = stop
+    return b"".join(tokens)
+
+
+def apply_delta(payload, previous):
+    """Inverse of encode_delta, the browser does the same in index.js."""
+    frame = previous.copy()
+    position = 0
+    offset = 0
+    while offset < len(payload):
+        skip, count = TOKEN.unpack_from(payload, offset)
+        offset += TOKEN.size
+        position += skip
+        frame[position:position + count] ^= np.frombuffer(payload, np.uint8, count, offset)
+        offset += count
+        position += count
+    return frame
+
+
+def encode_message(kind, number, num_pixels, payload):
+    return HEADER.pack(kind, number, num_pixels, len(payload)) + payload
+
+
+def stream(framebuffer, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+           clock=time.monotonic, sleep=time.sleep):
+    """Preview messages for one client, paced to what the client keeps up with.
+
+    The WSGI server writes each message before asking for the next one, so
+    the time spent in yield is the time to send it. Slow sends double the
+    interval, fast ones shrink it back toward min_interval.
+    """
+    interval = min_interval
+    shown = None
+    sent = None
+    number = 0
+    while True:
+        snapshot = framebuffer.snapshot
+        if snapshot is None or snapshot is shown:
+            sleep(interval)
+            continue
+        shown = snapshot
+
+        rgb = rgb_bytes(snapshot)
+        kind, payload = KEYFRAME, rgb.tobytes()
+        if sent is not None and len(sent) == len(rgb) and number % KEYFRAME_INTERVAL:
+            delta = encode_delta(rgb, sent)
+            if len(delta) < len(payload):
+                kind, payload = DELTA, delta
+        sent = rgb
+
+        started = clock()
+        yield encode_message(kind, number, len(snapshot), payload)
+        took = clock() - started
+        number += 1
+
+        if took > interval / 2:
+            interval = min(interval * 2, max_interval)
+        else:
+            interval = max(interval * 0.9, min_interval)
+        sleep(max(interval - took, 0))
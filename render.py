@@ -0,0 +1,402 @@
+"""render engine that drives the effect frame generators"""
+import asyncio
+import inspect
+import logging
+import queue
+import time
+from concurrent.futures import Future
+from threading import Thread
+
+from compositor import mix
+from metrics import (
+    COMMANDS_REJECTED,
+    EFFECT_SWITCH_SECONDS,
+    FRAME_RENDER_SECONDS,
+    JOB_FAILURES,
+    JOB_STARTS,
+    SHOW_SECONDS,
+    STOP_JOIN_SECONDS,
+)
+from scheduler import CancelToken
+
+# commands waiting for the render loop, submits past this fail fast
+COMMAND_QUEUE_SIZE = 32
+# output rate while crossfading or interpolating
+OUTPUT_PERIOD = 1 / 60
+
+
+class Track:
+    """One effect generator with its own copy of the pixels.
+
+    A crossfade runs two effects at once and interpolation shows frames
+    the effect never drew, so neither can leave the effect's frame in
+    controller.pixels between frames. draw() swaps it in only while the
+    effect runs. live means controller.pixels is the effect's frame, as
+    it is when one effect plays on its own.
+    """
+
+    def __init__(self, frames, pixels):
+        self.frames = frames
+        self.frame = pixels.copy()
+        self.previous = self.frame
+        self.drawn_at = None
+        self.hold = 0.0
+        self.live = True
+        self.done = frames is None
+
+    def due(self, now):
+        return not self.done and (self.drawn_at is None or now >= self.drawn_at + self.hold)
+
+    def draw(self, pixels, delay, now):
+        """Resume the effect on its own frame; False once it has ended."""
+        pixels[:] = self.frame
+        try:
+            hold = next(self.frames)
+        except StopIteration:
+            self.done = True
+            return False
+        self.previous, self.frame = self.frame, pixels.copy()
+        self.drawn_at = now
+        self.hold = delay if hold is None else hold
+        return True
+
+    def image(self, now, interpolate):
+        """The frame to show now, part way from the previous one when interpolating."""
+        if not interpolate or self.drawn_at is None or self.hold <= 0:
+            return self.frame
+        return mix(self.previous, self.frame, (now - self.drawn_at) / self.hold)
+
+    def close(self):
+        self.done = True
+        if self.frames is not None:
+            self.frames.close()
+
+
+class RenderEngine:
+    """Owns timing, flushing and cancellation for effect generators.
+
+    An effect draws a frame into controller.pixels and yields. The engine
+    flushes it, waits for the next deadline on the controller's scheduler and
+    resumes the effect. A yielded number holds that frame for that many
+    seconds instead of controller.delay.
+
+    With crossfade set, an effect started over a running one fades in over
+    that many seconds while the old one keeps animating underneath (see
+    detach). With interpolate set, frames held longer than output_period
+    are blended towards the next one at that rate, one frame behind, so
+    slow effects move smoothly instead of stepping.
+    """
+
+    def __init__(self, controller, crossfade=0.0, interpolate=False, output_period=OUTPUT_PERIOD):
+        self.controller = controller
+        self.crossfade = crossfade
+        self.interpolate = interpolate
+        self.output_period = output_period
+        # the running effect, and the one fading out under it
+        self._track = None
+        self._outgoing = None
+
+    def detach(self):
+        """Take the running effect away from its loop so the next one can fade in over it.
+
+        The loop it is taken from won't close it. Mid crossfade the blend
+        currently shown is frozen instead and both effects are closed.
+        Returns None when nothing is playing.
+        """
+        track, outgoing = self._track, self._outgoing
+        self._track = self._outgoing = None
+        if track is None:
+            return None
+        pixels = self.controller.pixels
+        if outgoing is not None:
+            track.close()
+            outgoing.close()
+            track = Track(None, pixels)
+        elif track.live:
+            track.frame = track.previous = pixels.copy()
+        track.live = False
+        return track
+
+    def _paced(self, frames, token=None, outgoing=None):
+        """Flush each frame and yield how long to sleep before the next one."""
+        controller = self.controller
+        pixels = controller.pixels
+        scheduler = controller.scheduler
+        scheduler.reset()
+        track = Track(frames, pixels)
+        self._track, self._outgoing = track, outgoing
+        fade_started = time.monotonic()
+        try:
+            resumed = time.perf_counter()
+            while True:
+                now = time.monotonic()
+                outgoing = self._outgoing
+                interpolate = self.interpolate and track.hold > self.output_period
+                if outgoing is None and not interpolate:
+                    # one effect at its own pace, drawing straight into the pixels
+                    if not track.live:
+                        pixels[:] = track.frame
+                        track.live = True
+                    try:
+                        hold = next(frames)
+                    except StopIteration:
+                        break
+                    track.drawn_at = now
+                    track.hold = period = controller.delay if hold is None else hold
+                else:
+                    if track.live:
+                        track.frame = track.previous = pixels.copy()
+                        track.live = False
+                    if track.due(now) and not track.draw(pixels, controller.delay, now):
+                        break
+                    image = track.image(now, interpolate)
+                    if outgoing is not None:
+                        if outgoing.due(now):
+                            outgoing.draw(pixels, controller.delay, now)
+                        amount = (now - fade_started) / self.crossfade if self.crossfade > 0 else 1.0
+                        if amount < 1.0:
+                            image = mix(outgoing.image(now, interpolate), image, amount)
+                        else:
+                            outgoing.close()
+                            self._outgoing = None
+                    pixels[:] = image
+                    period = self.output_period
+                rendered = time.perf_counter()
+                FRAME_RENDER_SECONDS.observe(rendered - resumed)
+                if token is not None and token.cancelled:
+                    break
+                controller.show()
+                SHOW_SECONDS.observe(time.perf_counter() - rendered)
+                yield scheduler.advance(period)
+                resumed = time.perf_counter()
+        finally:
+            # unless detach() handed them on to the next effect
+            if self._track is track:
+                self._track = None
+                track.close()
+                if self._outgoing is not None:
+                    self._outgoing.close()
+                    self._outgoing = None
+
+    def run(self, frames, token=None):
+        """Consume frames on this thread until the effect ends or token is cancelled.
+
+        The frame wait sleeps on the token, so cancelling wakes the engine
+        straight away instead of after the rest of the frame period.
+        """
+        token = token or CancelToken()
+        paced = self._paced(frames, token)
+        try:
+            for seconds in paced:
+                if token.sleep(seconds):
+                    break
+        finally:
+            paced.close()
+
+    async def run_async(self, frames, outgoing=None):
+        """Consume frames as an asyncio task, cancelling the task stops the effect.
+
+        outgoing is a Track from detach() to crossfade from.
+        """
+        paced = self._paced(frames, outgoing=outgoing)
+        try:
+            for seconds in paced:
+                await asyncio.sleep(seconds)
+        finally:
+            paced.close()
+
+
+def drawn_frame(hold):
+    """The frame a one-shot job already drew, as a one frame effect held for hold seconds."""
+    yield hold
+
+
+class RenderLoop:
+    """The render worker: one long-lived event loop thread that owns the strip.
+
+    Request threads never touch the controller. They submit commands
+    (start, stop, settings, pixels) to a bounded queue and return straight
+    away. The running effect is a task on the same loop and only gives up
+    control while it sleeps between frames, so commands are always applied
+    between frames. Generator effects run through RenderEngine.run_async,
+    coroutines are awaited and plain callables (off, fills) draw one frame
+    that the engine then shows like any other effect, crossfade included.
+    """
+
+    def __init__(self, engine, max_commands=COMMAND_QUEUE_SIZE):
+        self.engine = engine
+        self.controller = engine.controller
+        self.current_name = None
+        self.last_switch_seconds = None
+        # called on the loop thread with the running job's name (None when idle)
+        self.listeners = []
+        self.commands = queue.Queue(max_commands)
+        self._task = None
+        self._handlers = {
+            "start": self._start,
+            "stop": self._stop,
+            "settings": self._settings,
+            "pixels": self._pixels,
+        }
+        self.loop = asyncio.new_event_loop()
+        # made by _consume on the loop, asyncio objects bind to a loop on 3.9
+        self._wake = None
+        self.thread = Thread(target=self._run_forever, name="render-loop", daemon=True)
+        self.thread.start()
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self.loop)
+        consumer = self.loop.create_task(self._consume())
+        self.loop.run_forever()
+        consumer.cancel()
+        self.loop.run_until_complete(asyncio.wait([consumer]))
+        self.loop.close()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def submit(self, command, *args):
+        """Queue a command and return a Future that resolves once it's applied.
+
+        Raises queue.Full instead of blocking when the loop is backed up.
+        """
+        if command not in self._handlers:
+            raise ValueError(f"Unknown render command '{command}'")
+        future = Future()
+        try:
+            self.commands.put_nowait((command, args, time.perf_counter(), future))
+        except queue.Full:
+            COMMANDS_REJECTED.inc()
+            raise
+        self.loop.call_soon_threadsafe(self._wake_up)
+        return future
+
+    def _wake_up(self):
+        # before _consume starts there is no event yet, it drains the queue first anyway
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self, name, job):
+        """Replace the running effect with job()."""
+        return self.submit("start", name, job)
+
+    def stop(self):
+        """Cancel the running effect."""
+        return self.submit("stop")
+
+    def close(self, timeout=None):
+        self.stop().result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    async def _consume(self):
+        self._wake = asyncio.Event()
+        while True:
+            while True:
+                try:
+                    command, args, queued, future = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    future.set_result(await self._handlers[command](*args))
+                except Exception as e:
+                    logging.exception("Render command %s failed", command)
+                    future.set_exception(e)
+                finally:
+                    self.commands.task_done()
+                if command == "start":
+                    self.last_switch_seconds = time.perf_counter() - queued
+                    EFFECT_SWITCH_SECONDS.observe(self.last_switch_seconds)
+            await self._wake.wait()
+            self._wake.clear()
+
+    def _notify(self):
+        for listener in self.listeners:
+            try:
+                listener(self.current_name)
+            except Exception:
+                logging.exception("Render loop listener failed")
+
+    async def _cancel(self):
+        task = self._task
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.wait([task])
+        self._task = None
+        self.current_name = None
+
+    async def _start(self, name, job):
+        # with a crossfade the old effect keeps playing under the new one
+        outgoing = self.engine.detach() if self.engine.crossfade > 0 else None
+        await self._cancel()
+        self.current_name = name
+        self._task = self.loop.create_task(self._run_job(name, job, outgoing))
+        JOB_STARTS.inc(name)
+        self._notify()
+
+    async def _stop(self):
+        stop_started = time.perf_counter()
+        was_running = self.running
+        await self._cancel()
+        STOP_JOIN_SECONDS.observe(time.perf_counter() - stop_started)
+        if was_running:
+            self._notify()
+
+    async def _settings(self, changes):
+        """Swap in the next settings snapshot with just these fields changed and return it.
+
+        Built here rather than by the caller so updates queued back to back
+        each start from the one before.
+        """
+        previous = self.controller.settings
+        settings = self.controller.update_settings(**changes)
+        if settings.brightness != previous.brightness and not self.running:
+            # nothing is drawing, so resend the last frame at the new level
+            self.controller.show()
+        return settings
+
+    async def _pixels(self, indices, colors):
+        """Write colors at indices and show them; False, drawing nothing, while an effect runs.
+
+        The effect's next frame would overwrite them anyway.
+        """
+        if self.running:
+            return False
+        self.controller.pixels[indices] = colors
+        self.controller.show()
+        return True
+
+    async def _run_job(self, name, job, outgoing=None):
+        logging.info("Running job %s", name)
+        framebuffer = self.controller.framebuffer
+        try:
+            # with flushes held a one-shot job only draws, the engine shows its frame
+            framebuffer.held = True
+            try:
+                result = job()
+            finally:
+                framebuffer.held = False
+            if inspect.isgenerator(result):
+                outgoing, fading = None, outgoing
+                await self.engine.run_async(result, fading)
+            elif inspect.isawaitable(result):
+                await result
+            else:
+                outgoing, fading = None, outgoing
+                hold = self.engine.crossfade if fading is not None else 0.0
+                await self.engine.run_async(drawn_frame(hold), fading)
+                # the fade can end on the frame being due, show it whole
+                self.controller.show()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            JOB_FAILURES.inc(name)
+            logging.exception("Job %s failed", name)
+        finally:
+            if outgoing is not None:
+                outgoing.close()
+            if self._task is asyncio.current_task():
+                self._task = None
+                self.current_name = None
+                self._notify()
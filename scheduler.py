@@ -0,0 +1,87 @@
+"""fixed rate frame scheduling for the effect loops"""
+import threading
+import time
+
+
+class CancelToken:
+    """Per-job cancellation flag that sleeping frame loops wake up on."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def sleep(self, seconds):
+        """Sleep for seconds, returning True early if the job is cancelled."""
+        return self._event.wait(seconds)
+
+
+class FrameScheduler:
+    """Paces frames against absolute deadlines instead of sleeping a fixed delay.
+
+    Render and show() time is absorbed into the frame period. When a frame
+    overruns, the missed deadlines are dropped rather than queued so the
+    effect never tries to catch up with a burst of frames.
+    """
+
+    def __init__(self, period, clock=time.monotonic):
+        self.period = period
+        self.clock = clock
+        self.frames = 0
+        self.dropped = 0
+        self.late = 0
+        self.fps = 0.0
+        self._deadline = None
+        self._window_start = None
+        self._window_frames = 0
+
+    def reset(self):
+        """Start a new timeline, e.g. when a new effect starts."""
+        self._deadline = None
+        self._window_start = None
+        self._window_frames = 0
+        self.fps = 0.0
+
+    def advance(self, period):
+        """Move to the next deadline and return how long to sleep until it."""
+        if period is not None:
+            self.period = period
+
+        now = self.clock()
+        if self._deadline is None:
+            self._deadline = now
+            self._window_start = now
+
+        self._deadline += self.period
+        if now > self._deadline and self.period > 0:
+            # we're late, skip the deadlines we already missed
+            missed = int((now - self._deadline) // self.period) + 1
+            self.late += 1
+            self.dropped += missed
+            self._deadline += missed * self.period
+
+        self._count_frame(now)
+        return max(0.0, self._deadline - now)
+
+    def _count_frame(self, now):
+        self.frames += 1
+        self._window_frames += 1
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self.fps = self._window_frames / elapsed
+            self._window_start = now
+            self._window_frames = 0
+
+    def stats(self):
+        return {
+            "target_fps": 1.0 / self.period if self.period > 0 else None,
+            "fps": round(self.fps, 2),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "late": self.late,
+        }
@@ -0,0 +1,127 @@
+"""startup timing and running under Flask's reloader
+
+Nodes come back from power cuts, so the time from the service starting
+to a lit strip matters. The apps mark each startup phase on a
+StartupTimer; the breakdown is logged once they're up and served on
+/status. The first phase starts when the process did (from /proc where
+available), so it covers the interpreter too. The apps call begin()
+before their other imports so the heavy ones (HEAVY_IMPORTS) are phases
+of their own; for a per module breakdown of the rest run the app under
+python -X importtime.
+
+The debug reloader runs the app file in two processes: a watcher that
+only restarts the server when files change, and a child that serves.
+Only the child may set up the strip, see reloader_watcher().
+"""
+import importlib
+import logging
+import os
+import time
+from concurrent import futures
+
+# Flask's reloader, off by default so the strip is set up in one process only
+RELOAD = os.getenv("LED_RELOAD") == "1"
+# effect to light the strip with as soon as the app is up, none when unset
+STARTUP_EFFECT = os.getenv("LED_STARTUP_EFFECT", "")
+# imported and timed one by one by begin()
+HEAVY_IMPORTS = ("numpy", "flask", "rpi_ws281x")
+# seconds to wait for the render loop to take the startup effect
+STARTUP_EFFECT_TIMEOUT = 1.0
+
+
+def _clock():
+    # same clock and origin as the process start time in /proc
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+def process_started():
+    """When this process started, in _clock() seconds, or None if unknown."""
+    try:
+        with open("/proc/self/stat") as stat:
+            fields = stat.read().rsplit(")", 1)[1].split()
+        return int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTimer:
+    """Seconds spent in each named startup phase, in order."""
+
+    def __init__(self, clock=None, started=None):
+        if clock is None:
+            clock = _clock if hasattr(time, "CLOCK_BOOTTIME") else time.perf_counter
+            if started is None and clock is _clock:
+                started = process_started()
+        self.clock = clock
+        self.started = clock() if started is None else started
+        self.phases = []
+        self._last = self.started
+
+    def mark(self, name):
+        """End the current phase, calling it name."""
+        now = self.clock()
+        self.phases.append((name, max(now - self._last, 0.0)))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def report(self):
+        return {
+            "total_ms": round(self.total * 1000, 1),
+            # a list, jsonify would sort the names of an object
+            "phases": [{"name": name, "ms": round(seconds * 1000, 1)} for name, seconds in self.phases],
+        }
+
+    def log(self):
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases)
+        logging.info("Started in %.0f ms: %s", self.total * 1000, phases)
+
+
+def begin():
+    """A StartupTimer with the interpreter and each of HEAVY_IMPORTS marked.
+
+    Call it before importing anything else, otherwise the heavy modules
+    load inside whatever imports them first and aren't timed on their own.
+    """
+    timer = StartupTimer()
+    timer.mark("interpreter")
+    for name in HEAVY_IMPORTS:
+        importlib.import_module(name)
+        timer.mark(name)
+    return timer
+
+
+def run_startup_effect(effect_runner, jobs, timeout=STARTUP_EFFECT_TIMEOUT):
+    """Start STARTUP_EFFECT if it's one of jobs; True once it's running.
+
+    A render loop too slow to take it in time is logged, it doesn't stop
+    the app from coming up.
+    """
+    if not STARTUP_EFFECT:
+        return False
+    if STARTUP_EFFECT not in jobs:
+        logging.warning("Unknown startup effect %s", STARTUP_EFFECT)
+        return False
+    try:
+        effect_runner(STARTUP_EFFECT).result(timeout)
+    except futures.TimeoutError:
+        logging.warning("Startup effect %s not started after %s s, carrying on", STARTUP_EFFECT, timeout)
+        return False
+    return True
+
+
+def reloader_watcher():
+    """True in the reloader's watcher process, which never serves."""
+    return RELOAD and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+
+
+def hand_over_to_reloader(app):
+    """In the reloader's watcher process, run app there and never return.
+
+    Call it from __main__ before touching any hardware; app.run() then
+    only restarts the child, which sets up the strip itself.
+    """
+    if reloader_watcher():
+        app.run(debug=True, host="0.0.0.0", use_reloader=True)
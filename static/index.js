@@ -23,5 +23,145 @@ function sendTextEffect() {
         return;
     }
 
-    triggerEndpoint("/start", { effect: "text_effect", args: [text] });
-}
\ No newline at end of file
+    submitTextEffect(text);
+}
+
+// the server answers with a job id straight away, poll it until it settles
+async function submitTextEffect(text) {
+    try {
+        const response = await fetch("/text_effect", {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ text: text })
+        });
+        let job = await response.json();
+        while (job.status === "pending") {
+            await new Promise(resolve => setTimeout(resolve, 250));
+            job = await (await fetch(`/text_effect/${job.job_id || job.id}`)).json();
+        }
+        console.log(job);
+    } catch (error) {
+        console.error(error);
+    }
+}
+// live state pushed by the server, handlers are keyed by event name
+// (effect, settings, stats); the browser reconnects on its own
+function connectEvents(handlers) {
+    const source = new EventSource("/events");
+    for (const [name, handler] of Object.entries(handlers)) {
+        source.addEventListener(name, event => handler(JSON.parse(event.data)));
+    }
+    return source;
+}
+
+// start, stop and settings all go to /command; keepalive lets the browser
+// reuse one connection for rapid fire presses
+async function sendCommand(command) {
+    try {
+        const response = await fetch("/command", {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(command),
+            keepalive: true
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            console.error(result.error);
+        }
+        return result;
+    } catch (error) {
+        console.error(error);
+    }
+}
+
+// fills an element with the running effect and frame rate
+function showLiveStatus(elementId) {
+    const element = document.getElementById(elementId);
+    let effect = null;
+    let fps = 0;
+    const render = () => {
+        element.textContent = effect ? `Running: ${effect} (${fps} fps)` : "Idle";
+    };
+    return connectEvents({
+        effect: data => { effect = data.effect; render(); },
+        stats: data => { effect = data.effect; fps = data.frames.fps; render(); }
+    });
+}
+
+// draws /preview into a canvas, one canvas pixel per LED (see preview.py
+// for the message format)
+async function startPreview(canvasId) {
+    const canvas = document.getElementById(canvasId);
+    const context = canvas.getContext("2d");
+    const response = await fetch("/preview");
+    if (!response.ok) {
+        // no preview on this server, leave the canvas blank
+        return;
+    }
+    const reader = response.body.getReader();
+    let buffer = new Uint8Array(0);
+    let rgb = new Uint8Array(0);
+
+    const draw = (numPixels) => {
+        if (canvas.width !== numPixels) {
+            canvas.width = numPixels;
+            canvas.height = 1;
+        }
+        const image = context.createImageData(numPixels, 1);
+        for (let i = 0; i < numPixels; i++) {
+            image.data.set(rgb.subarray(i * 3, i * 3 + 3), i * 4);
+            image.data[i * 4 + 3] = 255;
+        }
+        context.putImageData(image, 0, 0);
+    };
+
+    const applyDelta = (payload) => {
+        const view = new DataView(payload.buffer, payload.byteOffset, payload.byteLength);
+        let position = 0;
+        let offset = 0;
+        while (offset < payload.length) {
+            position += view.getUint16(offset);
+            const count = view.getUint16(offset + 2);
+            offset += 4;
+            for (let i = 0; i < count; i++) {
+                rgb[position + i] ^= payload[offset + i];
+            }
+            offset += count;
+            position += count;
+        }
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            return;
+        }
+        const joined = new Uint8Array(buffer.length + value.length);
+        joined.set(buffer);
+        joined.set(value, buffer.length);
+        buffer = joined;
+
+        // header: kind u8, frame number u32, pixels u16, payload length u32
+        while (buffer.length >= 11) {
+            const header = new DataView(buffer.buffer, buffer.byteOffset, 11);
+            const kind = header.getUint8(0);
+            const numPixels = header.getUint16(5);
+            const length = header.getUint32(7);
+            if (buffer.length < 11 + length) {
+                break;
+            }
+            const payload = buffer.subarray(11, 11 + length);
+            if (kind === 0) {
+                rgb = payload.slice();
+            } else if (rgb.length === numPixels * 3) {
+                applyDelta(payload);
+            }
+            draw(numPixels);
+            buffer = buffer.subarray(11 + length);
+        }
+    }
+}
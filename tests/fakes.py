@@ -0,0 +1,77 @@
+"""Hardware stand-ins shared by the tests."""
+import sys
+import types
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def fake_color(red, green, blue, white=0):
+    """Same packing as rpi_ws281x.Color."""
+    return (white << 24) | (red << 16) | (green << 8) | blue
+
+
+class FakePixelStrip:
+    """Like rpi_ws281x.PixelStrip: pixels are only written through setPixelColor."""
+
+    def __init__(self, count, *args, **kwargs):
+        self.count = count
+        self.pixels = [None] * count
+        self.set_pixel_calls = 0
+        self.show_calls = 0
+
+    def begin(self):
+        pass
+
+    def numPixels(self):
+        return self.count
+
+    def setPixelColor(self, index, color):
+        self.set_pixel_calls += 1
+        if 0 <= index < self.count:
+            self.pixels[index] = color
+
+    def show(self):
+        self.show_calls += 1
+
+
+def install_fake_ws281x():
+    """Put the project root on sys.path and replace rpi_ws281x with the fakes."""
+    project_root_str = str(PROJECT_ROOT)
+    if project_root_str not in sys.path:
+        sys.path.insert(0, project_root_str)
+
+    fake_ws281x = types.ModuleType("rpi_ws281x")
+    fake_ws281x.PixelStrip = FakePixelStrip
+    fake_ws281x.Color = fake_color
+    fake_ws281x.ws = types.SimpleNamespace(
+        WS2811_STRIP_RGB=0x00100800, WS2811_STRIP_GRB=0x00081000, SK6812_STRIP_RGBW=0x18100800)
+    sys.modules["rpi_ws281x"] = fake_ws281x
+    return fake_ws281x
+
+
+# ledstrip imports rpi_ws281x (through colors), so the fake goes in first
+install_fake_ws281x()
+
+from ledstrip import StripController
+
+
+class FakeController(StripController):
+    """The apps' controller over a FakePixelStrip."""
+
+    def __init__(self, count=10, delay=0):
+        from correction import ColorCorrection
+        from led_settings import Settings
+
+        colors = (fake_color(255, 0, 0), fake_color(0, 255, 0), fake_color(0, 0, 255))
+        # gamma 1 at full brightness is the identity, so frames reach the strip as drawn
+        super().__init__(FakePixelStrip(count), ColorCorrection(gamma=1.0, white_point=6500),
+                         Settings(0, colors, delay * 1000, 255))
+
+    @property
+    def delay(self):
+        return self.settings.delay_seconds
+
+    @delay.setter
+    def delay(self, seconds):
+        self.update_settings(delay=seconds * 1000)
@@ -2,32 +2,12 @@ import importlib.util
 import sys
 import threading
 import time
-import types
-from pathlib import Path
 
 import pytest
 
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
-ASYNC_APP_PATH = PROJECT_ROOT / "async-app.py"
-
-
-class FakePixelStrip:
-    def __init__(self, count, *args, **kwargs):
-        self.count = count
-        self.pixels = [None] * count
-
-    def begin(self):
-        pass
-
-    def numPixels(self):
-        return self.count
+from fakes import PROJECT_ROOT, install_fake_ws281x
 
-    def setPixelColor(self, index, color):
-        if 0 <= index < self.count:
-            self.pixels[index] = color
-
-    def show(self):
-        pass
+ASYNC_APP_PATH = PROJECT_ROOT / "async-app.py"
 
 
 def load_async_app_module():
@@ -40,17 +20,15 @@ def load_async_app_module():
         "light_race",
         "embeddings",
         "colors",
+        "compositor",
+        "framebuffer",
+        "metrics",
+        "render",
+        "scheduler",
     ]:
         sys.modules.pop(dep, None)
 
-    project_root_str = str(PROJECT_ROOT)
-    if project_root_str not in sys.path:
-        sys.path.insert(0, project_root_str)
-
-    fake_ws281x = types.ModuleType("rpi_ws281x")
-    fake_ws281x.PixelStrip = FakePixelStrip
-    fake_ws281x.Color = lambda r, g, b: (r, g, b)
-    sys.modules["rpi_ws281x"] = fake_ws281x
+    install_fake_ws281x()
 
     spec = importlib.util.spec_from_file_location(module_name, ASYNC_APP_PATH)
     module = importlib.util.module_from_spec(spec)
@@ -63,8 +41,14 @@ def load_async_app_module():
 def async_app_module():
     module = load_async_app_module()
     yield module
-    module.stop_current_job()
-    module.reset_stop_flags()
+    module.render_loop.close(timeout=1)
+
+
+def wait_until_idle(module, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while module.render_loop.running and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return not module.render_loop.running
 
 
 def test_effect_runner_runs_sync_job(async_app_module):
@@ -73,13 +57,10 @@ def test_effect_runner_runs_sync_job(async_app_module):
     async_app_module.jobs["unit_sync"] = lambda: run_event.set()
 
     try:
-        async_app_module.effect_runner("unit_sync")
-        thread = async_app_module.current_thread
-        assert thread is not None
-        thread.join(timeout=1)
+        async_app_module.effect_runner("unit_sync").result(1)
+        assert wait_until_idle(async_app_module)
         assert run_event.is_set()
-        assert async_app_module.current_thread is None
-        assert async_app_module.current_effect is None
+        assert async_app_module.render_loop.current_name is None
     finally:
         async_app_module.jobs.pop("unit_sync", None)
 
@@ -93,13 +74,10 @@ def test_effect_runner_runs_async_job(async_app_module):
     async_app_module.jobs["unit_async"] = lambda: sample_async_job()
 
     try:
-        async_app_module.effect_runner("unit_async")
-        thread = async_app_module.current_thread
-        assert thread is not None
-        thread.join(timeout=1)
+        async_app_module.effect_runner("unit_async").result(1)
+        assert wait_until_idle(async_app_module)
         assert run_event.is_set()
-        assert async_app_module.current_thread is None
-        assert async_app_module.current_effect is None
+        assert async_app_module.render_loop.current_name is None
     finally:
         async_app_module.jobs.pop("unit_async", None)
 
@@ -118,9 +96,11 @@ def test_start_and_stop_blocking_job(async_app_module):
 
     def blocking_job():
         started_event.set()
-        while not async_app_module.effects.stop_flag:
-            time.sleep(0.01)
-        stopped_event.set()
+        try:
+            while True:
+                yield
+        finally:
+            stopped_event.set()
 
     async_app_module.jobs["unit_block"] = blocking_job
 
@@ -139,14 +119,26 @@ def test_start_and_stop_blocking_job(async_app_module):
         assert stop_response.status_code == 200
         assert stopped_event.wait(timeout=1)
 
-        thread = async_app_module.current_thread
-        if thread:
-            thread.join(timeout=1)
-        assert async_app_module.current_thread is None
-        assert async_app_module.current_effect is None
+        assert wait_until_idle(async_app_module)
+        assert async_app_module.render_loop.current_name is None
     finally:
         async_app_module.jobs.pop("unit_block", None)
-        async_app_module.reset_stop_flags()
+
+
+def test_stop_returns_within_one_frame(async_app_module):
+    async_app_module.controller.set_delay(500)
+    client = async_app_module.app.test_client()
+
+    client.post("/start", json={"effect": "flash"})
+    time.sleep(0.05)
+    started = time.monotonic()
+    client.post("/stop")
+    client.post("/start", json={"effect": "wheel"})
+    async_app_module.render_loop.commands.join()
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.25
+    assert async_app_module.render_loop.current_name == "wheel"
 
 
 def test_clocks_route_renders(async_app_module):
@@ -180,3 +172,193 @@ def test_clock_jobs_dispatch_to_clock_effects(async_app_module, monkeypatch, job
 
     assert call_event.is_set()
 
+
+
+@pytest.mark.parametrize(
+    "job_name",
+    ["wheel", "warm_wheel", "flash", "leapfrog", "bounce", "rollout", "race",
+     "clock", "clock2", "clock3", "clock4", "clock5", "clock6"],
+)
+def test_effect_jobs_are_frame_generators(async_app_module, job_name):
+    frames = async_app_module.jobs[job_name]()
+
+    for _ in range(5):
+        next(frames)
+    frames.close()
+
+
+def test_metrics_endpoint_reports_frames_and_switches(async_app_module):
+    async_app_module.controller.set_delay(1)
+    client = async_app_module.app.test_client()
+
+    client.post("/start", json={"effect": "flash"})
+    time.sleep(0.05)
+    client.post("/stop")
+    async_app_module.render_loop.commands.join()
+
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert 'led_job_starts_total{job="flash"} 1' in body
+    assert "# TYPE led_frame_render_seconds histogram" in body
+    assert 'led_show_seconds_bucket{le="+Inf"}' in body
+    assert "led_effect_switch_seconds_count 1" in body
+    assert "led_stop_join_seconds_count 1" in body
+    assert "led_target_fps 1000.0" in body
+    assert "led_render_queue_depth 0" in body
+
+
+def test_pixels_are_drawn_by_the_render_loop(async_app_module):
+    client = async_app_module.app.test_client()
+
+    response = client.post("/pixels", json={"pixels": [[0, "#ff0000"], [3, "#0000ff"]]})
+    async_app_module.render_loop.commands.join()
+
+    assert response.status_code == 202
+    assert async_app_module.controller.pixels[0] == 0xFF0000
+    assert async_app_module.controller.pixels[3] == 0x0000FF
+    assert client.post("/pixels", json={"pixels": [[500, "#ff0000"]]}).status_code == 400
+    assert client.post("/pixels", json={"pixels": [[0, 5]]}).status_code == 400
+
+    # a running effect would draw over them on its next frame
+    async_app_module.effect_runner("wheel").result(1)
+    assert client.post("/pixels", json={"pixels": [[0, "#00ff00"]]}).status_code == 409
+    async_app_module.stop_current_job().result(1)
+
+
+def test_text_effect_returns_job_id_immediately(async_app_module, monkeypatch):
+    release = threading.Event()
+
+    def slow_fetch(text):
+        release.wait(2)
+        return [0.0, 1.0]
+
+    embeddings = importlib.import_module("embeddings")
+    monkeypatch.setattr(embeddings, "_provider", embeddings.HashEmbeddingProvider())
+    monkeypatch.setattr(embeddings, "_cache", embeddings.EmbeddingCache(":memory:"))
+    monkeypatch.setattr(async_app_module.text_jobs, "fetch", slow_fetch)
+    client = async_app_module.app.test_client()
+
+    started = time.monotonic()
+    response = client.post("/text_effect", json={"text": "hello"})
+    assert time.monotonic() - started < 0.5
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    assert client.get(f"/text_effect/{job_id}").get_json()["status"] == "pending"
+    assert client.get("/text_effect/missing").status_code == 404
+
+    # starting it like any other effect goes through the same background fetch
+    response = client.post("/start", json={"effect": "text_effect", "args": ["hello"]})
+    assert response.status_code == 202
+    assert response.get_json()["job_id"] == job_id
+    assert client.post("/start", json={"effect": "text_effect"}).status_code == 400
+    release.set()
+
+
+def test_external_frames_take_over_and_hand_back(monkeypatch):
+    import socket
+
+    monkeypatch.setenv("INGEST_PORT", "0")
+    module = load_async_app_module()
+    module.ingest.timeout = 0.2
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def wait_for_effect(name, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while module.render_loop.current_name != name and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return module.render_loop.current_name == name
+
+    try:
+        module.effect_runner("flash").result(1)
+        frame = bytes([0, 0, 255]) * module.controller.numPixels
+        sender.sendto(frame, ("127.0.0.1", module.ingest.address[1]))
+
+        assert wait_for_effect("ingest")
+        assert wait_for_effect("flash")
+        assert module.ingest.stats()["shown"] == 1
+        assert module.ingest.stats()["timeouts"] == 1
+    finally:
+        sender.close()
+        module.render_loop.close(timeout=1)
+        module.ingest.close()
+
+
+def test_command_endpoint_pushes_state_to_event_streams(async_app_module):
+    client = async_app_module.app.test_client()
+    stream = async_app_module.hub.stream()
+    next(stream)
+    assert "event: settings" in next(stream)
+
+    response = client.post("/command", json={"type": "start", "effect": "flash"})
+    assert response.status_code == 200
+    assert next(stream) == 'event: effect\ndata: {"effect": "flash"}\n\n'
+
+    response = client.post("/command", json={"type": "settings", "colors": ["#ff0000", "#00ff00", "#0000ff"], "delay": 40})
+    assert response.status_code == 200
+    assert '"delay": 40' in next(stream)
+    assert client.get("/get-settings").get_json()["delay"] == 40
+
+    response = client.post("/command", json={"type": "settings", "brightness": 64})
+    assert response.status_code == 200
+    assert '"brightness": 64' in next(stream)
+    async_app_module.render_loop.commands.join()
+    assert async_app_module.controller.framebuffer.correction.brightness == 64
+    assert client.get("/get-settings").get_json()["delay"] == 40
+
+    assert client.post("/command", json={"type": "stop"}).status_code == 200
+    assert next(stream) == 'event: effect\ndata: {"effect": null}\n\n'
+
+    assert client.post("/command", json={"type": "dance"}).status_code == 400
+    assert client.post("/command", json={"type": "settings", "colors": ["red"]}).status_code == 400
+    stream.close()
+
+
+def test_optional_subsystems_load_on_first_use(async_app_module):
+    # the fixture dropped embeddings, loading the app must not bring it back
+    assert "embeddings" not in sys.modules
+    assert not hasattr(async_app_module.clock_effects, "pytz")
+
+    startup = async_app_module.app.test_client().get("/status").get_json()["startup"]
+    assert [phase["name"] for phase in startup["phases"]] == [
+        "interpreter", "numpy", "flask", "rpi_ws281x", "imports", "strip", "render loop", "app"]
+
+
+def test_update_settings_accepts_partial_updates(async_app_module):
+    client = async_app_module.app.test_client()
+    before = client.get("/get-settings").get_json()
+
+    response = client.post("/update-settings", json={"delay": 40})
+    async_app_module.render_loop.commands.join()
+    after = client.get("/get-settings").get_json()
+
+    assert response.status_code == 200
+    assert after["delay"] == 40
+    assert after["colors"] == before["colors"]
+    assert after["version"] == before["version"] + 1
+
+    form = {"color1": "#010203", "color2": "#040506", "color3": "#070809", "delay": "30"}
+    assert client.post("/update-settings", data=form).status_code == 200
+    async_app_module.render_loop.commands.join()
+    after = client.get("/get-settings").get_json()
+    assert after["colors"] == ["#010203", "#040506", "#070809"]
+    assert after["delay"] == 30
+    assert after["brightness"] == before["brightness"]
+
+    assert client.post("/update-settings", json={}).status_code == 400
+    assert client.post("/update-settings", json={"delay": "soon"}).status_code == 400
+    assert client.post("/update-settings", json={"delay": -5}).status_code == 400
+    assert client.post("/update-settings", json={"brightness": 300}).status_code == 400
+    assert client.post("/command", json={"type": "settings", "colors": []}).status_code == 400
+    assert client.post("/command", json={"type": "settings", "colors": ["#ff0000"]}).status_code == 400
+
+
+def test_events_endpoint_is_an_event_stream(async_app_module):
+    response = async_app_module.app.test_client().get("/events")
+
+    assert response.mimetype == "text/event-stream"
+    assert next(response.iter_encoded()).startswith(b"retry:")
+    response.close()
@@ -0,0 +1,91 @@
+import pytest
+
+from fakes import FakePixelStrip, install_fake_ws281x
+
+install_fake_ws281x()
+
+from canvas import Segment, StripCanvas, build_canvas, load_outputs
+from framebuffer import FrameBuffer
+
+
+def test_segments_map_canvas_pixels_onto_each_strip():
+    first, second = FakePixelStrip(4), FakePixelStrip(6)
+    canvas = StripCanvas([
+        Segment(first, 0, 4),
+        Segment(second, 4, 3, offset=3, reverse=True),
+        Segment(second, 7, 3),
+    ])
+
+    buffer = FrameBuffer(canvas.numPixels())
+    buffer.pixels[:] = range(10)
+    buffer.flush(canvas)
+
+    assert canvas.numPixels() == 10
+    assert first.pixels == [0, 1, 2, 3]
+    assert second.pixels == [7, 8, 9, 6, 5, 4]
+    assert first.show_calls == second.show_calls == 1
+
+
+def test_delta_flush_only_shows_the_strips_that_changed():
+    first, second = FakePixelStrip(5), FakePixelStrip(5)
+    canvas = StripCanvas([Segment(first, 0, 5), Segment(second, 5, 5, reverse=True)])
+    buffer = FrameBuffer(10)
+    buffer.flush(canvas)
+
+    buffer.pixels[6] = 42
+    buffer.flush(canvas)
+
+    assert second.pixels[3] == 42
+    assert first.show_calls == 1
+    assert second.show_calls == 2
+
+
+def test_overlapping_segments_are_rejected():
+    strip = FakePixelStrip(10)
+    with pytest.raises(ValueError):
+        StripCanvas([Segment(strip, 0, 6), Segment(strip, 5, 4, offset=6)])
+
+
+def test_outputs_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("LED_OUTPUTS", '[{"count": 30}, {"count": 20, "pin": 21, "dma": 11}]')
+    created = []
+
+    def factory(count, *args, **kwargs):
+        created.append((count, args))
+        return FakePixelStrip(count)
+
+    canvas = build_canvas(load_outputs(), strip_factory=factory)
+
+    assert canvas.numPixels() == 50
+    assert created[1] == (20, (21, 800000, 11, False, 255, 0))
+
+
+def test_only_one_output_may_use_pwm():
+    outputs = [{"count": 10, "pin": 18}, {"count": 10, "pin": 13, "channel": 1}]
+
+    with pytest.raises(ValueError):
+        build_canvas(outputs, strip_factory=lambda count, *args, **kwargs: FakePixelStrip(count))
+
+
+def test_strip_type_names_an_rpi_ws281x_constant():
+    created = []
+
+    def factory(count, *args, strip_type=None):
+        created.append(strip_type)
+        return FakePixelStrip(count)
+
+    build_canvas([{"count": 10, "strip_type": "SK6812_STRIP_RGBW"}], strip_factory=factory)
+    assert created == [0x18100800]
+
+    with pytest.raises(ValueError):
+        build_canvas([{"count": 10, "strip_type": "GRB"}], strip_factory=factory)
+
+
+def test_default_is_the_single_strip(monkeypatch):
+    monkeypatch.delenv("LED_OUTPUTS", raising=False)
+    monkeypatch.delenv("LED_OUTPUTS_FILE", raising=False)
+
+    canvas = build_canvas(load_outputs(), strip_factory=lambda count, *args, **kwargs: FakePixelStrip(count))
+
+    assert canvas.numPixels() == 120
+    assert len(canvas.strips) == 1
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from fakes import FakeController, install_fake_ws281x
+
+install_fake_ws281x()
+
+import clock_effects
+import colors
+
+
+class FrozenClock:
+    def __init__(self, *times):
+        self.times = list(times)
+
+    def now(self, timezone=None):
+        return self.times.pop(0) if len(self.times) > 1 else self.times[0]
+
+
+def test_ticks_align_to_second_boundaries_and_skip_unchanged_seconds(monkeypatch):
+    frozen = FrozenClock(
+        datetime(2024, 1, 1, 3, 15, 20, 250_000),
+        datetime(2024, 1, 1, 3, 15, 20, 900_000),
+        datetime(2024, 1, 1, 3, 15, 21, 5_000),
+    )
+    monkeypatch.setattr(clock_effects, "dt", frozen)
+    draws = []
+
+    frames = clock_effects._ticks(FakeController(), lambda controller, *hms: draws.append(hms))
+    holds = [next(frames) for _ in range(3)]
+
+    assert draws == [(3, 15, 20), (3, 15, 21)]
+    assert abs(holds[0] - (0.75 + clock_effects.TICK_MARGIN)) < 1e-9
+    assert abs(holds[2] - (0.995 + clock_effects.TICK_MARGIN)) < 1e-9
+
+
+def test_clock_tick_flushes_only_changed_pixels(monkeypatch):
+    frozen = FrozenClock(
+        datetime(2024, 1, 1, 3, 15, 20),
+        datetime(2024, 1, 1, 3, 15, 21),
+    )
+    monkeypatch.setattr(clock_effects, "dt", frozen)
+    controller = FakeController(120)
+    frames = clock_effects.clock2(controller)
+
+    next(frames)
+    controller.show()
+    controller.strip.set_pixel_calls = 0
+    next(frames)
+    controller.show()
+
+    # seconds moved from pixels 40-41 to 42-43, nothing else is rewritten
+    assert controller.strip.set_pixel_calls == 4
+    assert controller.strip.pixels[42] == colors.PURPLE
+
+
+def test_timezone_is_loaded_once():
+    assert clock_effects.get_timezone("UTC") is clock_effects.get_timezone("UTC")
+
+
+def test_set_timezone_changes_the_default(monkeypatch):
+    monkeypatch.setattr(clock_effects, "CLOCK_TIMEZONE", "America/New_York")
+    assert str(clock_effects.get_timezone()) == "America/New_York"
+
+    clock_effects.set_timezone("Europe/London")
+
+    assert str(clock_effects.get_timezone()) == "Europe/London"
@@ -0,0 +1,24 @@
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+import colors
+
+
+def test_wheel_frame_matches_scalar_wheel():
+    frame = colors.wheel_frame(300, offset=7)
+
+    assert frame.dtype.name == "uint32"
+    assert list(frame) == [colors.wheel((i + 7) & 255) for i in range(300)]
+
+
+def test_spread_frame_matches_scalar_warm_wheel():
+    frame = colors.spread_frame(120, colors.WARM_WHEEL_LUT)
+
+    assert list(frame) == [colors.warm_wheel(i * 256 // 120 % 256) for i in range(120)]
+
+
+def test_hue_luts():
+    assert colors.RED_HUE_LUT[10] == colors.red_hue(10)
+    assert colors.GREEN_HUE_LUT[255] == colors.green_hue(255)
+    assert colors.BLUE_HUE_LUT[0] == colors.OFF
@@ -0,0 +1,60 @@
+import numpy as np
+
+from fakes import fake_color, install_fake_ws281x
+
+install_fake_ws281x()
+
+import compositor as comp
+
+
+def test_layers_stack_bottom_to_top():
+    compositor = comp.Compositor(6)
+    background = compositor.add_layer("background")
+    top = compositor.add_layer("top")
+    background.fill(0, 6, fake_color(0, 0, 255))
+    top.set([1, 2], fake_color(255, 0, 0))
+    out = np.zeros(6, dtype=np.uint32)
+
+    compositor.compose(out)
+
+    assert list(out) == [fake_color(0, 0, 255), fake_color(255, 0, 0), fake_color(255, 0, 0)] + [fake_color(0, 0, 255)] * 3
+
+
+def test_alpha_and_add_blend_per_channel():
+    dst = np.array([fake_color(200, 0, 100)], dtype=np.uint32)
+    src = np.array([fake_color(0, 200, 100)], dtype=np.uint32)
+
+    over = dst.copy()
+    comp.blend(over, src, np.array([0]), comp.BLEND_OVER, alpha=0.5)
+    added = dst.copy()
+    comp.blend(added, src, np.array([0]), comp.BLEND_ADD)
+
+    assert over[0] == fake_color(100, 100, 100)
+    assert added[0] == fake_color(200, 200, 200)
+
+
+def test_unchanged_lower_layers_are_reused(monkeypatch):
+    compositor = comp.Compositor(4)
+    static = compositor.add_layer("static")
+    moving = compositor.add_layer("moving")
+    static.fill(0, 4, 1)
+    out = np.zeros(4, dtype=np.uint32)
+    compositor.compose(out)
+
+    blended = []
+    original_blend = comp.blend
+    monkeypatch.setattr(comp, "blend", lambda dst, src, idx, *args: blended.append(len(idx)) or original_blend(dst, src, idx, *args))
+    moving.set([3], 9)
+    compositor.compose(out)
+
+    assert blended == [1]
+    assert list(out) == [1, 1, 1, 9]
+
+
+def test_mix_crossfades_whole_frames():
+    red = np.full(3, fake_color(255, 0, 0), dtype=np.uint32)
+    blue = np.full(3, fake_color(0, 0, 255), dtype=np.uint32)
+
+    assert list(comp.mix(red, blue, 0.0)) == list(red)
+    assert list(comp.mix(red, blue, 1.0)) == list(blue)
+    assert list(comp.mix(red, blue, 0.5)) == [fake_color(127, 0, 127)] * 3
@@ -0,0 +1,62 @@
+import numpy as np
+
+from fakes import FakePixelStrip, install_fake_ws281x
+
+install_fake_ws281x()
+
+from correction import ColorCorrection, white_balance
+from framebuffer import FrameBuffer
+
+
+def test_neutral_settings_are_the_identity():
+    correction = ColorCorrection(gamma=1.0, brightness=255, white_point=6500)
+    pixels = np.array([0x000000, 0x123456, 0xFFFFFF, 0x01FF8040], dtype=np.uint32)
+
+    assert correction.identity
+    assert correction.apply(pixels).tolist() == pixels.tolist()
+    assert np.allclose(white_balance(6500), 1.0)
+
+
+def test_tables_fold_gamma_brightness_and_white_balance():
+    correction = ColorCorrection(gamma=2.0, brightness=128, white_point=6500)
+    pixels = np.array([0xFF8000, 0x01000000], dtype=np.uint32)
+
+    red, half = 0xFF * 128 / 255, (0x80 / 255) ** 2 * 128
+    assert correction.apply(pixels).tolist() == [(round(red) << 16) | (round(half) << 8), 0x01000000]
+
+    warm = ColorCorrection(gamma=1.0, white_point=3000).apply(np.array([0xFFFFFF], dtype=np.uint32))[0]
+    assert warm >> 16 == 0xFF
+    assert (warm >> 8) & 0xFF > warm & 0xFF
+
+
+def test_brightness_change_resends_an_unchanged_frame():
+    strip = FakePixelStrip(4)
+    correction = ColorCorrection(gamma=1.0)
+    buffer = FrameBuffer(4, correction)
+    buffer.pixels[:] = 0x804020
+    assert buffer.flush(strip)
+    assert not buffer.flush(strip)
+
+    version = correction.version
+    correction.set_brightness(0)
+    assert correction.version == version + 1
+    assert buffer.dirty
+    assert buffer.flush(strip)
+    assert strip.pixels == [0] * 4
+    # the drawn frame is left alone, only the strip is dimmed
+    assert buffer.snapshot.tolist() == [0x804020] * 4
+
+    correction.set_brightness(0)
+    assert not buffer.flush(strip)
+
+
+def test_sparse_changes_are_corrected_too():
+    strip = FakePixelStrip(100)
+    buffer = FrameBuffer(100, ColorCorrection(gamma=1.0, brightness=0))
+    buffer.flush(strip)
+    strip.set_pixel_calls = 0
+
+    buffer.pixels[[3, 40]] = 0xFFFFFF
+    assert buffer.flush(strip)
+    assert strip.set_pixel_calls == 2
+    assert strip.pixels[3] == strip.pixels[40] == 0
@@ -0,0 +1,101 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from fakes import FakeController, fake_color, install_fake_ws281x
+
+install_fake_ws281x()
+
+import effects
+from cycle_cache import CycleCache, render_cycle
+
+
+def frames_of(controller, generator, count):
+    frames = []
+    for _ in itertools.islice(generator, count):
+        frames.append(controller.pixels.copy())
+    generator.close()
+    return frames
+
+
+@pytest.mark.parametrize("name", ["color_wheel", "flash", "leap_frog", "warm_wheel", "bouncing_window"])
+def test_cached_effects_match_the_live_render(name):
+    effect = getattr(effects, name)
+    live = FakeController(count=12)
+    cached = FakeController(count=12)
+
+    # three times the longest cycle here, the wheel's 256 frames
+    expected = frames_of(live, effect.__wrapped__(live), 768)
+    actual = frames_of(cached, effect(cached), 768)
+
+    assert all(np.array_equal(a, b) for a, b in zip(expected, actual))
+
+
+def test_replay_does_not_run_the_effect():
+    cache = CycleCache()
+    controller = FakeController(count=8)
+    calls = []
+
+    def effect(controller):
+        i = 0
+        while True:
+            calls.append(i)
+            controller.pixels[:] = i % 4
+            i += 1
+            yield
+
+    frames = frames_of(controller, cache.play(controller, effect, 4), 20)
+
+    assert len(calls) == 4
+    assert [int(frame[0]) for frame in frames] == [0, 1, 2, 3] * 5
+    assert cache.stats()["cycles"] == 1
+
+
+def test_color_change_renders_a_new_cycle_from_the_same_frame():
+    cache = CycleCache()
+    controller = FakeController(count=6)
+    red, blue = fake_color(255, 0, 0), fake_color(0, 0, 255)
+    controller.set_colors([red, blue])
+    player = cache.play(controller, effects.flash.__wrapped__, 2)
+
+    next(player)
+    first = controller.pixels.copy()
+    controller.set_colors([blue, red])
+    next(player)
+
+    # the new colors, at the next step of the cycle
+    assert np.array_equal(controller.pixels, first)
+    assert len(cache) == 1
+    player.close()
+
+
+def test_memory_is_bounded():
+    controller = FakeController(count=100)
+    cycle_bytes = 256 * 100 * 4
+    cache = CycleCache(max_bytes=cycle_bytes * 2, max_cycle_bytes=cycle_bytes)
+
+    for colors in ([1, 1], [2, 2], [3, 3]):
+        controller.set_colors(colors)
+        frames_of(controller, cache.play(controller, effects.flash.__wrapped__, 256), 1)
+    assert len(cache) == 2
+    assert cache.nbytes <= cycle_bytes * 2
+    assert cache.evictions == 1
+
+    # too big for one cycle: rendered live, nothing cached
+    cache.clear()
+    frames_of(controller, cache.play(controller, effects.color_wheel.__wrapped__, 257), 3)
+    assert len(cache) == 0
+
+
+def test_effects_that_end_are_not_cached():
+    controller = FakeController(count=4)
+
+    def two_frames(controller):
+        controller.pixels[:] = 1
+        yield
+        controller.pixels[:] = 2
+        yield
+
+    assert render_cycle(controller, two_frames, 3) is None
+    assert render_cycle(controller, two_frames, 2).tolist() == [[1] * 4, [2] * 4]
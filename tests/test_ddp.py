@@ -0,0 +1,98 @@
+import time
+
+import numpy as np
+
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+import ddp
+from canvas import build_canvas
+from framebuffer import FrameBuffer
+
+
+def test_packets_round_trip():
+    pixels = np.array([0xFF0000, 0x00FF00, 0x0000FF, 0x123456], dtype=np.uint32)
+    packet = ddp.encode(3, 30, ddp.to_rgb(pixels), push=True)
+
+    flags, sequence, offset, data = ddp.decode(packet)
+
+    assert flags & ddp.FLAG_PUSH
+    assert (sequence, offset) == (3, 30)
+    assert ddp.from_rgb(data).tolist() == pixels.tolist()
+
+
+def test_changed_runs_merge_short_gaps():
+    previous = np.zeros(40, dtype=np.uint32)
+    current = previous.copy()
+    current[[2, 4, 20, 21]] = 1
+
+    assert ddp.changed_runs(current, previous) == [(2, 5), (20, 22)]
+    assert ddp.changed_runs(previous, previous) == []
+
+
+def test_frames_reach_the_loopback_node():
+    receiver = ddp.DDPReceiver(1000)
+    strip = ddp.DDPStrip(1000, *receiver.address, delta=True)
+    try:
+        strip[0:1000] = list(range(1000))
+        strip.show()
+        assert receiver.wait_for_frames(1)
+        assert receiver.pixels.tolist() == list(range(1000))
+        # 1000 pixels need three packets
+        assert strip.packets_sent == 3
+
+        strip.setPixelColor(500, 7)
+        strip.show()
+        assert receiver.wait_for_frames(2)
+        assert receiver.pixels[500] == 7
+        assert strip.packets_sent == 4
+        assert receiver.stats()["missed_frames"] == 0
+    finally:
+        strip.close()
+        receiver.close()
+
+
+def wait_for_packets(receiver, sent, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while receiver.packets + receiver.dropped < sent and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_keyframes_repair_lost_packets():
+    receiver = ddp.DDPReceiver(50, drop_rate=0.3, seed=1)
+    strip = ddp.DDPStrip(50, *receiver.address, delta=True, keyframe_interval=5)
+    rng = np.random.default_rng(0)
+    try:
+        for _ in range(40):
+            strip.pixels[rng.integers(0, 50, 3)] = rng.integers(0, 1 << 24, 3)
+            strip.show()
+        wait_for_packets(receiver, strip.packets_sent)
+        assert receiver.pixels.tolist() != strip.pixels.tolist()
+
+        # stop losing packets, the next keyframe brings the node back in sync
+        receiver.drop_rate = 0.0
+        strip.frames = 0
+        strip.show()
+        wait_for_packets(receiver, strip.packets_sent)
+        assert receiver.pixels.tolist() == strip.pixels.tolist()
+        assert receiver.dropped > 0
+        assert receiver.missed_frames > 0
+    finally:
+        strip.close()
+        receiver.close()
+
+
+def test_ddp_outputs_join_the_canvas():
+    receiver = ddp.DDPReceiver(20)
+    host, port = receiver.address
+    try:
+        canvas = build_canvas([{"type": "ddp", "host": host, "port": port, "count": 20}])
+        buffer = FrameBuffer(canvas.numPixels())
+        buffer.pixels[:] = 0x0000FF
+        buffer.flush(canvas)
+
+        assert receiver.wait_for_frames(1)
+        assert receiver.pixels.tolist() == [0x0000FF] * 20
+    finally:
+        receiver.close()
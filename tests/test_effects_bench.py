@@ -0,0 +1,37 @@
+import importlib.util
+import json
+
+from fakes import PROJECT_ROOT
+
+BENCH_PATH = PROJECT_ROOT / "benchmarks" / "effects_bench.py"
+
+
+def load_bench_module():
+    spec = importlib.util.spec_from_file_location("effects_bench_under_test", BENCH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_benchmark_reports_every_job_and_length(tmp_path):
+    bench = load_bench_module()
+    output = tmp_path / "bench.json"
+
+    bench.main(["--frames", "5", "--lengths", "30", "60", "--jobs", "wheel", "race", "off",
+                "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    rows = {(row["job"], row["pixels"]): row for row in report["results"]}
+    assert set(rows) == {(job, n) for job in ("wheel", "race", "off") for n in (30, 60)}
+    assert rows[("wheel", 30)]["show_calls_per_frame"] == 1.0
+    assert rows[("wheel", 30)]["set_pixel_calls_per_frame"] <= 30
+
+
+def test_benchmark_runs_every_job_by_default(tmp_path):
+    bench = load_bench_module()
+    output = tmp_path / "bench.json"
+
+    bench.main(["--frames", "2", "--lengths", "30", "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    assert {row["job"] for row in report["results"]} >= {"text_effect", "race", "wheel"}
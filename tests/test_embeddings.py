@@ -0,0 +1,78 @@
+import numpy as np
+
+from fakes import FakeController, install_fake_ws281x
+
+install_fake_ws281x()
+
+import embeddings
+from embedding_cache import EmbeddingCache
+
+
+class CountingProvider(embeddings.HashEmbeddingProvider):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def embed(self, text):
+        self.calls += 1
+        return super().embed(text)
+
+
+def test_cache_survives_restart_and_evicts_least_recently_used(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    cache = EmbeddingCache(str(path), max_entries=2)
+    cache.put("a", "m", 3, [1, 2, 3])
+    cache.put("b", "m", 3, [4, 5, 6])
+    assert cache.get("a", "m", 3) is not None  # a is now most recent
+    cache.put("c", "m", 3, [7, 8, 9])
+    cache.close()
+
+    reopened = EmbeddingCache(str(path), max_entries=2)
+    assert reopened.get("b", "m", 3) is None
+    assert list(reopened.get("a", "m", 3)) == [1, 2, 3]
+    assert reopened.get("a", "m", 4) is None
+    assert reopened.stats() == {"hits": 1, "misses": 2, "entries": 2, "max_entries": 2}
+
+
+def test_get_embeddings_only_calls_provider_on_a_miss(monkeypatch):
+    provider = CountingProvider()
+    monkeypatch.setattr(embeddings, "_provider", provider)
+    monkeypatch.setattr(embeddings, "_cache", EmbeddingCache(":memory:"))
+
+    first = embeddings.get_embeddings("all in")
+    second = embeddings.get_embeddings("all in")
+
+    assert provider.calls == 1
+    assert np.allclose(first, second)
+    assert len(first) == embeddings.EMBEDDING_DIMENSIONS
+
+
+def test_vectorized_hsv_matches_colorsys():
+    from colorsys import hsv_to_rgb
+
+    hues = np.linspace(0, 1, 257)
+    expected = [embeddings.colors.pack_rgb(*(int(c * 255) for c in hsv_to_rgb(h, 1.0, 1.0))) for h in hues]
+
+    assert list(embeddings.hsv_to_packed(hues)) == [int(value) for value in expected]
+
+
+def test_every_mapping_returns_a_full_packed_frame():
+    embedding = embeddings.HashEmbeddingProvider().embed("call")
+
+    for mode in embeddings.MAPPINGS:
+        frame = embeddings.embedding_frame(embedding, 300, mode)
+        assert frame.dtype == np.uint32
+        assert frame.shape == (300,)
+
+
+def test_display_text_fills_the_whole_strip_in_one_flush(monkeypatch):
+    monkeypatch.setattr(embeddings, "_provider", embeddings.HashEmbeddingProvider())
+    monkeypatch.setattr(embeddings, "_cache", EmbeddingCache(":memory:"))
+    controller = FakeController(120)
+
+    embeddings.display_text_as_lights(controller, "fold", mode="rgb")
+
+    assert controller.strip.show_calls == 1
+    assert controller.strip.set_pixel_calls == 120
+    assert controller.strip.pixels[-1] is not None
+    assert any(((value >> 16) & 0xFF) and ((value >> 8) & 0xFF) for value in controller.strip.pixels)
@@ -0,0 +1,51 @@
+import json
+
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+from events import CLIENT_QUEUE_SIZE, EventHub
+
+
+def parse(message):
+    lines = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_new_clients_get_the_latest_state_first():
+    hub = EventHub()
+    hub.publish("effect", {"effect": "wheel"})
+    hub.publish("effect", {"effect": "flash"})
+    hub.publish("settings", {"delay": 20})
+
+    stream = hub.stream()
+    assert next(stream).startswith("retry:")
+    assert parse(next(stream)) == ("effect", {"effect": "flash"})
+    assert parse(next(stream)) == ("settings", {"delay": 20})
+    assert hub.clients == 1
+
+    hub.publish("effect", {"effect": None})
+    assert parse(next(stream)) == ("effect", {"effect": None})
+
+    stream.close()
+    assert hub.clients == 0
+
+
+def test_idle_streams_send_heartbeats():
+    stream = EventHub().stream(heartbeat=0.01)
+    next(stream)
+
+    assert next(stream) == ": heartbeat\n\n"
+    stream.close()
+
+
+def test_slow_clients_lose_their_oldest_events():
+    hub = EventHub()
+    stream = hub.stream()
+    next(stream)
+
+    for i in range(CLIENT_QUEUE_SIZE + 5):
+        hub.publish("stats", {"frame": i})
+
+    assert parse(next(stream)) == ("stats", {"frame": 5})
+    stream.close()
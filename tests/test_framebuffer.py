@@ -0,0 +1,61 @@
+from fakes import FakePixelStrip, install_fake_ws281x
+
+install_fake_ws281x()
+
+from framebuffer import FrameBuffer
+
+
+def test_first_flush_writes_every_pixel():
+    strip = FakePixelStrip(8)
+    buffer = FrameBuffer(8)
+    buffer.pixels[2:5] = 0x00FF00
+
+    assert buffer.flush(strip)
+    assert strip.set_pixel_calls == 8
+    assert strip.show_calls == 1
+    assert strip.pixels[2:5] == [0x00FF00] * 3
+
+
+def test_flush_skips_unchanged_frames():
+    strip = FakePixelStrip(8)
+    buffer = FrameBuffer(8)
+
+    assert buffer.flush(strip)
+    assert not buffer.flush(strip)
+    assert strip.show_calls == 1
+
+    buffer.pixels[0] = 1
+    assert buffer.flush(strip)
+    buffer.invalidate()
+    assert buffer.flush(strip)
+    assert strip.show_calls == 3
+
+
+def test_sparse_changes_write_only_changed_pixels():
+    strip = FakePixelStrip(100)
+    buffer = FrameBuffer(100)
+    buffer.flush(strip)
+    strip.set_pixel_calls = 0
+
+    buffer.pixels[[3, 40]] = 7
+    assert buffer.flush(strip)
+
+    assert strip.set_pixel_calls == 2
+    assert strip.pixels[3] == strip.pixels[40] == 7
+
+
+def test_numpy_outputs_take_the_whole_write_at_once():
+    class ArrayStrip(FakePixelStrip):
+        def set_pixels(self, indices, colors):
+            self.writes = getattr(self, "writes", 0) + 1
+            for index, color in zip(indices.tolist(), colors.tolist()):
+                self.pixels[index] = color
+
+    strip = ArrayStrip(8)
+    buffer = FrameBuffer(8)
+    buffer.pixels[:] = 5
+
+    assert buffer.flush(strip)
+    assert strip.writes == 1
+    assert strip.set_pixel_calls == 0
+    assert strip.pixels == [5] * 8
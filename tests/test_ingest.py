@@ -0,0 +1,104 @@
+import socket
+import time
+
+import numpy as np
+
+from fakes import FakeController, install_fake_ws281x
+
+install_fake_ws281x()
+
+import ddp
+import ingest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_ingest(num_pixels=4, **kwargs):
+    return ingest.FrameIngest(num_pixels, host="127.0.0.1", port=0, **kwargs)
+
+
+def raw(colors):
+    return ddp.to_rgb(np.array(colors, dtype=np.uint32))
+
+
+def test_raw_and_ddp_frames_decode_into_the_buffer():
+    clock = FakeClock()
+    frames = make_ingest(clock=clock, jitter_delay=0)
+    try:
+        frames.feed(raw([1, 2, 3, 4]))
+        frames.feed(ddp.encode(1, 0, raw([5, 6])))
+        frames.feed(ddp.encode(1, 6, raw([7, 8]), push=True))
+
+        assert frames.take(clock.now).tolist() == [1, 2, 3, 4]
+        assert frames.take(clock.now).tolist() == [5, 6, 7, 8]
+        assert frames.take(clock.now) is None
+    finally:
+        frames.close()
+
+
+def test_jitter_buffer_holds_frames_and_skips_stale_ones():
+    clock = FakeClock()
+    frames = make_ingest(clock=clock, depth=2, jitter_delay=0.01, max_age=0.1)
+    try:
+        frames.feed(raw([1] * 4))
+        assert frames.take(clock.now) is None  # still inside the jitter delay
+
+        clock.now += 0.5
+        frames.feed(raw([2] * 4))
+        frames.feed(raw([3] * 4))
+        frames.feed(raw([4] * 4))  # buffer holds two, the oldest goes
+        clock.now += 0.02
+
+        assert frames.take(clock.now).tolist() == [3] * 4
+        assert frames.stats()["dropped"] == 2  # the first frame too, it was never taken
+        assert frames.stats()["late"] == 0
+
+        clock.now += 0.5
+        assert frames.take(clock.now) is None
+        assert frames.stats()["late"] == 1
+    finally:
+        frames.close()
+
+
+def test_first_frame_starts_ingest_and_timeout_falls_back():
+    clock = FakeClock()
+    started, timed_out = [], []
+    frames = make_ingest(clock=clock, jitter_delay=0, timeout=1.0,
+                         on_start=lambda: started.append(True), on_timeout=lambda: timed_out.append(True))
+    controller = FakeController(count=4)
+    try:
+        frames.feed(raw([9] * 4))
+        frames.feed(raw([9] * 4))
+        assert started == [True]
+
+        player = frames.play(controller)
+        next(player)
+        assert controller.pixels.tolist() == [9] * 4
+        assert frames.stats()["active"]
+
+        clock.now += 2.0
+        assert list(player) == []
+        assert timed_out == [True]
+        assert not frames.stats()["active"]
+    finally:
+        frames.close()
+
+
+def test_frames_arrive_over_udp():
+    frames = make_ingest()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sender.sendto(raw([1, 2, 3, 4]), frames.address)
+        deadline = time.monotonic() + 1
+        while frames.received == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert frames.received == 1
+    finally:
+        sender.close()
+        frames.close()
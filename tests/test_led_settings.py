@@ -0,0 +1,50 @@
+import pytest
+
+from fakes import FakeController, install_fake_ws281x
+
+install_fake_ws281x()
+
+from led_settings import default_settings
+
+
+def test_updates_make_a_new_snapshot_with_the_next_version():
+    first = default_settings()
+    second = first.updated(delay=40)
+
+    assert second.version == first.version + 1
+    assert second.delay == 40 and second.delay_seconds == 0.04
+    # untouched fields are carried over, the old snapshot is unchanged
+    assert second.colors is first.colors
+    assert first.delay == 500
+    with pytest.raises(AttributeError):
+        second.delay = 10
+
+
+def test_colors_are_frozen():
+    colors = [1, 2]
+    settings = default_settings().updated(colors=colors, brightness=0)
+    colors.append(3)
+
+    assert settings.colors == (1, 2)
+    assert settings.brightness == 0
+
+
+@pytest.mark.parametrize("changes", [
+    {"delay": -1}, {"brightness": 256}, {"brightness": -5}, {"colors": []}, {"colors": [1]},
+])
+def test_out_of_range_values_are_rejected(changes):
+    with pytest.raises(ValueError):
+        default_settings().updated(**changes)
+
+
+def test_controller_swaps_whole_snapshots():
+    controller = FakeController()
+    before = controller.settings
+
+    controller.set_colors([7, 8])
+    controller.set_delay(250)
+
+    assert controller.settings.version == before.version + 2
+    assert controller.color_list == (7, 8)
+    assert controller.delay == 0.25
+    assert before.colors != controller.color_list
@@ -0,0 +1,51 @@
+import numpy as np
+
+from fakes import FakeController, install_fake_ws281x
+
+install_fake_ws281x()
+
+import light_race
+
+
+def test_same_seed_replays_the_same_race():
+    first = light_race.simulate(num_racers=5, track_length=60, seed=42)
+    second = light_race.simulate(num_racers=5, track_length=60, seed=42)
+
+    assert first == second
+    assert max(first["positions"]) == 59
+
+
+def test_race_generator_matches_headless_result_with_one_show_per_frame():
+    controller = FakeController(count=30)
+    expected = light_race.simulate(num_racers=4, track_length=30, seed=7)
+
+    frames = 0
+    for _ in light_race.race(controller, num_racers=4, seed=7):
+        controller.show()
+        frames += 1
+
+    # the cleared strip, one frame per move and the winner's fill
+    assert frames == expected["ticks"] + 1
+    assert controller.strip.show_calls <= frames
+    winner_color = light_race.racer_colors(4)[expected["winner"]]
+    assert controller.strip.pixels == [winner_color] * 30
+
+
+def test_hundreds_of_racers_on_a_long_track():
+    result = light_race.simulate(num_racers=500, track_length=1000, seed=1)
+
+    assert 0 <= result["winner"] < 500
+    assert result["positions"][result["winner"]] == 999
+
+
+def test_equal_odds_win_roughly_equally():
+    wins = light_race.win_counts(3000, num_racers=3, track_length=40, seed=3)
+
+    assert wins.sum() == 3000
+    assert np.all(np.abs(wins / 3000 - 1 / 3) < 0.05)
+
+
+def test_better_odds_win_more():
+    wins = light_race.win_counts(500, num_racers=2, track_length=40, probabilities=[0.6, 0.4], seed=3)
+
+    assert wins[0] > wins[1] * 4
@@ -0,0 +1,105 @@
+import numpy as np
+
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+import preview
+from framebuffer import FrameBuffer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def read(message):
+    kind, number, num_pixels, length = preview.HEADER.unpack_from(message)
+    return kind, number, num_pixels, message[preview.HEADER.size:preview.HEADER.size + length]
+
+
+def flush(buffer, strip, **pixels):
+    for index, color in pixels.items():
+        buffer.pixels[int(index[1:])] = color
+    buffer.flush(strip)
+
+
+class NullStrip:
+    def setPixelColor(self, index, color):
+        pass
+
+    def show(self):
+        pass
+
+
+def test_delta_round_trip():
+    previous = np.zeros(300, dtype=np.uint8)
+    current = previous.copy()
+    current[[3, 4, 100, 299]] = [1, 2, 3, 4]
+
+    payload = preview.encode_delta(current, previous)
+
+    assert len(payload) < 20
+    assert preview.apply_delta(payload, previous).tolist() == current.tolist()
+    assert preview.encode_delta(previous, previous) == b""
+
+
+def test_stream_sends_a_keyframe_then_deltas_of_the_snapshot():
+    buffer, strip, clock = FrameBuffer(100), NullStrip(), FakeClock()
+    messages = preview.stream(buffer, clock=clock, sleep=clock.sleep)
+    flush(buffer, strip, p0=0xFF0000)
+
+    kind, number, num_pixels, payload = read(next(messages))
+    assert (kind, number, num_pixels) == (preview.KEYFRAME, 0, 100)
+    rgb = np.frombuffer(payload, dtype=np.uint8)
+
+    flush(buffer, strip, p50=0x00FF00)
+    kind, number, _, payload = read(next(messages))
+    assert (kind, number) == (preview.DELTA, 1)
+    assert len(payload) < 10
+    assert preview.apply_delta(payload, rgb).tolist() == preview.rgb_bytes(buffer.pixels).tolist()
+
+
+def test_stream_backs_off_for_slow_clients():
+    buffer, strip, clock = FrameBuffer(10), NullStrip(), FakeClock()
+
+    def sleep(seconds):
+        clock.sleep(seconds)
+        flush(buffer, strip, p1=len(clock.sleeps))  # always a new frame after waiting
+
+    messages = preview.stream(buffer, clock=clock, sleep=sleep)
+    flush(buffer, strip)
+    next(messages)
+    next(messages)
+    # a fast client gets the full rate
+    assert clock.sleeps[-1] == preview.MIN_INTERVAL
+
+    for _ in range(3):
+        clock.now += 1.0  # the client took a second to read each message
+        next(messages)
+    next(messages)
+
+    # back to fast sends, but the rate only recovers gradually
+    assert clock.sleeps[-1] > 4 * preview.MIN_INTERVAL
+
+
+def test_no_messages_before_the_first_flush():
+    buffer, clock = FrameBuffer(10), FakeClock()
+
+    def sleep(seconds):
+        clock.sleep(seconds)
+        if len(clock.sleeps) == 3:
+            buffer.flush(NullStrip())
+
+    messages = preview.stream(buffer, clock=clock, sleep=sleep)
+
+    assert read(next(messages))[0] == preview.KEYFRAME
+    assert len(clock.sleeps) == 3
@@ -0,0 +1,276 @@
+import threading
+import time
+
+import pytest
+
+from fakes import FakeController, install_fake_ws281x
+
+install_fake_ws281x()
+
+from render import RenderEngine
+from scheduler import CancelToken
+
+
+def counting_effect(controller, closed):
+    try:
+        i = 0
+        while True:
+            controller.pixels[:] = i
+            i += 1
+            yield
+    finally:
+        closed.append(True)
+
+
+def test_engine_flushes_each_frame_and_closes_on_cancel():
+    controller = FakeController()
+    engine = RenderEngine(controller)
+    token = CancelToken()
+    closed = []
+
+    def frames():
+        for hold in counting_effect(controller, closed):
+            if controller.strip.show_calls >= 3:
+                token.cancel()
+            yield hold
+
+    engine.run(frames(), token)
+
+    assert controller.strip.show_calls == 3
+    assert controller.strip.pixels == [2] * 10
+    assert closed == [True]
+
+
+def test_cancel_wakes_a_long_frame_wait():
+    controller = FakeController()
+    controller.delay = 30
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+
+    started = time.monotonic()
+    RenderEngine(controller).run(counting_effect(controller, []), token)
+
+    assert time.monotonic() - started < 1.0
+    assert controller.strip.show_calls == 1
+
+
+def test_engine_runs_finite_effect_to_the_end():
+    controller = FakeController()
+
+    def two_frames(controller):
+        controller.pixels[:] = 1
+        yield
+        controller.pixels[:] = 2
+        yield 0
+
+    RenderEngine(controller).run(two_frames(controller))
+
+    assert controller.strip.show_calls == 2
+    assert controller.strip.pixels == [2] * 10
+
+
+def solid(controller, color, frames, closed):
+    try:
+        while True:
+            controller.pixels[:] = color
+            frames.append(color)
+            yield
+    finally:
+        closed.append(color)
+
+
+def test_crossfade_keeps_the_old_effect_running_until_faded():
+    controller = FakeController()
+    engine = RenderEngine(controller, crossfade=60)
+    frames, closed = [], []
+
+    old = engine._paced(solid(controller, 0xFF0000, frames, closed))
+    next(old)
+    outgoing = engine.detach()
+    old.close()
+    assert closed == []
+
+    new = engine._paced(solid(controller, 0x0000FF, frames, closed), outgoing=outgoing)
+    next(new)
+    assert frames == [0xFF0000, 0x0000FF, 0xFF0000]
+    # a minute long fade has only just begun, so no jump to the new color
+    assert controller.strip.pixels == [0xFF0000] * 10
+
+    engine.crossfade = 1e-6
+    next(new)
+    assert controller.strip.pixels == [0x0000FF] * 10
+    assert closed == [0xFF0000]
+    new.close()
+    assert closed == [0xFF0000, 0x0000FF]
+
+
+def test_render_loop_crossfades_between_effects():
+    from render import RenderLoop
+
+    controller = FakeController()
+    controller.delay = 0.01
+    loop = RenderLoop(RenderEngine(controller, crossfade=0.3))
+    frames, closed = [], []
+
+    try:
+        loop.start("red", lambda: solid(controller, 0xFF0000, frames, closed)).result(1)
+        time.sleep(0.03)
+        loop.start("blue", lambda: solid(controller, 0x0000FF, frames, closed)).result(1)
+        time.sleep(0.1)
+        shown = controller.strip.pixels[0]
+        assert shown >> 16 > 0 and shown & 0xFF > 0
+        assert closed == []
+
+        time.sleep(0.4)
+        assert controller.strip.pixels[0] == 0x0000FF
+        assert closed == [0xFF0000]
+        assert loop.current_name == "blue"
+    finally:
+        loop.close(timeout=1)
+    assert closed == [0xFF0000, 0x0000FF]
+
+
+def test_render_loop_crossfades_to_one_shot_jobs():
+    from render import RenderLoop
+
+    controller = FakeController()
+    controller.delay = 0.01
+    loop = RenderLoop(RenderEngine(controller, crossfade=0.3))
+    frames, closed = [], []
+
+    def fill_blue():
+        controller.pixels[:] = 0x0000FF
+        controller.show()
+
+    try:
+        loop.start("red", lambda: solid(controller, 0xFF0000, frames, closed)).result(1)
+        time.sleep(0.03)
+        loop.start("blue", fill_blue).result(1)
+        time.sleep(0.1)
+        # no jump: red is still fading out under the filled frame
+        shown = controller.strip.pixels[0]
+        assert shown >> 16 > 0 and shown & 0xFF > 0
+
+        time.sleep(0.4)
+        assert controller.strip.pixels == [0x0000FF] * 10
+        assert closed == [0xFF0000]
+        assert not loop.running
+    finally:
+        loop.close(1)
+
+
+def test_interpolation_blends_towards_the_next_frame():
+    controller = FakeController()
+    engine = RenderEngine(controller, interpolate=True, output_period=0.001)
+
+    def two_frames():
+        controller.pixels[:] = 0
+        yield 0.2
+        controller.pixels[:] = 0xFF
+        yield 0.2
+
+    paced = engine._paced(two_frames())
+    next(paced)
+    time.sleep(0.2)
+    next(paced)
+    assert controller.pixels[0] == 0
+    time.sleep(0.1)
+    next(paced)
+    assert 0 < controller.strip.pixels[0] < 0xFF
+    # the effect's own frame is untouched by the blend
+    assert engine._track.frame[0] == 0xFF
+    paced.close()
+
+
+def test_render_loop_switches_jobs_on_one_thread():
+    from render import RenderLoop
+
+    controller = FakeController()
+    controller.delay = 0.01
+    loop = RenderLoop(RenderEngine(controller))
+    threads = []
+    closed = []
+
+    def effect():
+        threads.append(threading.current_thread())
+        return counting_effect(controller, closed)
+
+    try:
+        loop.start("first", effect).result(1)
+        time.sleep(0.03)
+        loop.start("second", effect).result(1)
+        assert closed == [True]
+        assert loop.running and loop.current_name == "second"
+        loop.stop().result(1)
+        assert closed == [True, True]
+        assert not loop.running and loop.current_name is None
+    finally:
+        loop.close(timeout=1)
+
+    assert threads == [loop.thread, loop.thread]
+
+
+def test_render_loop_applies_commands_between_frames():
+    from render import RenderLoop
+
+    controller = FakeController()
+    controller.delay = 0.01
+    loop = RenderLoop(RenderEngine(controller))
+    seen = []
+
+    def effect():
+        while True:
+            # a command landing mid-frame would show up between these two
+            before = controller.settings.version
+            controller.pixels[9] = 0
+            seen.append((before, controller.settings.version))
+            yield
+
+    try:
+        loop.start("watch", lambda: effect()).result(1)
+        for delay in range(5):
+            loop.submit("settings", {"delay": 10 + delay}).result(1)
+            time.sleep(0.02)
+        # pixels aren't drawn under a running effect, its next frame would cover them
+        assert loop.submit("pixels", [9], [7]).result(1) is False
+        loop.submit("settings", {"delay": 250}).result(1)
+        assert controller.delay == 0.25
+    finally:
+        loop.close(timeout=1)
+
+    assert all(before == after for before, after in seen)
+    assert seen[-1][0] > seen[0][0]
+    assert controller.pixels[9] == 0
+
+
+def test_render_loop_reshows_the_frame_on_brightness_while_idle():
+    from render import RenderLoop
+
+    controller = FakeController()
+    loop = RenderLoop(RenderEngine(controller))
+    try:
+        loop.submit("pixels", [0], [0xFF0000]).result(1)
+        assert controller.strip.pixels[0] == 0xFF0000
+
+        loop.submit("settings", {"brightness": 0}).result(1)
+        assert controller.strip.pixels[0] == 0
+        assert controller.pixels[0] == 0xFF0000
+    finally:
+        loop.close(timeout=1)
+
+
+def test_render_loop_rejects_commands_when_full():
+    import queue
+
+    from render import RenderLoop
+
+    loop = RenderLoop(RenderEngine(FakeController()), max_commands=1)
+    loop.loop.call_soon_threadsafe(time.sleep, 0.2)  # stall the loop
+    time.sleep(0.02)
+    try:
+        loop.stop()
+        with pytest.raises(queue.Full):
+            loop.stop()
+        loop.commands.join()
+    finally:
+        loop.close(timeout=1)
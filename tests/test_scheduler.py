@@ -0,0 +1,47 @@
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+from scheduler import FrameScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_render_time_is_absorbed_into_the_period():
+    clock = FakeClock()
+    scheduler = FrameScheduler(0.1, clock=clock)
+
+    assert scheduler.advance(None) == 0.1
+    clock.now = 0.13  # 30ms spent rendering
+    assert abs(scheduler.advance(None) - 0.07) < 1e-9
+    assert scheduler.dropped == 0
+
+
+def test_late_frames_are_dropped_not_queued():
+    clock = FakeClock()
+    scheduler = FrameScheduler(0.1, clock=clock)
+
+    scheduler.advance(None)
+    clock.now = 0.35  # overran the deadlines at 0.2 and 0.3
+    wait = scheduler.advance(None)
+
+    assert scheduler.dropped == 2
+    assert abs(wait - 0.05) < 1e-9
+
+
+def test_reports_achieved_fps():
+    clock = FakeClock()
+    scheduler = FrameScheduler(0.1, clock=clock)
+
+    for _ in range(12):
+        scheduler.advance(None)
+        clock.now += 0.1
+
+    assert 9.0 <= scheduler.stats()["fps"] <= 11.0
+    assert scheduler.stats()["target_fps"] == 10.0
@@ -0,0 +1,44 @@
+import sys
+from concurrent.futures import Future
+
+import fakes
+import startup
+
+
+def test_a_slow_startup_effect_does_not_stop_the_boot(monkeypatch, caplog):
+    monkeypatch.setattr(startup, "STARTUP_EFFECT", "wheel")
+    started = []
+
+    def effect_runner(name):
+        started.append(name)
+        return Future()  # the render loop never gets to it
+
+    assert not startup.run_startup_effect(effect_runner, {"wheel": None}, timeout=0.01)
+    assert started == ["wheel"]
+    assert "not started" in caplog.text
+
+
+def test_unknown_startup_effects_are_skipped(monkeypatch):
+    monkeypatch.setattr(startup, "STARTUP_EFFECT", "sparkle")
+
+    assert not startup.run_startup_effect(lambda name: None, {"wheel": None})
+
+
+def test_phases_are_reported_in_order():
+    now = [0.0]
+    timer = startup.StartupTimer(clock=lambda: now[0])
+    for name in ("interpreter", "numpy", "flask"):
+        now[0] += 0.5
+        timer.mark(name)
+
+    report = timer.report()
+    assert report["total_ms"] == 1500.0
+    assert [phase["name"] for phase in report["phases"]] == ["interpreter", "numpy", "flask"]
+
+
+def test_begin_times_each_heavy_import():
+    timer = startup.begin()
+
+    assert [phase["name"] for phase in timer.report()["phases"]] == ["interpreter", *startup.HEAVY_IMPORTS]
+    # fakes put the stand-in in place, begin() must not import the real one over it
+    assert sys.modules["rpi_ws281x"].PixelStrip is fakes.FakePixelStrip
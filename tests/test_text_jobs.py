@@ -0,0 +1,78 @@
+import threading
+import time
+
+from fakes import install_fake_ws281x
+
+install_fake_ws281x()
+
+import text_jobs
+
+
+def wait_for(predicate, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+class GatedFetch:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        assert self.release.wait(2)
+        return [0.1]
+
+
+def test_identical_texts_share_one_fetch():
+    fetch = GatedFetch()
+    shown = []
+    jobs = text_jobs.TextEffectJobs(fetch, lambda text, result: shown.append((text, result)), timeout=5)
+
+    first = jobs.submit("raise")
+    second = jobs.submit("raise")
+    fetch.release.set()
+
+    assert first["id"] == second["id"]
+    # the fetched embedding is handed to display, not fetched again
+    assert wait_for(lambda: shown == [("raise", [0.1])])
+    assert fetch.calls == ["raise"]
+    assert jobs.status(first["id"])["status"] == text_jobs.DONE
+    jobs.shutdown()
+
+
+def test_newest_text_wins():
+    fetch = GatedFetch()
+    shown = []
+    jobs = text_jobs.TextEffectJobs(fetch, lambda text, result: shown.append(text), timeout=5, max_workers=1)
+
+    old = jobs.submit("check")
+    queued = jobs.submit("call")
+    newest = jobs.submit("fold")
+    fetch.release.set()
+
+    assert wait_for(lambda: jobs.status(newest["id"])["status"] == text_jobs.DONE)
+    assert wait_for(lambda: shown == ["fold"])
+    assert jobs.status(old["id"])["status"] == text_jobs.SUPERSEDED
+    assert jobs.status(queued["id"])["status"] == text_jobs.SUPERSEDED
+    # "call" was still queued behind "check" and never hit the network
+    assert fetch.calls == ["check", "fold"]
+    jobs.shutdown()
+
+
+def test_slow_fetch_times_out_and_is_not_displayed():
+    fetch = GatedFetch()
+    shown = []
+    jobs = text_jobs.TextEffectJobs(fetch, lambda text, result: shown.append(text), timeout=0.05)
+
+    job = jobs.submit("all in")
+
+    assert wait_for(lambda: jobs.status(job["id"])["status"] == text_jobs.TIMEOUT)
+    fetch.release.set()
+    time.sleep(0.05)
+    assert shown == []
+    jobs.shutdown()
@@ -0,0 +1,133 @@
+"""background text effect jobs with in-flight deduplication"""
+import itertools
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from threading import RLock, Timer
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+SUPERSEDED = "superseded"
+
+# finished jobs kept around for polling
+MAX_JOBS = 100
+# seconds before a text effect's embedding request is given up on
+TEXT_EFFECT_TIMEOUT = float(os.getenv("TEXT_EFFECT_TIMEOUT", "10"))
+
+
+# embeddings pull in dotenv and the OpenAI client, so load them on first use
+def fetch_embedding(text):
+    import embeddings
+
+    return embeddings.get_embeddings(text)
+
+
+def show_embedding(controller, text, embedding):
+    """The text effect: draw an embedding fetch_embedding already got."""
+    import embeddings
+
+    return embeddings.display_text_as_lights(controller, text, embedding=embedding)
+
+
+class TextEffectJobs:
+    """Fetches embeddings off the request thread and shows the newest text.
+
+    display(text, result) gets the fetched result, so it never has to fetch
+    again on the render thread.
+
+    Identical texts submitted while a fetch is in flight share that fetch.
+    A newer text supersedes every older pending job (last write wins): queued
+    fetches are cancelled and results that arrive late are never displayed.
+    Jobs that take longer than timeout seconds are marked timed out.
+    """
+
+    def __init__(self, fetch, display, timeout=TEXT_EFFECT_TIMEOUT, max_workers=2):
+        self.fetch = fetch
+        self.display = display
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="text-effect")
+        # reentrant: cancelling a future runs its done callbacks right here
+        self._lock = RLock()
+        self._ids = itertools.count(1)
+        self._jobs = OrderedDict()
+        self._in_flight = {}  # text -> Future
+        self._latest = None
+
+    def submit(self, text):
+        """Queue text for display and return its job record right away."""
+        with self._lock:
+            latest = self._jobs.get(self._latest)
+            if latest and latest["text"] == text and latest["status"] == PENDING:
+                return dict(latest)
+
+            job_id = str(next(self._ids))
+            job = {"id": job_id, "text": text, "status": PENDING}
+            self._jobs[job_id] = job
+            while len(self._jobs) > MAX_JOBS:
+                self._jobs.popitem(last=False)
+
+            for other in self._jobs.values():
+                if other is not job and other["status"] == PENDING:
+                    other["status"] = SUPERSEDED
+            for other_text, future in list(self._in_flight.items()):
+                if other_text != text and future.cancel():
+                    self._in_flight.pop(other_text, None)
+            self._latest = job_id
+
+            future = self._in_flight.get(text)
+            if future is None:
+                future = self._executor.submit(self.fetch, text)
+                self._in_flight[text] = future
+                future.add_done_callback(lambda done, text=text: self._forget(text, done))
+
+        timer = Timer(self.timeout, self._expire, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+        future.add_done_callback(lambda done: self._finish(job_id, done, timer))
+        return dict(job)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _forget(self, text, future):
+        with self._lock:
+            if self._in_flight.get(text) is future:
+                del self._in_flight[text]
+
+    def _expire(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] == PENDING:
+                job["status"] = TIMEOUT
+
+    def _finish(self, job_id, future, timer):
+        timer.cancel()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != PENDING:
+                return
+            if self._latest != job_id:
+                job["status"] = SUPERSEDED
+                return
+            try:
+                result = future.result()
+            except CancelledError:
+                job["status"] = SUPERSEDED
+                return
+            except Exception as e:
+                logging.warning("Text effect fetch for %r failed: %s", job["text"], e)
+                job["status"] = FAILED
+                job["error"] = str(e)
+                return
+            job["status"] = DONE
+
+        # never display on the submitting request thread
+        self._executor.submit(self.display, job["text"], result)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)